@@ -4,16 +4,24 @@ import plotly.express as px
 import plotly.graph_objects as go
 import os
 import io
+import uuid
 import base64
 from datetime import datetime
 
 # Import helper functions
 from utils.data_processor import process_excel_file, export_knowledge_base
 # Import Anthropic helper functions (Claude-only version)
-from utils.anthropic_helper import analyze_review, generate_category_summary
-# Import scraper functions
-from utils.google_play_scraper import scrape_google_play_reviews
-from utils.trustpilot_scraper import scrape_trustpilot_reviews
+from utils.anthropic_helper import purge_stale_cache_entries
+from utils.llm_cache import get_default_cache
+from utils.analysis_engine import build_categories, collect_reviews, DEFAULT_MAX_WORKERS, DEFAULT_BATCH_SIZE
+from utils.checkpoint import compute_run_id, get_checkpoint_store
+from utils.model_cascade import DEFAULT_MODEL_TIERS, DEFAULT_CONFIDENCE_THRESHOLD
+from utils.local_classifier import LocalReviewClassifier, train_local_classifier, format_metrics, DEFAULT_ROUTING_THRESHOLD
+# Scraping, analysis and summaries run as jobs in separate worker processes
+from utils.review_store import get_review_store
+from utils.taxonomy import get_issue_taxonomy, RAW_ISSUE_TYPE_COLUMN
+from utils.knowledge_store import get_knowledge_base_store, DEFAULT_REGENERATE_THRESHOLD
+from utils.jobs import get_job_queue, ensure_workers, QUEUED, SUCCEEDED, CANCELLED, FINISHED_STATES
 
 # Set page configuration
 st.set_page_config(
@@ -37,14 +45,55 @@ if 'scraped_data' not in st.session_state:
     st.session_state.scraped_data = None
 if 'data_source_method' not in st.session_state:
     st.session_state.data_source_method = None  # 'scrape' or 'upload'
-if 'scraping_in_progress' not in st.session_state:
-    st.session_state.scraping_in_progress = False
+if 'scrape_error' not in st.session_state:
+    st.session_state.scrape_error = None
 if 'scraping_completed' not in st.session_state:
     st.session_state.scraping_completed = False
 if 'current_tab' not in st.session_state:
     st.session_state.current_tab = "data_sourcing"  # Track which tab is active
 if 'error_placeholder' not in st.session_state:
     st.session_state.error_placeholder = None  # Single placeholder for all errors
+if 'analysis_concurrency' not in st.session_state:
+    st.session_state.analysis_concurrency = DEFAULT_MAX_WORKERS
+if 'analysis_batch_size' not in st.session_state:
+    st.session_state.analysis_batch_size = DEFAULT_BATCH_SIZE
+if 'analysis_dedupe' not in st.session_state:
+    st.session_state.analysis_dedupe = True
+if 'analysis_routing' not in st.session_state:
+    st.session_state.analysis_routing = "Large model only"
+if 'cascade_threshold' not in st.session_state:
+    st.session_state.cascade_threshold = DEFAULT_CONFIDENCE_THRESHOLD
+if 'local_classifier' not in st.session_state:
+    st.session_state.local_classifier = LocalReviewClassifier.load()
+if 'use_local_classifier' not in st.session_state:
+    st.session_state.use_local_classifier = False
+if 'local_threshold' not in st.session_state:
+    st.session_state.local_threshold = DEFAULT_ROUTING_THRESHOLD
+if 'regenerate_threshold' not in st.session_state:
+    st.session_state.regenerate_threshold = DEFAULT_REGENERATE_THRESHOLD
+if 'job_owner' not in st.session_state:
+    st.session_state.job_owner = uuid.uuid4().hex  # Jobs listed in the sidebar belong to this session
+if 'scrape_job_id' not in st.session_state:
+    st.session_state.scrape_job_id = None
+if 'analysis_job_id' not in st.session_state:
+    st.session_state.analysis_job_id = None  # Analysis job whose results are still streaming in
+if 'kb_job_id' not in st.session_state:
+    st.session_state.kb_job_id = None
+if 'failed_summaries' not in st.session_state:
+    st.session_state.failed_summaries = {}  # Issue type to error of summaries that can be retried
+if 'analysis_run_id' not in st.session_state:
+    st.session_state.analysis_run_id = None  # Checkpoint the running analysis job writes its rows to
+if 'analysis_input_rows' not in st.session_state:
+    st.session_state.analysis_input_rows = None
+if 'analysis_messages' not in st.session_state:
+    st.session_state.analysis_messages = []
+if 'cache_checked' not in st.session_state:
+    # Results produced by an older prompt are never reused, so drop them once per session
+    purge_stale_cache_entries()
+    st.session_state.cache_checked = True
+
+# Workers outlive this script, so this only starts them when none are running
+ensure_workers()
 
 # Main app header
 st.title("🚀 Competition Analysis & Knowledge Base Creator")
@@ -62,6 +111,209 @@ def show_error(error_message):
     else:
         st.session_state.error_placeholder.empty()
 
+# Seconds between refreshes of job status and live results
+LIVE_REFRESH_SECONDS = 2
+
+# Seconds between refreshes of the summaries being written, short so their text flows in
+SUMMARY_REFRESH_SECONDS = 0.5
+
+def get_job(job_id):
+    """Return a job from the queue, or None"""
+    return get_job_queue().get(job_id) if job_id is not None else None
+
+def job_active(job_id):
+    """Return True while a job is queued or running"""
+    job = get_job(job_id)
+    return job is not None and job['status'] not in FINISHED_STATES
+
+def analysis_running():
+    """Return True while an analysis job is still in progress"""
+    return job_active(st.session_state.analysis_job_id)
+
+def current_analyzed_rows():
+    """Return the finished analysis, or the rows the running job has checkpointed so far"""
+    if st.session_state.analyzed_data:
+        return st.session_state.analyzed_data
+    input_rows = st.session_state.analysis_input_rows
+    if st.session_state.analysis_run_id is not None and input_rows is not None:
+        stored = get_checkpoint_store().load_rows(st.session_state.analysis_run_id)
+        # Checkpoints hold the issue types Claude returned, the dashboard shows their categories
+        return get_issue_taxonomy().apply([{**input_rows[position], **analysis} for position, analysis in sorted(stored.items())
+                                           if position < len(input_rows)])
+    return None
+
+def show_job_status(job, key):
+    """Progress, cancel button and captured log of a queued or running job"""
+    total = job['progress_total']
+    st.progress(min(job['progress_completed'] / total, 1.0) if total else 0.0)
+    if job['status'] == QUEUED:
+        st.text(f"Job {job['id']} is waiting for a free worker...")
+    else:
+        st.text(job['message'] or "Working...")
+    
+    if job['cancel_requested']:
+        st.caption("⏹️ Cancelling...")
+    elif st.button("⏹️ Cancel", key=f"cancel_{key}_{job['id']}"):
+        get_job_queue().request_cancel(job['id'])
+        st.rerun()
+    
+    with st.expander("📜 Job Log"):
+        log_lines = get_job_queue().logs(job['id'], limit=100000)[-200:]
+        st.code("\n".join(f"{level}: {message}" for _, _, level, message in log_lines) or "No log output yet")
+
+def finished_job_error(job, action):
+    """Describe why a finished job produced no results"""
+    if job['status'] == CANCELLED:
+        return f"{action} was cancelled"
+    return f"{action} failed: {job['error']}"
+
+def collect_scrape_job(job):
+    """Move the reviews of a finished scrape job into the session state"""
+    st.session_state.scrape_job_id = None
+    if job['status'] != SUCCEEDED:
+        st.session_state.scrape_error = finished_job_error(job, "Data collection")
+        return
+    combined_data = get_review_store().read(**job['result']['query'])
+    if combined_data.empty:
+        st.session_state.scrape_error = "No data was collected from any source"
+        return
+    st.session_state.scraped_data = combined_data
+    st.session_state.df = combined_data  # Set as main dataframe
+    st.session_state.scraping_completed = True
+
+def collect_analysis_job(job):
+    """Move the results of a finished analysis job into the session state"""
+    st.session_state.analysis_job_id = None
+    st.session_state.analysis_run_id = None
+    st.session_state.analysis_input_rows = None
+    if job['status'] != SUCCEEDED:
+        # Finished rows stay checkpointed, so starting again resumes the run
+        st.session_state.pending_analysis_error = finished_job_error(job, "Analysis")
+        return
+    
+    result = job['result']
+    analyzed_data = get_job_queue().load_file(job['id'], 'output') or []
+    st.session_state.analyzed_data = analyzed_data
+    st.session_state.categories = build_categories(analyzed_data)
+    st.session_state.analysis_errors = result['errors']
+    st.session_state.kb_job_id = result['knowledge_base_job']
+    
+    messages = []
+    stats = result['stats']
+    limiter = stats.get('limiter')
+    if limiter and limiter['throttled_responses']:
+        messages.append(f"⏳ Claude rate limits: {limiter['throttled_responses']} throttled responses, {limiter['retries']} retries, {limiter['throttle_wait_seconds']:.0f}s spent backing off. Concurrency is now {stats['concurrency']}.")
+    
+    dedup_stats = stats.get('dedup')
+    if dedup_stats and dedup_stats['calls_saved']:
+        messages.append(f"♻️ Collapsed {dedup_stats['total_reviews']} reviews into {dedup_stats['clusters']} unique reviews, saving {dedup_stats['calls_saved']} API calls")
+    
+    local_stats = stats.get('local')
+    if local_stats and local_stats['labeled_locally']:
+        messages.append(f"🧠 Local classifier labeled {local_stats['labeled_locally']} of {len(analyzed_data)} reviews without calling Claude")
+    
+    cascade_report = stats.get('cascade')
+    if cascade_report is not None:
+        routing_message = f"🔀 Model routing: {cascade_report['escalated_fraction']:.0%} of {cascade_report['reviews']} reviews escalated to {stats['cascade_model']}"
+        if cascade_report['cost_saved'] is not None:
+            routing_message += f", saving an estimated {cascade_report['large_model_tokens_saved']:,.0f} large-model tokens, {cascade_report['latency_saved']:.0f}s of request time and ${cascade_report['cost_saved']:.2f}"
+        messages.append(routing_message)
+    
+    if result['resumed_rows']:
+        messages.append(f"💾 Resumed run {result['run_id']}: {result['resumed_rows']} of {result['reviews']} reviews were restored from its checkpoint without calling Claude")
+    
+    first_result = result.get('first_result_seconds')
+    if first_result is not None and job['finished_at'] and job['started_at']:
+        messages.append(f"⏱️ First results after {first_result:.1f}s, full run took {job['finished_at'] - job['started_at']:.0f}s")
+    st.session_state.analysis_messages = messages
+    
+    # Errors are shown by the full rerun, fragments cannot write outside their own area
+    errors = result['errors']
+    if errors:
+        if len(errors) > 3:
+            st.session_state.pending_analysis_error = f"Some reviews had analysis issues ({len(errors)} total). Analysis continued with default values for these reviews."
+        else:
+            st.session_state.pending_analysis_error = f"Issues during analysis: {', '.join(errors[:3])}"
+
+def collect_knowledge_base_job(job):
+    """Move the summaries of a finished knowledge base job into the session state"""
+    st.session_state.kb_job_id = None
+    if job['status'] != SUCCEEDED:
+        st.session_state.pending_analysis_error = finished_job_error(job, "Knowledge base generation")
+        return
+    result = job['result']
+    if job['params'].get('issue_types'):
+        # A retry only covers the issue types that failed before, keep the other summaries
+        st.session_state.knowledge_base.update(result['knowledge_base'])
+    else:
+        st.session_state.knowledge_base = result['knowledge_base']
+    failed = result['failed']
+    st.session_state.failed_summaries = failed
+    if failed:
+        st.session_state.pending_analysis_error = "Could not generate summaries for: " + ", ".join(failed)
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def show_scrape_progress():
+    """Live status of the scrape job, refreshed on a timer"""
+    job = get_job(st.session_state.scrape_job_id)
+    if job is None:
+        st.session_state.scrape_job_id = None
+        return
+    if job['status'] in FINISHED_STATES:
+        # Collect once, then rerun the whole app so the data shows up everywhere
+        collect_scrape_job(job)
+        st.rerun()
+    
+    st.markdown("### 🔄 Data Collection in Progress")
+    show_job_status(job, "scrape")
+    st.caption("Collection runs in a background worker and continues if you close this page.")
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def show_analysis_progress():
+    """Live progress of the analysis and knowledge base jobs, refreshed on a timer"""
+    for key, collect in (('analysis_job_id', collect_analysis_job), ('kb_job_id', collect_knowledge_base_job)):
+        job = get_job(st.session_state[key])
+        if job is None:
+            continue
+        if job['status'] in FINISHED_STATES:
+            collect(job)
+            st.rerun()
+        
+        show_job_status(job, key)
+        if key == 'analysis_job_id':
+            st.caption(f"Run {st.session_state.analysis_run_id} is checkpointed. If it is interrupted, starting the analysis again on the same data resumes where it stopped.")
+        else:
+            st.caption("Generating knowledge base summaries. Finished summaries appear in the Knowledge Base tab.")
+
+@st.fragment(run_every=SUMMARY_REFRESH_SECONDS)
+def show_partial_summaries():
+    """Summaries the running knowledge base job finished or is writing, refreshed on a timer"""
+    job = get_job(st.session_state.kb_job_id)
+    if job is None or job['status'] in FINISHED_STATES:
+        return
+    # Editing and export of these open up once the job completes
+    partial_knowledge_base = get_job_queue().load_file(job['id'], 'summaries') or {}
+    drafts = get_job_queue().load_file(job['id'], 'drafts') or {}
+    st.caption(f"📡 {len(partial_knowledge_base)} of {job['progress_total'] or '?'} summaries generated so far")
+    for issue_type, draft in drafts.items():
+        if issue_type not in partial_knowledge_base:
+            with st.expander(f"✍️ {issue_type}", expanded=True):
+                st.markdown(draft + "▌")
+    for issue_type, summary in partial_knowledge_base.items():
+        with st.expander(f"📚 {issue_type}"):
+            st.markdown(summary)
+
+def resummarize_issue_types(issue_types, regenerate_threshold=None):
+    """Queue a knowledge base job for some issue types, whose summaries replace the current ones"""
+    if regenerate_threshold is None:
+        regenerate_threshold = st.session_state.regenerate_threshold
+    ensure_workers(secrets={'api_key': st.session_state.anthropic_api_key})
+    st.session_state.kb_job_id = get_job_queue().submit(
+        'knowledge_base', {'issue_types': list(issue_types), 'regenerate_threshold': regenerate_threshold},
+        owner=st.session_state.job_owner, files={'input': st.session_state.analyzed_data},
+        secrets={'api_key': st.session_state.anthropic_api_key}
+    )
+
 # Sidebar for configurations
 with st.sidebar:
     st.header("🔑 API Configuration")
@@ -90,12 +342,117 @@ with st.sidebar:
     
     st.header("⚙️ Configuration")
     
+    # Number of reviews analyzed in parallel
+    st.session_state.analysis_concurrency = st.number_input(
+        "Parallel Analysis Requests",
+        min_value=1,
+        max_value=32,
+        value=st.session_state.analysis_concurrency,
+        help="How many reviews are sent to Claude at the same time"
+    )
+    
+    # Number of reviews packed into each Claude request
+    st.session_state.analysis_batch_size = st.number_input(
+        "Reviews per Request",
+        min_value=1,
+        max_value=50,
+        value=st.session_state.analysis_batch_size,
+        help="Pack several reviews into one request to save API calls and prompt tokens"
+    )
+    
+    # Near-duplicate collapsing before analysis
+    st.session_state.analysis_dedupe = st.checkbox(
+        "Collapse Near-Duplicate Reviews",
+        value=st.session_state.analysis_dedupe,
+        help="Analyze one review per group of near-identical reviews and copy the result to the rest"
+    )
+    
+    # Cheap-first model routing
+    routing_options = ["Large model only", "Cheap model first"]
+    st.session_state.analysis_routing = st.selectbox(
+        "Model Routing",
+        routing_options,
+        index=routing_options.index(st.session_state.analysis_routing),
+        help=f"Cheap model first analyzes every review with {DEFAULT_MODEL_TIERS[0]} and re-runs only low-confidence results on {DEFAULT_MODEL_TIERS[-1]}"
+    )
+    if st.session_state.analysis_routing == "Cheap model first":
+        st.session_state.cascade_threshold = st.slider(
+            "Escalation Confidence Threshold",
+            min_value=0.0,
+            max_value=1.0,
+            value=float(st.session_state.cascade_threshold),
+            step=0.05,
+            help="Reviews analyzed with lower confidence than this are re-run on the larger model"
+        )
+    
+    # Reuse of stored knowledge base summaries
+    st.session_state.regenerate_threshold = st.slider(
+        "Summary Refresh Threshold",
+        min_value=0.0,
+        max_value=1.0,
+        value=float(st.session_state.regenerate_threshold),
+        step=0.05,
+        help="An issue type's stored summary is reused until more than this share of its reviews changed"
+    )
+    
+    # Local classifier trained on earlier Claude results
+    with st.expander("🧠 Local Classifier"):
+        local_classifier = st.session_state.local_classifier
+        if local_classifier is not None:
+            st.session_state.use_local_classifier = st.checkbox(
+                "Label Routine Reviews Locally",
+                value=st.session_state.use_local_classifier,
+                help="Reviews the local classifier is confident about are labeled without calling Claude"
+            )
+            st.session_state.local_threshold = st.slider(
+                "Local Labeling Threshold",
+                min_value=0.5,
+                max_value=1.0,
+                value=float(st.session_state.local_threshold),
+                step=0.01,
+                help="Minimum classifier confidence on every field; less confident reviews go to Claude"
+            )
+            st.text(format_metrics(local_classifier.metrics))
+        else:
+            st.caption("No classifier trained yet. Train one once the cache holds analyzed reviews.")
+        if st.button("Retrain Classifier"):
+            try:
+                with st.spinner("Training on cached Claude analyses..."):
+                    st.session_state.local_classifier = train_local_classifier()
+                st.rerun()
+            except ValueError as e:
+                st.warning(f"⚠️ {e}")
+    
     # Show helpful info
     if st.session_state.current_tab == "analysis":
         st.info("💡 Anthropic Claude will analyze your reviews and provide detailed insights including emotions and urgency levels.")
     else:
         st.info("💡 API key not required for data scraping or uploading. You'll need it when you start analysis.")
     
+    # Persistent cache of Claude results
+    llm_cache = get_default_cache()
+    if llm_cache is not None:
+        with st.expander("🗄️ Analysis Cache"):
+            cache_stats = llm_cache.stats()
+            st.caption(f"{cache_stats['entries']} cached results ({cache_stats['size_mb']:.1f} MB)")
+            st.caption(f"Since app start: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+            if st.button("Clear Cache"):
+                llm_cache.clear()
+                llm_cache.reset_stats()
+                st.rerun()
+
+    # Jobs submitted from this session
+    session_jobs = get_job_queue().list_jobs(owner=st.session_state.job_owner, limit=10)
+    if session_jobs:
+        with st.expander("🧵 Background Jobs"):
+            for job in session_jobs:
+                progress = f" {job['progress_completed']}/{job['progress_total']}" if job['progress_total'] else ""
+                st.caption(f"#{job['id']} {job['kind']}: {job['status']}{progress}")
+                if job['status'] not in FINISHED_STATES and not job['cancel_requested']:
+                    if st.button("Cancel", key=f"cancel_listed_job_{job['id']}"):
+                        get_job_queue().request_cancel(job['id'])
+                        st.rerun()
+
     st.markdown("---")
     
     # Filters (only shown when data is loaded)
@@ -230,6 +587,8 @@ with main_tab1:
                 google_review_count = st.number_input("Google Play Reviews Count", min_value=1, max_value=1000, value=100)
             with col4:
                 trustpilot_review_count = st.number_input("Trustpilot Reviews Count", min_value=1, max_value=500, value=50)
+            incremental_scrape = st.checkbox("Only new reviews since the last scrape", value=False,
+                                             help="Stops each source at the newest review an earlier incremental scrape collected")
             
             st.markdown("### 🏆 Competitor Analysis")
             competitor_count = st.selectbox("Number of Competitors to Benchmark", [0, 1, 2])
@@ -276,40 +635,26 @@ with main_tab1:
             
             if submitted:
                 # Validate required fields - at least one source required for main company
+                valid_config = True
                 if not main_company:
                     st.error("❌ Company Name is required")
+                    valid_config = False
                 elif not (google_app_id or trustpilot_url):
                     st.error("❌ At least one of Google Play Store App ID or Trustpilot Company URL is required")
+                    valid_config = False
                 elif competitor_count > 0:
                     # Validate competitor data if competitors are selected
-                    valid_competitors = True
                     for i, comp in enumerate(competitors_data):
                         if not comp['name']:
                             st.error(f"❌ Competitor {i+1} Name is required")
-                            valid_competitors = False
+                            valid_config = False
                             break
-                        elif not (comp['google_app_id'] or comp['trustpilot_url']):
+                        elif not (comp['google_id'] or comp['trustpilot_url']):
                             st.error(f"❌ Competitor {i+1} requires at least one source (Google Play ID or Trustpilot URL)")
-                            valid_competitors = False
+                            valid_config = False
                             break
-                    
-                    if valid_competitors:
-                        st.session_state.scraping_in_progress = True
-                        # Store scraping configuration
-                        st.session_state.scraping_config = {
-                            'main_company': {
-                                'name': main_company,
-                                'google_id': google_app_id,
-                                'trustpilot_url': trustpilot_url,
-                                'google_count': google_review_count,
-                                'trustpilot_count': trustpilot_review_count
-                            },
-                            'competitors': competitors_data
-                        }
-                        st.rerun()
-                else:
-                    # No competitors, just validate main company and proceed
-                    st.session_state.scraping_in_progress = True
+                
+                if valid_config:
                     # Store scraping configuration
                     st.session_state.scraping_config = {
                         'main_company': {
@@ -319,176 +664,89 @@ with main_tab1:
                             'google_count': google_review_count,
                             'trustpilot_count': trustpilot_review_count
                         },
-                        'competitors': competitors_data
+                        'competitors': competitors_data,
+                        'incremental': incremental_scrape
                     }
+                    # Collection runs in a worker process, this page only polls its status
+                    st.session_state.scrape_job_id = get_job_queue().submit(
+                        'scrape', {'config': st.session_state.scraping_config}, owner=st.session_state.job_owner
+                    )
+                    st.session_state.scraping_completed = False
+                    st.session_state.scrape_error = None
                     st.rerun()
         
-        # Show scraping progress if in progress
-        if st.session_state.scraping_in_progress:
+        # Show scraping progress while the job runs
+        if st.session_state.scrape_job_id is not None:
+            st.markdown("---")
+            show_scrape_progress()
+        
+        if st.session_state.get('scrape_error'):
+            st.error(f"❌ {st.session_state.scrape_error}")
+        
+        # Show the collected data once the job finished
+        if st.session_state.scraping_completed and st.session_state.scraped_data is not None:
+            combined_data = st.session_state.scraped_data
+            main_company = st.session_state.scraping_config['main_company']
             st.markdown("---")
+            st.success(f"✅ Data collection completed! Collected {len(combined_data)} total reviews")
             
-            # Clean, single progress container
-            progress_container = st.container()
-            with progress_container:
-                st.markdown("### 🔄 Data Collection in Progress")
-                
-                # Single main progress bar
-                main_progress = st.progress(0)
-                status_display = st.empty()
-                
-                # Compact status info
-                status_cols = st.columns(2)
-                with status_cols[0]:
-                    google_status = st.empty()
-                with status_cols[1]:
-                    trustpilot_status = st.empty()
+            # Show scraped data preview
+            st.markdown("### 👀 Scraped Data Preview")
+            st.dataframe(combined_data, use_container_width=True)
             
-            all_scraped_data = []
-            total_sources = 2  # Google Play + Trustpilot for main company
-            completed_sources = 0
+            # Create tabs for results breakdown
+            source_tab1, source_tab2 = st.tabs(["📊 Source Breakdown", "🏢 Company Breakdown"])
             
-            try:
-                config = st.session_state.scraping_config
-                main_company = config['main_company']
-                
-                # Scrape Google Play Store reviews
-                status_display.info("📱 Starting Google Play Store data collection...")
-                google_status.info("🔍 Google Play Store")
-                
-                google_data = scrape_google_play_reviews(
-                    app_id=main_company['google_id'],
-                    max_reviews=main_company['google_count'],
-                    company_name=main_company['name'],
-                    progress_container=None  # Use our clean progress system
-                )
-                
-                if not google_data.empty:
-                    all_scraped_data.append(google_data)
-                
-                completed_sources += 1
-                main_progress.progress(completed_sources / total_sources)
-                google_status.success("✅ Google Play Store - Complete")
-                
-                # Scrape Trustpilot reviews
-                status_display.info("🌐 Starting Trustpilot data collection...")
-                trustpilot_status.info("🔍 Trustpilot")
-                
-                trustpilot_data = scrape_trustpilot_reviews(
-                    company_url=main_company['trustpilot_url'],
-                    max_reviews=main_company['trustpilot_count'],
-                    company_name=main_company['name'],
-                    progress_container=None
-                )
-                
-                if not trustpilot_data.empty:
-                    all_scraped_data.append(trustpilot_data)
-                
-                completed_sources += 1
-                main_progress.progress(completed_sources / total_sources)
-                trustpilot_status.success("✅ Trustpilot - Complete")
-                
-                # Process competitors if any
-                for i, competitor in enumerate(config['competitors']):
-                    if competitor['google_id']:
-                        comp_google_data = scrape_google_play_reviews(
-                            app_id=competitor['google_id'],
-                            max_reviews=main_company['google_count'],
-                            company_name=competitor['name'],
-                            progress_container=st.container()
-                        )
-                        if not comp_google_data.empty:
-                            all_scraped_data.append(comp_google_data)
-                    
-                    if competitor['trustpilot_url']:
-                        comp_trustpilot_data = scrape_trustpilot_reviews(
-                            company_url=competitor['trustpilot_url'],
-                            max_reviews=main_company['trustpilot_count'],
-                            company_name=competitor['name'],
-                            progress_container=st.container()
-                        )
-                        if not comp_trustpilot_data.empty:
-                            all_scraped_data.append(comp_trustpilot_data)
-                
-                # Combine all data
-                if all_scraped_data:
-                    combined_data = pd.concat(all_scraped_data, ignore_index=True)
-                    st.session_state.scraped_data = combined_data
-                    st.session_state.df = combined_data  # Set as main dataframe
-                    st.session_state.scraping_completed = True
-                    st.session_state.scraping_in_progress = False
-                    
-                    status_display.success(f"✅ Data collection completed! Collected {len(combined_data)} total reviews")
-                    
-                    # Show scraped data preview
-                    st.markdown("### 👀 Scraped Data Preview")
-                    st.dataframe(combined_data, use_container_width=True)
-                    
-                    # Create tabs for results breakdown
-                    source_tab1, source_tab2 = st.tabs(["📊 Source Breakdown", "🏢 Company Breakdown"])
-                    
-                    with source_tab1:
-                        # Show breakdown by source
-                        st.subheader("Review Sources")
-                        if 'source' in combined_data.columns:
-                            source_counts = combined_data['source'].value_counts().reset_index()
-                            source_counts.columns = ['Source', 'Count']
-                            
-                            # Create pie chart for sources
-                            fig = px.pie(source_counts, values='Count', names='Source', 
-                                         title=f'Total Reviews by Source (Total: {len(combined_data)})',
-                                         color_discrete_sequence=px.colors.qualitative.Bold)
-                            fig.update_traces(textposition='inside', textinfo='percent+label')
-                            st.plotly_chart(fig, use_container_width=True)
+            with source_tab1:
+                # Show breakdown by source
+                st.subheader("Review Sources")
+                if 'source' in combined_data.columns:
+                    source_counts = combined_data['source'].value_counts().reset_index()
+                    source_counts.columns = ['Source', 'Count']
                     
-                    with source_tab2:
-                        # Show breakdown by company
-                        st.subheader("Reviews by Company")
-                        if 'company' in combined_data.columns:
-                            company_counts = combined_data['company'].value_counts().reset_index()
-                            company_counts.columns = ['Company', 'Count']
-                            
-                            # Create bar chart for companies
-                            fig = px.bar(company_counts, x='Company', y='Count', 
-                                         title=f'Reviews by Company (Total: {len(combined_data)})',
-                                         color='Company', color_discrete_sequence=px.colors.qualitative.Bold)
-                            st.plotly_chart(fig, use_container_width=True)
-                    
-                    # Store scraped data for later analysis
-                    if st.session_state.scraped_data is None:
-                        st.session_state.scraped_data = combined_data.copy()
-                        st.session_state.df = combined_data.copy()  # Make data available for analysis
-                    
-                    # Simple download option and completion message
-                    st.markdown("---")
-                    st.success("✅ **Data collection completed successfully!**")
-                    st.info("📍 **The data is available for further analysis, go to 'Analysis' tab for further processing.**")
+                    # Create pie chart for sources
+                    fig = px.pie(source_counts, values='Count', names='Source', 
+                                 title=f'Total Reviews by Source (Total: {len(combined_data)})',
+                                 color_discrete_sequence=px.colors.qualitative.Bold)
+                    fig.update_traces(textposition='inside', textinfo='percent+label')
+                    st.plotly_chart(fig, use_container_width=True)
+            
+            with source_tab2:
+                # Show breakdown by company
+                st.subheader("Reviews by Company")
+                if 'company' in combined_data.columns:
+                    company_counts = combined_data['company'].value_counts().reset_index()
+                    company_counts.columns = ['Company', 'Count']
                     
-                    # Simple download button
-                    try:
-                        # Create Excel for download
-                        buffer = io.BytesIO()
-                        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                            combined_data.to_excel(writer, index=False, sheet_name='Scraped_Reviews')
-                        buffer.seek(0)
-                        
-                        # Download button - no page refresh/routing
-                        st.download_button(
-                            label="📥 Download Scraped Data",
-                            data=buffer,
-                            file_name=f"scraped_reviews_{main_company['name']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            key="download_scraped_data_btn"
-                        )
-                    except Exception as e:
-                        st.error(f"Error creating Excel file: {str(e)}")
+                    # Create bar chart for companies
+                    fig = px.bar(company_counts, x='Company', y='Count', 
+                                 title=f'Reviews by Company (Total: {len(combined_data)})',
+                                 color='Company', color_discrete_sequence=px.colors.qualitative.Bold)
+                    st.plotly_chart(fig, use_container_width=True)
+            
+            # Simple download option and completion message
+            st.markdown("---")
+            st.success("✅ **Data collection completed successfully!**")
+            st.info("📍 **The data is available for further analysis, go to 'Analysis' tab for further processing.**")
+            
+            # Simple download button
+            try:
+                # Create Excel for download
+                buffer = io.BytesIO()
+                with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+                    combined_data.to_excel(writer, index=False, sheet_name='Scraped_Reviews')
+                buffer.seek(0)
                 
-                else:
-                    status_display.error("❌ No data was collected from any source")
-                    st.session_state.scraping_in_progress = False
-                    
+                # Download button - no page refresh/routing
+                st.download_button(
+                    label="📥 Download Scraped Data",
+                    data=buffer,
+                    file_name=f"scraped_reviews_{main_company['name']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    key="download_scraped_data_btn"
+                )
             except Exception as e:
-                st.error(f"❌ Error during data collection: {str(e)}")
-                st.session_state.scraping_in_progress = False
+                st.error(f"Error creating Excel file: {str(e)}")
     
     elif st.session_state.data_source_method == "upload":
         # Upload interface
@@ -520,6 +778,11 @@ with main_tab1:
                         st.error(f"❌ Error processing file: {error_msg}")
                     else:
                         st.session_state.df = df
+                        # Every rerun sees the file again, store it once
+                        upload_id = getattr(uploaded_file, 'file_id', uploaded_file.name)
+                        if st.session_state.get('stored_upload_id') != upload_id:
+                            get_review_store().upsert(df)
+                            st.session_state.stored_upload_id = upload_id
                         st.success(f"✅ File uploaded successfully! Found {len(df)} reviews")
                         
                         # Show data preview
@@ -636,7 +899,7 @@ with main_tab2:
         st.markdown("---")
         
         # Check if data has been analyzed already
-        if st.session_state.analyzed_data is None:
+        if st.session_state.analyzed_data is None and st.session_state.analysis_job_id is None:
             # Show analysis start button (API key check happens when clicked)
             if st.button("🔍 Start Analysis", key="start_analysis_btn", type="primary", use_container_width=True):
                 # Validate API key before starting analysis
@@ -647,11 +910,12 @@ with main_tab2:
                 
                 # Test the API key validity
                 try:
-                    from utils.anthropic_helper import get_anthropic_client
+                    from utils.anthropic_helper import get_anthropic_client, ANALYSIS_MODEL
+                    # The pooled client is reused by the analysis that follows
                     test_client = get_anthropic_client(api_key)
                     # Simple test call to verify key works
                     test_response = test_client.messages.create(
-                        model="claude-3-5-sonnet-20241022",
+                        model=ANALYSIS_MODEL,
                         max_tokens=10,
                         messages=[{"role": "user", "content": "test"}]
                     )
@@ -661,147 +925,53 @@ with main_tab2:
                     show_error(f"❌ Invalid Anthropic API key. Please check your key and try again. Error: {str(e)}")
                     st.stop()
                 
-                # If we reach here, the API key is valid - proceed with analysis
-                with st.spinner("Analyzing reviews. This may take a few minutes..."):
-                        # Create progress bar
-                        progress_bar = st.progress(0)
-                        
-                        # Process each review
-                        analyzed_data = []
-                        categories = {
-                            'sentiment': [],
-                            'aspect': [],
-                            'issue_type': [],
-                            'emotion': [],
-                            'urgency': []
-                        }
-                        
-                        total_rows = len(available_data)
-                        
-                        for idx, row in available_data.iterrows():
-                            # Update progress
-                            progress_bar.progress((idx + 1) / total_rows)
-                            
-                            # Extract review content - handle both column formats
-                            review_content = row.get('Detailed Review', row.get('review_content', ''))
-                            review_title = row.get('review_title', '')
-                            rating = row.get('Ratings on Playstore', row.get('rating', None))
-                            
-                            # Skip empty reviews with proper type checking
-                            if pd.isna(review_content) or (isinstance(review_content, str) and review_content.strip() == ""):
-                                continue
-                            
-                            # Store analysis errors to display only once at the end
-                            if 'analysis_errors' not in st.session_state:
-                                st.session_state.analysis_errors = []
-                                
-                            # Use Anthropic Claude for analysis  
-                            try:
-                                # Check if Anthropic API key is provided
-                                if not st.session_state.anthropic_api_key:
-                                    show_error("Please enter your Anthropic API key in the sidebar before analyzing.")
-                                    break
-                                
-                                # Get API key from session state
-                                api_key = st.session_state.anthropic_api_key
-                                
-                                # Use Anthropic Claude with user-provided API key
-                                result = analyze_review(review_content, review_title, rating, api_key)
-                                
-                                # Add results to the analyzed data
-                                result_with_metadata = {
-                                    **row.to_dict(),
-                                    **result
-                                }
-                                analyzed_data.append(result_with_metadata)
-                                
-                                # Update categories
-                                categories['sentiment'].append(result['sentiment'])
-                                categories['aspect'].append(result['aspect'])
-                                categories['issue_type'].append(result['issue_type'])
-                                # Ensure keys exist before accessing
-                                if 'emotion' in result:
-                                    categories['emotion'].append(result['emotion'])
-                                else:
-                                    categories['emotion'].append('Neutral')
-                                    
-                                if 'urgency' in result:
-                                    categories['urgency'].append(result['urgency'])
-                                else:
-                                    categories['urgency'].append('Medium')
-                                
-                            except Exception as e:
-                                # Add error to collection
-                                error_msg = str(e)
-                                if error_msg not in st.session_state.analysis_errors:
-                                    st.session_state.analysis_errors.append(error_msg)
-                                
-                                # Create a default result for this row
-                                default_result = {
-                                    **row.to_dict(),
-                                    'sentiment': 'Neutral',
-                                    'sentiment_score': 0.0,
-                                    'aspect': 'Other',
-                                    'issue_type': 'General Feedback',
-                                    'emotion': 'Neutral',
-                                    'urgency': 'Medium',
-                                    'confidence': 0.5
-                                }
-                                analyzed_data.append(default_result)
-                                
-                                # Update categories with default values
-                                categories['sentiment'].append('Neutral')
-                                categories['aspect'].append('Other')
-                                categories['issue_type'].append('General Feedback')
-                                categories['emotion'].append('Neutral')
-                                categories['urgency'].append('Medium')
-                            
-                # Store analyzed data and categories in session state
-                st.session_state.analyzed_data = analyzed_data
-                st.session_state.categories = categories
-                
-                # Show analysis errors if any happened
-                if hasattr(st.session_state, 'analysis_errors') and st.session_state.analysis_errors:
-                    if len(st.session_state.analysis_errors) > 3:
-                        show_error(f"Some reviews had analysis issues ({len(st.session_state.analysis_errors)} total). Analysis continued with default values for these reviews.")
-                    else:
-                        show_error(f"Issues during analysis: {', '.join(st.session_state.analysis_errors[:3])}")
-                
-                # Generate knowledge base summaries
-                with st.spinner("Generating knowledge base summaries..."):
-                    knowledge_base = {}
-                    
-                    # Get API key from session state for knowledge base generation
-                    api_key = st.session_state.anthropic_api_key
-                    
-                    # Group by issue type
-                    issue_types = list(set(categories['issue_type']))
-                    
-                    for issue_type in issue_types:
-                        # Get all reviews for this issue type
-                        issue_reviews = [data.get('review_content', data.get('Detailed Review', '')) for data in analyzed_data 
-                                        if data['issue_type'] == issue_type]
-                        
-                        if issue_reviews:
-                            try:
-                                # Use Anthropic Claude for summarization with user-provided API key
-                                summary = generate_category_summary(issue_type, issue_reviews, api_key)
-                                knowledge_base[issue_type] = summary
-                            except Exception as e:
-                                st.error(f"Error generating summary for {issue_type}: {str(e)}")
-                    
-                    # Store knowledge base in session state
-                    st.session_state.knowledge_base = knowledge_base
-                    
-                st.success("✅ Analysis complete! Check the Analysis Results tab to see the insights.")
+                # If we reach here, the API key is valid - queue the run for a background worker
+                job_params = {
+                    'max_workers': st.session_state.analysis_concurrency,
+                    'batch_size': st.session_state.analysis_batch_size,
+                    'dedupe': st.session_state.analysis_dedupe,
+                    'cascade': st.session_state.analysis_routing == "Cheap model first",
+                    'cascade_threshold': st.session_state.cascade_threshold,
+                    'use_local_classifier': st.session_state.use_local_classifier and st.session_state.local_classifier is not None,
+                    'local_threshold': st.session_state.local_threshold,
+                    'summarize': True,
+                    'regenerate_threshold': st.session_state.regenerate_threshold
+                }
+                # The job checkpoints rows under this run ID, which is where live results are read from
+                reviews = collect_reviews(available_data)
+                st.session_state.analysis_input_rows = [review[0] for review in reviews]
+                st.session_state.analysis_run_id = compute_run_id([review[1:] for review in reviews])
+                ensure_workers(secrets={'api_key': api_key})
+                st.session_state.analysis_job_id = get_job_queue().submit(
+                    'analysis', job_params, owner=st.session_state.job_owner,
+                    files={'input': available_data}, secrets={'api_key': api_key}
+                )
+                st.session_state.analysis_messages = []
+                st.rerun()
+        
+        # Live progress of the analysis and knowledge base jobs
+        if st.session_state.analysis_job_id is not None or st.session_state.kb_job_id is not None:
+            show_analysis_progress()
+        
+        for message in st.session_state.analysis_messages:
+            st.info(message)
+        
+        if st.session_state.get('pending_analysis_error'):
+            show_error(st.session_state.pending_analysis_error)
+            st.session_state.pending_analysis_error = None
 
 # Tab 2: Analysis Results  
-with main_tab2:
-    if st.session_state.analyzed_data:
+@st.fragment(run_every=LIVE_REFRESH_SECONDS if analysis_running() else None)
+def show_analysis_results():
+    """Review categorization and charts, refreshed while an analysis is still running"""
+    analyzed_rows = current_analyzed_rows()
+    if analyzed_rows:
         st.header("Review Categorization")
+        if analysis_running():
+            st.caption(f"📡 Live results: {len(analyzed_rows)} of {len(st.session_state.analysis_input_rows)} analyzed, refreshing every {LIVE_REFRESH_SECONDS}s")
         
         # Show categorized data
-        analyzed_df = pd.DataFrame(st.session_state.analyzed_data)
+        analyzed_df = pd.DataFrame(analyzed_rows)
         
         # Basic columns for display - use actual column names from scraped data
         available_cols = analyzed_df.columns.tolist()
@@ -1035,9 +1205,14 @@ with main_tab2:
             )
             
             st.plotly_chart(fig5, use_container_width=True)
+    elif analysis_running():
+        st.info("⏳ Waiting for the first analyzed reviews...")
     else:
         st.info("Please upload and analyze data first in the 'Data Sourcing' tab.")
 
+with main_tab2:
+    show_analysis_results()
+
 # Tab 3: Visualizations
 with main_tab3:
     if st.session_state.analyzed_data:
@@ -1059,6 +1234,37 @@ with main_tab3:
                       title="Issues by Category", labels={'x': 'Issue Type', 'y': 'Count'})
         st.plotly_chart(fig2, use_container_width=True)
         
+        # Mapping of Claude's issue types onto the categories used by charts, filters and the knowledge base
+        if RAW_ISSUE_TYPE_COLUMN in analyzed_df.columns:
+            with st.expander("🗂️ Issue Type Taxonomy"):
+                st.caption("Similar issue types are merged into one category. Change a category to move an issue type, "
+                           "or give two categories the same name to merge them. Changes are kept for later analyses.")
+                taxonomy_df = (analyzed_df.groupby([RAW_ISSUE_TYPE_COLUMN, 'issue_type']).size()
+                               .reset_index(name='Reviews').sort_values(['issue_type', 'Reviews'], ascending=[True, False]))
+                taxonomy_df.columns = ['Issue Type', 'Category', 'Reviews']
+                edited_taxonomy = st.data_editor(taxonomy_df, disabled=['Issue Type', 'Reviews'], hide_index=True,
+                                                 use_container_width=True, key="taxonomy_editor")
+                
+                if st.button("💾 Save Taxonomy"):
+                    taxonomy = get_issue_taxonomy()
+                    changed = edited_taxonomy[edited_taxonomy['Category'].str.strip() != taxonomy_df['Category']]
+                    changed = changed[changed['Category'].str.strip() != ""]
+                    for _, row in changed.iterrows():
+                        taxonomy.set_canonical(row['Issue Type'], row['Category'].strip())
+                    st.session_state.analyzed_data = taxonomy.apply(st.session_state.analyzed_data)
+                    st.session_state.categories = build_categories(st.session_state.analyzed_data)
+                    
+                    # Summaries of categories that lost or gained issue types are out of date
+                    categories = set(st.session_state.categories['issue_type'])
+                    had_summaries = bool(st.session_state.knowledge_base)
+                    affected = (set(changed['Category'].str.strip()) | set(taxonomy_df.loc[changed.index, 'Category'])) & categories
+                    st.session_state.knowledge_base = {issue_type: summary for issue_type, summary in st.session_state.knowledge_base.items()
+                                                       if issue_type in categories and issue_type not in affected}
+                    if had_summaries and affected and st.session_state.anthropic_api_key and not job_active(st.session_state.kb_job_id):
+                        # Every changed category gets a new summary, however small the change
+                        resummarize_issue_types(sorted(affected), regenerate_threshold=0.0)
+                    st.rerun()
+        
         # Emotion Analysis (if available)
         if 'emotions' in analyzed_df.columns:
             st.subheader("Emotion Analysis")
@@ -1097,10 +1303,21 @@ with main_tab3:
 
 # Tab 4: Knowledge Base
 with main_tab4:
-    if st.session_state.knowledge_base:
+    kb_job_running = job_active(st.session_state.kb_job_id)
+    if st.session_state.knowledge_base or kb_job_running:
         st.header("Knowledge Base")
         st.markdown("This section contains automatically generated summaries and insights for each issue type to help train staff and provide feedback to vendors.")
         
+        # Summaries show up here as the background job finishes them
+        if kb_job_running:
+            show_partial_summaries()
+        elif st.session_state.failed_summaries and st.session_state.analyzed_data:
+            st.warning(f"{len(st.session_state.failed_summaries)} summaries could not be generated: "
+                       + ", ".join(st.session_state.failed_summaries))
+            if st.button("🔁 Retry Failed Summaries", disabled=not st.session_state.anthropic_api_key):
+                resummarize_issue_types(st.session_state.failed_summaries)
+                st.rerun()
+        
         # Display knowledge base entries
         for issue_type, summary in st.session_state.knowledge_base.items():
             with st.expander(f"📚 {issue_type}"):
@@ -1123,6 +1340,8 @@ with main_tab4:
                     with col1:
                         if st.button(f"Save Changes for {issue_type}"):
                             st.session_state.knowledge_base[issue_type] = edited_summary
+                            # Later runs that reuse this summary keep the edit
+                            get_knowledge_base_store().update_summary(issue_type, edited_summary)
                             st.session_state[f"editing_{issue_type}"] = False
                             st.rerun()
                     
@@ -1131,42 +1350,43 @@ with main_tab4:
                             st.session_state[f"editing_{issue_type}"] = False
                             st.rerun()
         
-        # Export knowledge base
-        st.header("Export Knowledge Base")
-        export_format = st.selectbox("Export Format", ["Excel", "CSV", "Markdown"])
+        # Export knowledge base once there is something to export
+        if st.session_state.knowledge_base:
+            st.header("Export Knowledge Base")
+            export_format = st.selectbox("Export Format", ["Excel", "CSV", "Markdown"])
         
-        if st.button("Export Knowledge Base"):
-            try:
-                export_data = export_knowledge_base(
-                    st.session_state.knowledge_base,
-                    format=export_format.lower()
-                )
+            if st.button("Export Knowledge Base"):
+                try:
+                    export_data = export_knowledge_base(
+                        st.session_state.knowledge_base,
+                        format=export_format.lower()
+                    )
                 
-                # Create download link
-                if export_format == "Excel":
-                    buffer = io.BytesIO()
-                    export_data.to_excel(buffer, index=False)
-                    buffer.seek(0)
-                    b64 = base64.b64encode(buffer.read()).decode()
-                    href = f'<a href="data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{b64}" download="knowledge_base.xlsx">Download Excel File</a>'
-                    st.markdown(href, unsafe_allow_html=True)
+                    # Create download link
+                    if export_format == "Excel":
+                        buffer = io.BytesIO()
+                        export_data.to_excel(buffer, index=False)
+                        buffer.seek(0)
+                        b64 = base64.b64encode(buffer.read()).decode()
+                        href = f'<a href="data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{b64}" download="knowledge_base.xlsx">Download Excel File</a>'
+                        st.markdown(href, unsafe_allow_html=True)
                 
-                elif export_format == "CSV":
-                    csv = export_data.to_csv(index=False)
-                    b64 = base64.b64encode(csv.encode()).decode()
-                    href = f'<a href="data:text/csv;base64,{b64}" download="knowledge_base.csv">Download CSV File</a>'
-                    st.markdown(href, unsafe_allow_html=True)
+                    elif export_format == "CSV":
+                        csv = export_data.to_csv(index=False)
+                        b64 = base64.b64encode(csv.encode()).decode()
+                        href = f'<a href="data:text/csv;base64,{b64}" download="knowledge_base.csv">Download CSV File</a>'
+                        st.markdown(href, unsafe_allow_html=True)
                 
-                elif export_format == "Markdown":
-                    markdown_text = export_data
-                    b64 = base64.b64encode(markdown_text.encode()).decode()
-                    href = f'<a href="data:text/markdown;base64,{b64}" download="knowledge_base.md">Download Markdown File</a>'
-                    st.markdown(href, unsafe_allow_html=True)
+                    elif export_format == "Markdown":
+                        markdown_text = export_data
+                        b64 = base64.b64encode(markdown_text.encode()).decode()
+                        href = f'<a href="data:text/markdown;base64,{b64}" download="knowledge_base.md">Download Markdown File</a>'
+                        st.markdown(href, unsafe_allow_html=True)
                 
-                st.success(f"Knowledge base exported as {export_format}!")
+                    st.success(f"Knowledge base exported as {export_format}!")
             
-            except Exception as e:
-                st.error(f"Error exporting knowledge base: {str(e)}")
+                except Exception as e:
+                    st.error(f"Error exporting knowledge base: {str(e)}")
     else:
         st.info("Please upload and analyze data in the 'Data Upload & Analysis' tab first to generate the knowledge base.")
 
@@ -0,0 +1,470 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+import pandas as pd
+
+from utils.anthropic_helper import ANALYSIS_MODEL, BULK_POLL_INTERVAL
+from utils.analysis_engine import DEFAULT_MAX_WORKERS, DEFAULT_BATCH_SIZE, bulk_analyze_dataframe
+from utils.analysis_run import BackgroundAnalysisRun, generate_knowledge_base, DEFAULT_SUMMARY_WORKERS
+from utils.data_processor import process_excel_file, export_knowledge_base
+from utils.local_classifier import DEFAULT_ROUTING_THRESHOLD
+from utils.model_cascade import DEFAULT_CONFIDENCE_THRESHOLD
+from utils.pipeline import (scrape_sources, crawl_full_histories, store_scraped_reviews, stream_scrape_and_analyze,
+                            build_engine_options)
+from utils.review_store import get_review_store, ANALYZED
+from utils.scrape_orchestrator import DEFAULT_SCRAPE_WORKERS
+from utils.knowledge_store import DEFAULT_REGENERATE_THRESHOLD
+from utils.progress import logging_callback
+from utils.taxonomy import get_issue_taxonomy, RAW_ISSUE_TYPE_COLUMN
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("ReviewPipelineCLI")
+
+# Output formats understood by TableWriter
+OUTPUT_FORMATS = ("csv", "parquet")
+
+# Analyzed rows are appended to CSV output in chunks of this many rows
+STREAM_FLUSH_ROWS = 100
+
+# Seconds between progress lines
+PROGRESS_INTERVAL = 5.0
+
+
+class BudgetExceeded(Exception):
+    """Raised once the estimated Claude spend of a run reaches its budget"""
+
+
+class TableWriter:
+    def __init__(self, path, output_format="csv", flush_rows=STREAM_FLUSH_ROWS):
+        """
+        Write rows to a CSV or Parquet file as they arrive
+
+        CSV output is appended every `flush_rows` rows, so a stopped run keeps what
+        it finished. Parquet files cannot be appended to, so Parquet output is
+        written once on close.
+
+        Args:
+            path (str): Output file path
+            output_format (str): 'csv' or 'parquet'
+            flush_rows (int): Buffered rows that trigger a CSV write
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+        self.path = path
+        self.output_format = output_format
+        self.flush_rows = flush_rows
+        self.rows_written = 0
+        self._pending = []
+        self._columns = None
+        if os.path.exists(path):
+            os.remove(path)
+
+    def add(self, row):
+        self._pending.append(row)
+        if self.output_format == "csv" and len(self._pending) >= self.flush_rows:
+            self.flush()
+
+    def add_frame(self, df):
+        for row in df.to_dict('records'):
+            self.add(row)
+
+    def flush(self):
+        """Append the buffered rows to a CSV file"""
+        if not self._pending or self.output_format != "csv":
+            return
+        chunk = pd.DataFrame(self._pending)
+        if self._columns is None:
+            self._columns = list(chunk.columns)
+        else:
+            # Keep the first chunk's column order, appending any column it did not have
+            self._columns += [column for column in chunk.columns if column not in self._columns]
+        chunk.reindex(columns=self._columns).to_csv(
+            self.path, mode='a', header=self.rows_written == 0, index=False
+        )
+        self.rows_written += len(self._pending)
+        self._pending = []
+
+    def close(self):
+        if self.output_format == "csv":
+            self.flush()
+        elif self._pending:
+            pd.DataFrame(self._pending).to_parquet(self.path, index=False)
+            self.rows_written += len(self._pending)
+            self._pending = []
+        return self.rows_written
+
+
+def read_reviews(path):
+    """
+    Load reviews from an Excel, CSV or Parquet file
+
+    Returns:
+        pd.DataFrame: The reviews
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".xlsx", ".xls"):
+        df, error_msg = process_excel_file(path)
+        if error_msg:
+            raise ValueError(f"Error processing {path}: {error_msg}")
+        return df
+    if extension == ".csv":
+        return pd.read_csv(path)
+    if extension == ".parquet":
+        return pd.read_parquet(path)
+    raise ValueError(f"Unsupported input file: {path}")
+
+
+def parse_company(value):
+    """Parse a 'NAME[,GOOGLE_ID[,TRUSTPILOT_URL]]' competitor argument"""
+    parts = [part.strip() for part in value.split(",")]
+    parts += [""] * (3 - len(parts))
+    if not parts[0]:
+        raise argparse.ArgumentTypeError("A competitor needs a name")
+    return {'name': parts[0], 'google_id': parts[1], 'trustpilot_url': parts[2]}
+
+
+def build_scraping_config(args):
+    """
+    Build the scraping configuration used by the app's scrape jobs from CLI arguments
+
+    Returns:
+        dict: {'main_company': {...}, 'competitors': [...]}
+    """
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    else:
+        config = {
+            'main_company': {'name': args.company, 'google_id': args.google_id or "",
+                             'trustpilot_url': args.trustpilot_url or ""},
+            'competitors': args.competitor or []
+        }
+    main_company = config['main_company']
+    if args.incremental:
+        config['incremental'] = True
+    if args.full_history:
+        config['full_history'] = True
+    main_company.setdefault('google_count', args.google_count)
+    main_company.setdefault('trustpilot_count', args.trustpilot_count)
+    config.setdefault('competitors', [])
+
+    if not main_company.get('name'):
+        raise ValueError("Company name is required")
+    if not (main_company.get('google_id') or main_company.get('trustpilot_url')):
+        raise ValueError("At least one of Google Play Store App ID or Trustpilot Company URL is required")
+    for i, competitor in enumerate(config['competitors']):
+        if not (competitor.get('google_id') or competitor.get('trustpilot_url')):
+            raise ValueError(f"Competitor {i+1} requires at least one source (Google Play ID or Trustpilot URL)")
+    return config
+
+
+def make_progress_printer(stage):
+    """Return a progress callback that prints at most every PROGRESS_INTERVAL seconds"""
+    last_print = [0.0]
+
+    def report(completed, total, message=None):
+        now = time.time()
+        if completed < total and now - last_print[0] < PROGRESS_INTERVAL:
+            return
+        last_print[0] = now
+        print(f"[{stage}] {completed}/{total} {message or ''}".rstrip(), file=sys.stderr, flush=True)
+
+    return report
+
+
+def analysis_settings(args):
+    """
+    Resolve the API key and analysis engine options of a run
+
+    Returns:
+        tuple: (api_key, engine_options)
+    """
+    api_key = args.api_key or os.environ.get("ANTHROPIC_API_KEY", "")
+    if not api_key:
+        raise ValueError("An Anthropic API key is required for analysis, pass --api-key or set ANTHROPIC_API_KEY")
+    params = {
+        'max_workers': args.workers,
+        'batch_size': args.batch_size,
+        'dedupe': not args.no_dedupe,
+        'cascade': args.cascade or args.budget is not None,
+        'cascade_threshold': args.cascade_threshold,
+        'use_local_classifier': args.local_classifier,
+        'local_threshold': args.local_threshold
+    }
+    if args.budget is not None and not args.cascade:
+        # A single-tier cascade is the same as a plain run, but records token usage for the budget
+        params['cascade_tiers'] = [ANALYSIS_MODEL]
+    engine_options = build_engine_options(params)
+    if args.local_classifier and engine_options.get('local_classifier') is None:
+        logger.warning("No local classifier trained yet, every review goes to Claude")
+    return api_key, engine_options
+
+
+def make_analysis_progress(args, engine_options, stage):
+    """Return an analysis progress callback that prints progress and enforces --budget"""
+    print_progress = make_progress_printer(stage)
+    cascade = engine_options.get('cascade')
+
+    def on_progress(completed, total):
+        print_progress(completed, total)
+        if args.budget is not None:
+            spent = cascade.stats.report()['estimated_cost']
+            if spent >= args.budget:
+                raise BudgetExceeded(f"Estimated spend ${spent:.2f} reached the ${args.budget:.2f} budget")
+
+    return on_progress
+
+
+def run_pipeline(args):
+    """
+    Scrape or load reviews, analyze them and build the knowledge base
+
+    Returns:
+        int: Process exit code
+    """
+    os.makedirs(args.output_dir, exist_ok=True)
+    extension = args.format
+    timings = []
+    reviews_path = os.path.join(args.output_dir, f"reviews.{extension}")
+    analyzed_path = os.path.join(args.output_dir, f"analyzed.{extension}")
+    exit_code = 0
+    analyzed_data = None
+    bulk_options = {'base_url': args.bulk_base_url, 'poll_interval': args.bulk_poll_interval} if args.bulk else None
+
+    def finish_stage(name, started, detail):
+        elapsed = time.time() - started
+        timings.append((name, elapsed, detail))
+        print(f"[{name}] done in {elapsed:.1f}s: {detail}", file=sys.stderr, flush=True)
+
+    def write_reviews(df):
+        reviews_writer = TableWriter(reviews_path, extension)
+        reviews_writer.add_frame(df)
+        reviews_writer.close()
+
+    if args.stream and not args.input and not args.skip_analysis:
+        # Stages 1 and 2 together: analyze each page of reviews while the next ones download
+        api_key, engine_options = analysis_settings(args)
+        if args.max_analyze:
+            logger.warning("--max-analyze is ignored with --stream, every scraped review is analyzed")
+        started = time.time()
+        analyzed_writer = TableWriter(analyzed_path, extension)
+        stream = None
+        try:
+            stream, analyzed_data, _ = stream_scrape_and_analyze(
+                build_scraping_config(args), api_key, engine_options,
+                progress_callback=make_analysis_progress(args, engine_options, "scrape+analyze"),
+                event_callback=logging_callback(logger),
+                result_callback=lambda position, row: analyzed_writer.add(row),
+                max_workers=args.scrape_workers, deadline=args.deadline
+            )
+        except BudgetExceeded as e:
+            logger.error(f"{e}. Scraping was stopped as well.")
+            exit_code = 2
+        finally:
+            written = analyzed_writer.close()
+        if stream is not None:
+            write_reviews(stream.scraped)
+            logger.info(f"Analysis ran {stream.stats['overlap']:.0%} of its time while scraping, first result "
+                        f"after {stream.stats['first_result_seconds'] or 0:.1f}s")
+        finish_stage("scrape+analyze", started, f"{written} reviews analyzed -> {analyzed_path}")
+        if stream is not None and stream.errors:
+            logger.warning(f"Analysis hit {len(stream.errors)} distinct errors, the affected reviews got default values")
+        if exit_code == 0 and not analyzed_data:
+            logger.error("No reviews to analyze")
+            return 1
+    else:
+        # Stage 1: collect reviews
+        started = time.time()
+        if args.input:
+            df = read_reviews(args.input)
+            stage = "load"
+        else:
+            config = build_scraping_config(args)
+            started_ns = time.time_ns()
+            for crawl in crawl_full_histories(config, event_callback=logging_callback(logger)):
+                if not crawl['complete']:
+                    logger.warning(f"The crawl of {crawl['app_id']} stopped early, rerun to resume it")
+            scraped = scrape_sources(config, progress_callback=make_progress_printer("scrape"),
+                                     event_callback=logging_callback(logger), max_workers=args.scrape_workers,
+                                     deadline=args.deadline)
+            query, counts = store_scraped_reviews(config, scraped, started_ns)
+            logger.info(f"Review store: {counts['inserted']} new and {counts['updated']} updated reviews")
+            df = get_review_store().read(**query)
+            stage = "scrape"
+        write_reviews(df)
+        finish_stage(stage, started, f"{len(df)} reviews -> {reviews_path}")
+        if df.empty:
+            logger.error("No reviews to analyze")
+            return 1
+
+        if not args.skip_analysis and args.bulk:
+            api_key, _ = analysis_settings(args)
+            if args.max_analyze:
+                df = df.head(args.max_analyze)
+
+            # Stage 2: analyze offline as one Message Batch, rerunning the command resumes it
+            started = time.time()
+            analyzed_data, errors = bulk_analyze_dataframe(df, api_key, bulk_options)
+            analyzed_data = get_issue_taxonomy().apply(analyzed_data)
+            analyzed_writer = TableWriter(analyzed_path, extension)
+            for row in analyzed_data:
+                analyzed_writer.add(row)
+            written = analyzed_writer.close()
+            if analyzed_data:
+                get_review_store(ANALYZED).upsert(pd.DataFrame(analyzed_data))
+            finish_stage("analyze", started, f"{written} reviews -> {analyzed_path}")
+            if errors:
+                logger.warning(f"{len(errors)} reviews had analysis issues and got default values")
+        elif not args.skip_analysis:
+            api_key, engine_options = analysis_settings(args)
+            if args.max_analyze:
+                df = df.head(args.max_analyze)
+
+            # Stage 2: analyze, streaming rows to disk as they complete
+            started = time.time()
+            analyzed_writer = TableWriter(analyzed_path, extension)
+            cascade = engine_options.get('cascade')
+            taxonomy = get_issue_taxonomy()
+            run = BackgroundAnalysisRun(
+                df, api_key, engine_options, summarize=False, resumable=not args.no_resume,
+                progress_callback=make_analysis_progress(args, engine_options, "analyze"),
+                result_callback=lambda position, row: analyzed_writer.add(taxonomy.apply([row])[0])
+            )
+            try:
+                analyzed_data = taxonomy.apply(run.run())
+            except BudgetExceeded as e:
+                # Finished rows are checkpointed, so rerunning with a larger budget resumes the run
+                analyzed_data = None
+                logger.error(f"{e}. Rerun the same command with a larger --budget to continue.")
+                exit_code = 2
+            finally:
+                written = analyzed_writer.close()
+            if analyzed_data:
+                get_review_store(ANALYZED).upsert(pd.DataFrame(analyzed_data))
+            finish_stage("analyze", started, f"{written} of {run.store.total} reviews -> {analyzed_path}")
+            if run.store.resumed_rows:
+                logger.info(f"Resumed run {run.store.run_id}: {run.store.resumed_rows} reviews restored from its checkpoint")
+            if run.store.errors:
+                logger.warning(f"{len(run.store.errors)} reviews had analysis issues and got default values")
+            if cascade is not None:
+                logger.info(f"Estimated Claude spend: ${cascade.stats.report()['estimated_cost']:.2f}")
+
+    if analyzed_data:
+        # The categories every issue type of this run was merged into
+        taxonomy_path = os.path.join(args.output_dir, f"issue_taxonomy.{extension}")
+        issue_types = (pd.DataFrame(analyzed_data).groupby([RAW_ISSUE_TYPE_COLUMN, 'issue_type']).size()
+                       .reset_index(name='reviews').sort_values(['issue_type', 'reviews'], ascending=[True, False]))
+        taxonomy_writer = TableWriter(taxonomy_path, extension)
+        taxonomy_writer.add_frame(issue_types)
+        taxonomy_writer.close()
+        logger.info(f"Merged {len(issue_types)} issue types into {issue_types['issue_type'].nunique()} categories "
+                    f"-> {taxonomy_path}")
+
+    # Stage 3: knowledge base
+    if analyzed_data and not args.skip_summaries:
+        started = time.time()
+        knowledge_base, failed = generate_knowledge_base(
+            analyzed_data, api_key, progress_callback=make_progress_printer("summarize"),
+            max_workers=args.summary_workers, regenerate_threshold=args.regenerate_threshold,
+            bulk_options=bulk_options
+        )
+        markdown_path = os.path.join(args.output_dir, "knowledge_base.md")
+        with open(markdown_path, 'w', encoding='utf-8') as f:
+            f.write(export_knowledge_base(knowledge_base, format='markdown'))
+        table_path = os.path.join(args.output_dir, f"knowledge_base.{extension}")
+        table_writer = TableWriter(table_path, extension)
+        table_writer.add_frame(export_knowledge_base(knowledge_base, format='csv'))
+        table_writer.close()
+        finish_stage("summarize", started, f"{len(knowledge_base)} summaries -> {markdown_path}")
+        if failed:
+            logger.warning(f"Could not generate summaries for: {', '.join(failed)}")
+            exit_code = exit_code or 1
+
+    print("\nStage timings:")
+    for name, elapsed, detail in timings:
+        print(f"  {name:<10} {elapsed:8.1f}s  {detail}")
+    print(f"  {'total':<10} {sum(elapsed for _, elapsed, _ in timings):8.1f}s")
+    return exit_code
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Scrape reviews, analyze them with Claude and build a knowledge base, without the web UI"
+    )
+    source = parser.add_argument_group("review source (scrape or --input)")
+    source.add_argument("--input", help="Analyze an existing Excel, CSV or Parquet file instead of scraping")
+    source.add_argument("--config", help="JSON scraping configuration with 'main_company' and 'competitors'")
+    source.add_argument("--company", help="Main company name")
+    source.add_argument("--google-id", help="Main company's Google Play Store app ID")
+    source.add_argument("--trustpilot-url", help="Main company's Trustpilot URL")
+    source.add_argument("--competitor", action="append", type=parse_company, metavar="NAME[,GOOGLE_ID[,TRUSTPILOT_URL]]",
+                        help="A competitor to benchmark, may be repeated")
+    source.add_argument("--google-count", type=int, default=100, help="Google Play reviews per company")
+    source.add_argument("--trustpilot-count", type=int, default=50, help="Trustpilot reviews per company")
+    source.add_argument("--scrape-workers", type=int, default=DEFAULT_SCRAPE_WORKERS,
+                        help="Crawls running at the same time, each site still gets at most a few")
+    source.add_argument("--incremental", action="store_true",
+                        help="Only collect reviews newer than the previous incremental scrape of each source")
+    source.add_argument("--full-history", action="store_true",
+                        help="Crawl every Google Play review of each app into the review store, resuming "
+                             "an unfinished crawl")
+    source.add_argument("--deadline", type=float, help="Stop scraping after this many seconds and keep what was collected")
+
+    analysis = parser.add_argument_group("analysis")
+    analysis.add_argument("--api-key", help="Anthropic API key, defaults to ANTHROPIC_API_KEY")
+    analysis.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS, help="Parallel Claude requests")
+    analysis.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Reviews per Claude request")
+    analysis.add_argument("--no-dedupe", action="store_true", help="Analyze near-duplicate reviews separately")
+    analysis.add_argument("--cascade", action="store_true", help="Analyze with the cheap model first")
+    analysis.add_argument("--cascade-threshold", type=float, default=DEFAULT_CONFIDENCE_THRESHOLD)
+    analysis.add_argument("--local-classifier", action="store_true", help="Label confident reviews locally")
+    analysis.add_argument("--local-threshold", type=float, default=DEFAULT_ROUTING_THRESHOLD)
+    analysis.add_argument("--budget", type=float, help="Stop analysis once the estimated Claude spend reaches this many USD")
+    analysis.add_argument("--max-analyze", type=int, help="Analyze at most this many reviews")
+    analysis.add_argument("--no-resume", action="store_true", help="Do not checkpoint or resume the analysis")
+    analysis.add_argument("--stream", action="store_true",
+                          help="Analyze scraped reviews while scraping continues, without checkpoints")
+    analysis.add_argument("--bulk", action="store_true",
+                          help="Analyze and summarize offline through the Message Batches API at half the price, "
+                               "which can take up to a day. Rerun the same command to resume waiting")
+    analysis.add_argument("--bulk-base-url", help="Message Batches endpoint, e.g. a local utils.batch_stub_server")
+    analysis.add_argument("--bulk-poll-interval", type=float, default=BULK_POLL_INTERVAL,
+                          help="Seconds between batch status checks")
+    analysis.add_argument("--skip-analysis", action="store_true", help="Only collect reviews")
+    analysis.add_argument("--skip-summaries", action="store_true", help="Do not generate the knowledge base")
+    analysis.add_argument("--summary-workers", type=int, default=DEFAULT_SUMMARY_WORKERS,
+                          help="Knowledge base summaries requested at the same time")
+    analysis.add_argument("--regenerate-threshold", type=float, default=DEFAULT_REGENERATE_THRESHOLD,
+                          help="Reuse the stored summary of an issue type unless more than this share of its "
+                               "reviews changed, 0 regenerates every changed issue type")
+
+    output = parser.add_argument_group("output")
+    output.add_argument("--output-dir", default="output", help="Directory for reviews, analysis and knowledge base")
+    output.add_argument("--format", choices=OUTPUT_FORMATS, default="csv", help="Table output format")
+    output.add_argument("--quiet", action="store_true", help="Only log warnings and errors")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not (args.input or args.config or args.company):
+        parser.error("pass --input, --config or --company")
+    if args.bulk and args.stream:
+        parser.error("--bulk cannot be combined with --stream")
+    if args.quiet:
+        logging.getLogger().setLevel(logging.WARNING)
+    try:
+        return run_pipeline(args)
+    except (ValueError, OSError, ImportError) as e:
+        logger.error(str(e))
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import utils.anthropic_helper as anthropic_helper
+from utils.analysis_engine import ReviewAnalysisEngine, FALLBACK_RESULT
+from utils.checkpoint import CheckpointStore
+
+
+ANALYSIS = {'sentiment': 'Negative', 'sentiment_score': -0.6, 'aspect': 'Product', 'issue_type': 'App Crash',
+            'emotion': 'Anger', 'urgency': 'High', 'confidence': 0.9}
+
+
+def flaky_analyze(review_content, review_title, rating, api_key):
+    if review_content == "fails":
+        raise Exception("Review analysis failed: overloaded")
+    return dict(ANALYSIS)
+
+
+def test_failed_reviews_are_not_checkpointed_and_are_retried(tmp_path):
+    df = pd.DataFrame({'review_content': ["crashes on start", "fails"]})
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite"))
+
+    engine = ReviewAnalysisEngine(api_key="test-key", analyze_fn=flaky_analyze, batch_size=1)
+    checkpoint = store.open_run("run", 2)
+    rows = engine.analyze_dataframe(df, checkpoint=checkpoint)
+
+    assert rows[0]['issue_type'] == 'App Crash'
+    assert rows[1]['issue_type'] == FALLBACK_RESULT['issue_type']
+    assert engine.errors
+    assert set(checkpoint.completed()) == {0}
+
+    engine = ReviewAnalysisEngine(api_key="test-key", analyze_fn=lambda *args: dict(ANALYSIS), batch_size=1)
+    rows = engine.analyze_dataframe(df, checkpoint=store.open_run("run", 2))
+    assert engine.resumed_rows == 1
+    assert rows[1]['issue_type'] == 'App Crash'
+
+
+def test_analyze_review_raises_instead_of_returning_defaults(monkeypatch):
+    monkeypatch.setenv("REVIEW_CACHE_DISABLED", "1")
+
+    def overloaded(params, api_key=None):
+        raise RuntimeError("overloaded")
+
+    monkeypatch.setattr(anthropic_helper, "create_message", overloaded)
+    with pytest.raises(Exception, match="overloaded"):
+        anthropic_helper.analyze_review("crashes on start", api_key="test-key")
+
+    monkeypatch.setattr(anthropic_helper, "create_message",
+                        lambda params, api_key=None: SimpleNamespace(content=[SimpleNamespace(text="not JSON")]))
+    assert anthropic_helper.analyze_reviews_batch(
+        [{'id': 'a', 'content': "crashes on start"}], api_key="test-key", max_batch_size=1
+    ) == {}
+
+
+def test_batch_api_errors_are_raised_without_fanning_out(monkeypatch):
+    monkeypatch.setenv("REVIEW_CACHE_DISABLED", "1")
+    calls = []
+
+    def unauthorized(params, api_key=None):
+        calls.append(params)
+        raise RuntimeError("invalid x-api-key")
+
+    monkeypatch.setattr(anthropic_helper, "create_message", unauthorized)
+    reviews = [{'id': str(i), 'content': f"review {i}"} for i in range(10)]
+    with pytest.raises(RuntimeError):
+        anthropic_helper.analyze_reviews_batch(reviews, api_key="test-key")
+    assert len(calls) == 1
@@ -0,0 +1,90 @@
+import json
+
+import pandas as pd
+import pytest
+
+import utils.anthropic_helper as anthropic_helper
+from utils.analysis_engine import bulk_analyze_dataframe, FALLBACK_RESULT
+from utils.anthropic_helper import bulk_analyze_reviews, bulk_generate_category_summaries, load_bulk_state
+from utils.batch_stub_server import start_stub_server, STUB_ANALYSIS
+
+
+def echo_responder(params):
+    """Answer every analysis request with the review content as its issue type"""
+    content = params['messages'][0]['content']
+    if 'JSON' not in params.get('system', ''):
+        return f"## Summary\n\n{content[-20:]}"
+    review = content.split("Content: ")[-1].strip()
+    if review == "garbled":
+        return "not JSON"
+    return json.dumps({**STUB_ANALYSIS, 'issue_type': review})
+
+
+@pytest.fixture
+def stub_server(tmp_path, monkeypatch):
+    monkeypatch.setenv("REVIEW_CACHE_DISABLED", "1")
+    monkeypatch.setattr(anthropic_helper, "BULK_STATE_DIR", str(tmp_path / "batches"))
+    server = start_stub_server(responder=echo_responder)
+    yield server
+    server.shutdown()
+
+
+def run_bulk(server, reviews, **kwargs):
+    results, failed = bulk_analyze_reviews(reviews, api_key="test-key", base_url=server.base_url, poll_interval=0.01,
+                                           **kwargs)
+    assert failed == {}
+    return results
+
+
+def test_bulk_runs_over_different_reviews_do_not_share_results(stub_server, tmp_path):
+    first = run_bulk(stub_server, [{'id': 'a', 'content': "alpha"}, {'id': 'b', 'content': "bravo"}])
+    second = run_bulk(stub_server, [{'id': 'b', 'content': "bravo"}, {'id': 'c', 'content': "charlie"}])
+
+    assert {review_id: result['issue_type'] for review_id, result in first.items()} == {'a': "alpha", 'b': "bravo"}
+    assert {review_id: result['issue_type'] for review_id, result in second.items()} == {'b': "bravo", 'c': "charlie"}
+    assert len(stub_server.batches) == 2
+    assert not list((tmp_path / "batches").iterdir())
+
+
+def test_bulk_refuses_a_state_file_of_other_reviews(stub_server, tmp_path):
+    state_path = str(tmp_path / "analysis.json")
+    anthropic_helper.submit_bulk_batch(
+        [{'custom_id': "review-a", 'params': anthropic_helper._analysis_request_params("alpha")}],
+        'analysis', {"review-a": 'a'}, state_path, api_key="test-key", base_url=stub_server.base_url
+    )
+
+    with pytest.raises(ValueError):
+        run_bulk(stub_server, [{'id': 'c', 'content': "charlie"}], state_path=state_path)
+    assert load_bulk_state(state_path) is not None
+
+    assert run_bulk(stub_server, [{'id': 'a', 'content': "alpha"}], state_path=state_path)['a']['issue_type'] == "alpha"
+    assert len(stub_server.batches) == 1
+    assert load_bulk_state(state_path) is None
+
+
+def test_bulk_summaries_of_large_issue_types_cover_every_chunk(stub_server, monkeypatch):
+    summarized = {}
+    monkeypatch.setattr(anthropic_helper, "generate_category_summary",
+                        lambda issue_type, reviews, api_key=None: summarized.setdefault(issue_type, len(reviews)))
+    large = [f"review {i} " + "words " * 400 for i in range(200)]
+
+    knowledge_base, failed = bulk_generate_category_summaries(
+        {"Small": ["one short review"], "Large": large},
+        api_key="test-key", base_url=stub_server.base_url, poll_interval=0.01
+    )
+
+    assert failed == {}
+    assert summarized == {"Large": 200}
+    assert set(knowledge_base) == {"Small", "Large"}
+    assert len(stub_server.batches) == 1
+
+
+def test_bulk_reviews_without_a_usable_result_are_reported_as_errors(stub_server):
+    df = pd.DataFrame({'review_content': ["alpha", "garbled"]})
+
+    rows, errors = bulk_analyze_dataframe(df, api_key="test-key",
+                                          bulk_options={'base_url': stub_server.base_url, 'poll_interval': 0.01})
+
+    assert rows[0]['issue_type'] == "alpha"
+    assert rows[1]['issue_type'] == FALLBACK_RESULT['issue_type']
+    assert len(errors) == 1 and "review 1" in errors[0]
@@ -0,0 +1,19 @@
+import numpy as np
+
+import utils.dedup as dedup
+from utils.analysis_engine import dedup_text
+from utils.dedup import MinHasher, normalize_for_dedup
+
+
+def test_signatures_do_not_depend_on_the_memory_cap(monkeypatch):
+    texts = [normalize_for_dedup(text) for text in ["app keeps crashing", "great app " * 500, "ok"]]
+    hasher = MinHasher()
+    expected = hasher.signatures(texts)
+
+    monkeypatch.setattr(dedup, "MAX_HASH_CELLS", 1000)
+    assert np.array_equal(hasher.signatures(texts), expected)
+
+
+def test_missing_titles_are_left_out_of_the_compared_text():
+    assert dedup_text("app keeps crashing", float('nan')) == dedup_text("app keeps crashing", None)
+    assert "nan" not in dedup_text("app keeps crashing", float('nan'))
@@ -0,0 +1,44 @@
+import sqlite3
+
+from utils.jobs import JobQueue, JobContext, secrets_fingerprint, FAILED, QUEUED
+
+
+def test_secrets_stay_out_of_the_queue_file(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    queue = JobQueue(path)
+    job_id = queue.submit('analysis', {'run': 1}, secrets={'api_key': "sk-secret"})
+
+    with open(path, 'rb') as db_file:
+        assert b"sk-secret" not in db_file.read()
+    assert queue.claim(1) is None
+    assert queue.claim(2, secrets_fingerprint({'api_key': "other"})) is None
+
+    job = queue.claim(3, secrets_fingerprint({'api_key': "sk-secret"}))
+    assert job['id'] == job_id
+    assert JobContext(queue, job, {'api_key': "sk-secret"}).secrets == {'api_key': "sk-secret"}
+
+
+def test_secrets_of_older_queues_are_purged_on_open(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    queue = JobQueue(path)
+    job_id = queue.submit('analysis')
+    queue._execute("UPDATE jobs SET secrets = ? WHERE id = ?", ('{"api_key": "sk-secret"}', job_id))
+
+    JobQueue(path)
+    assert sqlite3.connect(path).execute("SELECT secrets FROM jobs").fetchone() == (None,)
+
+
+def test_jobs_of_replaced_secrets_fail_instead_of_waiting_forever(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    old_key = secrets_fingerprint({'api_key': "old"})
+    new_key = secrets_fingerprint({'api_key': "new"})
+    queue.register_worker(1, old_key)
+    waiting = queue.submit('analysis', secrets={'api_key': "old"})
+
+    queue.retire_workers(new_key)
+    assert queue.is_retired(1)
+    assert queue.get(waiting)['status'] == QUEUED
+
+    queue.unregister_worker(1)
+    queue.retire_workers(new_key)
+    assert queue.get(waiting)['status'] == FAILED
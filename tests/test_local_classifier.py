@@ -0,0 +1,19 @@
+from utils.anthropic_helper import ANALYSIS_MODEL, ANALYSIS_PROMPT_VERSION
+from utils.llm_cache import LLMCache
+from utils.local_classifier import load_training_data
+from utils.model_cascade import DEFAULT_MODEL_TIERS
+
+
+def test_training_data_leaves_out_cheap_tier_labels(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.sqlite"))
+    # The cheap tier's low-confidence answer was escalated and overruled by the last tier
+    cache.set("cheap", {'issue_type': "General Feedback", 'confidence': 0.4}, 'analysis', DEFAULT_MODEL_TIERS[0],
+              ANALYSIS_PROMPT_VERSION, input_text="Content: app crashes on start")
+    cache.set("final", {'issue_type': "App Crash", 'confidence': 0.9}, 'analysis', ANALYSIS_MODEL,
+              ANALYSIS_PROMPT_VERSION, input_text="Content: app crashes on start")
+
+    texts, results = load_training_data(cache)
+
+    assert texts == ["Content: app crashes on start"]
+    assert [result['issue_type'] for result in results] == ["App Crash"]
+    assert len(load_training_data(cache, model=DEFAULT_MODEL_TIERS[0])[1]) == 1
@@ -0,0 +1,18 @@
+from utils.model_cascade import ModelCascade
+
+
+ANALYSIS = {'sentiment': 'Negative', 'sentiment_score': -0.6, 'aspect': 'Product', 'issue_type': 'App Crash',
+            'emotion': 'Anger', 'urgency': 'High', 'confidence': 0.9}
+
+
+def test_escalated_reviews_the_last_tier_misses_are_left_out():
+    def analyze_batch(reviews, api_key, max_batch_size=None, model=None, usage_callback=None):
+        if model == "cheap":
+            return {'a': dict(ANALYSIS), 'b': {**ANALYSIS, 'sentiment': 'Meh', 'aspect': 'Foo'}}
+        return {}
+
+    cascade = ModelCascade(tiers=["cheap", "large"], analyze_batch_fn=analyze_batch)
+    results = cascade.analyze_batch([{'id': 'a', 'content': "crashes"}, {'id': 'b', 'content': "meh"}])
+
+    assert set(results) == {'a'}
+    assert results['a']['analysis_model'] == "cheap"
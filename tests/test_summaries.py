@@ -0,0 +1,23 @@
+from types import SimpleNamespace
+
+import utils.anthropic_helper as anthropic_helper
+
+
+def test_every_chunk_of_a_large_issue_type_is_summarized(monkeypatch):
+    monkeypatch.setenv("REVIEW_CACHE_DISABLED", "1")
+    sent = []
+
+    def record(params, api_key=None):
+        sent.append(params['messages'][0]['content'])
+        return SimpleNamespace(content=[SimpleNamespace(text="notes")])
+
+    monkeypatch.setattr(anthropic_helper, "create_message", record)
+    # Long distinct reviews need far more chunks than one reduce level merges
+    reviews = [f"review {i} " + f"word{i} " * 1500 for i in range(80)]
+
+    anthropic_helper.generate_category_summary("App Crash", reviews, api_key="test-key", max_workers=1)
+
+    assert len(anthropic_helper._summary_chunks(reviews)) > 32
+    for i in range(80):
+        assert any(f"review {i} word{i}" in content for content in sent)
+    assert "notes on 80 reviews" in sent[-1]
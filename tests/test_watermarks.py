@@ -0,0 +1,32 @@
+from utils.watermarks import WatermarkStore, IncrementalScrape
+
+
+def page(*days):
+    return [{'Review Id': f"r{day}", 'Review Date time': f"2024-01-{day:02d}T12:00:00"} for day in days]
+
+
+def scrape(store, reviews, exhausted=False):
+    incremental = IncrementalScrape(store, 'Trustpilot', "https://example.com")
+    new_reviews = incremental.filter_new(reviews)
+    incremental.commit(exhausted=exhausted)
+    return new_reviews
+
+
+def test_watermark_only_moves_once_the_old_one_is_reached(tmp_path):
+    store = WatermarkStore(str(tmp_path / "watermarks.sqlite"))
+    scrape(store, page(5, 4))
+    assert store.get('Trustpilot', "https://example.com")['newest_review_id'] == "r5"
+
+    # Stopped at max_reviews before reaching r5, so r6 and r7 must come again
+    assert [review['Review Id'] for review in scrape(store, page(9, 8))] == ["r9", "r8"]
+    assert store.get('Trustpilot', "https://example.com")['newest_review_id'] == "r5"
+
+    assert [review['Review Id'] for review in scrape(store, page(9, 8, 7, 6, 5))] == ["r9", "r8", "r7", "r6"]
+    assert store.get('Trustpilot', "https://example.com")['newest_review_id'] == "r9"
+
+
+def test_watermark_moves_when_the_source_ran_out_of_reviews(tmp_path):
+    store = WatermarkStore(str(tmp_path / "watermarks.sqlite"))
+    scrape(store, page(5))
+    scrape(store, page(8, 7), exhausted=True)
+    assert store.get('Trustpilot', "https://example.com")['newest_review_id'] == "r8"
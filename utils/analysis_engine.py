@@ -0,0 +1,377 @@
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from utils.anthropic_helper import analyze_review, analyze_reviews_batch, bulk_analyze_reviews
+from utils.dedup import cluster_near_duplicates
+from utils.local_classifier import review_input_text, DEFAULT_ROUTING_THRESHOLD
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("AnalysisEngine")
+
+# Number of Claude requests kept in flight at the same time
+DEFAULT_MAX_WORKERS = 8
+
+# Number of reviews packed into a single Claude request (1 disables batching). Ten reviews
+# fit MAX_BATCH_CHARS for typical review lengths and cut the requests tenfold.
+DEFAULT_BATCH_SIZE = 10
+
+# Result used for a row whose analysis raised an unexpected error
+FALLBACK_RESULT = {
+    'sentiment': 'Neutral',
+    'sentiment_score': 0.0,
+    'aspect': 'Other',
+    'issue_type': 'General Feedback',
+    'emotion': 'Neutral',
+    'urgency': 'Medium',
+    'confidence': 0.5
+}
+
+
+def extract_review_fields(row):
+    """
+    Extract the review content, title and rating from a data row
+
+    Handles both the scraped column names and the uploaded file column names.
+
+    Args:
+        row (dict or pd.Series): A single review row
+
+    Returns:
+        tuple: (review_content, review_title, rating)
+    """
+    review_content = row.get('Detailed Review', row.get('review_content', ''))
+    review_title = row.get('review_title', row.get('Review Title', ''))
+    rating = row.get('Ratings on Playstore', row.get('rating', None))
+    return review_content, review_title, rating
+
+
+def is_empty_review(review_content):
+    """Return True when a review has no content worth analyzing"""
+    if review_content is None:
+        return True
+    if not isinstance(review_content, str) and pd.isna(review_content):
+        return True
+    return isinstance(review_content, str) and review_content.strip() == ""
+
+
+def dedup_text(review_content, review_title):
+    """Return the text compared for near-duplicate detection, leaving out missing titles"""
+    if review_title is None or (not isinstance(review_title, str) and pd.isna(review_title)):
+        review_title = ''
+    return f"{review_title} {review_content}"
+
+
+def collect_reviews(df):
+    """
+    Collect the rows worth analyzing, skipping empty reviews
+
+    Args:
+        df (pd.DataFrame): The reviews
+
+    Returns:
+        list: (row_dict, review_content, review_title, rating) for every non-empty review
+    """
+    rows = []
+    for _, row in df.iterrows():
+        review_content, review_title, rating = extract_review_fields(row)
+        if is_empty_review(review_content):
+            continue
+        rows.append((row.to_dict(), review_content, review_title, rating))
+    return rows
+
+
+def build_categories(analyzed_data):
+    """
+    Build the per-field category lists used by the dashboard filters
+
+    Args:
+        analyzed_data (list): List of analyzed review dictionaries
+
+    Returns:
+        dict: Lists of sentiment, aspect, issue_type, emotion and urgency values
+    """
+    categories = {
+        'sentiment': [],
+        'aspect': [],
+        'issue_type': [],
+        'emotion': [],
+        'urgency': []
+    }
+    for result in analyzed_data:
+        categories['sentiment'].append(result.get('sentiment', 'Neutral'))
+        categories['aspect'].append(result.get('aspect', 'Other'))
+        categories['issue_type'].append(result.get('issue_type', 'General Feedback'))
+        categories['emotion'].append(result.get('emotion', 'Neutral'))
+        categories['urgency'].append(result.get('urgency', 'Medium'))
+    return categories
+
+
+class ReviewAnalysisEngine:
+    def __init__(self, api_key=None, max_workers=DEFAULT_MAX_WORKERS, batch_size=DEFAULT_BATCH_SIZE,
+                 dedupe=False, cascade=None, local_classifier=None, local_threshold=DEFAULT_ROUTING_THRESHOLD,
+                 analyze_fn=None, analyze_batch_fn=None):
+        """
+        Initialize the concurrent review analysis engine
+
+        Args:
+            api_key (str, optional): The Anthropic API key
+            max_workers (int): Maximum number of Claude requests in flight at the same time
+            batch_size (int): Number of reviews packed into one request (1 sends one review per request)
+            dedupe (bool): Analyze one representative per cluster of near-duplicate reviews
+            cascade (ModelCascade, optional): Route each review through cheap-first model tiers
+            local_classifier (LocalReviewClassifier, optional): Label confident reviews locally
+                and send only the rest to Claude
+            local_threshold (float): Minimum local classifier confidence on every field
+            analyze_fn (callable, optional): Replacement for analyze_review, mainly for testing
+            analyze_batch_fn (callable, optional): Replacement for analyze_reviews_batch, mainly for testing
+        """
+        self.api_key = api_key
+        self.max_workers = max(1, int(max_workers))
+        self.batch_size = max(1, int(batch_size))
+        self.cascade = cascade
+        if cascade is not None:
+            analyze_fn = analyze_fn or cascade.analyze
+            analyze_batch_fn = analyze_batch_fn or cascade.analyze_batch
+        self.analyze_fn = analyze_fn or analyze_review
+        self.analyze_batch_fn = analyze_batch_fn or analyze_reviews_batch
+        self.dedupe = dedupe
+        self.dedup_stats = None
+        self.local_classifier = local_classifier
+        self.local_threshold = local_threshold
+        self.local_stats = None
+        self.resumed_rows = 0
+        self.errors = []
+
+    def _analyze_unit(self, unit):
+        """
+        Analyze one unit of work - a list of (position, content, title, rating) tuples
+
+        Returns:
+            dict: Row position to analysis result, without the rows that could not be analyzed
+        """
+        if len(unit) == 1:
+            position, review_content, review_title, rating = unit[0]
+            return {position: self.analyze_fn(review_content, review_title, rating, self.api_key)}
+
+        batch = [
+            {'id': str(position), 'content': content, 'title': title, 'rating': rating}
+            for position, content, title, rating in unit
+        ]
+        batch_results = self.analyze_batch_fn(batch, self.api_key, max_batch_size=self.batch_size)
+        return {position: batch_results[str(position)] for position, _, _, _ in unit
+                if str(position) in batch_results}
+
+    def _record_error(self, error):
+        """Keep the first occurrence of each distinct error for reporting"""
+        error_msg = str(error)
+        if error_msg not in self.errors:
+            self.errors.append(error_msg)
+
+    def analyze_dataframe(self, df, progress_callback=None, result_callback=None, checkpoint=None):
+        """
+        Analyze every non-empty review in a DataFrame concurrently
+
+        Results are returned in the same order as the input rows, while the
+        progress callback fires each time a request finishes.
+
+        Args:
+            df (pd.DataFrame): The reviews to analyze
+            progress_callback (callable, optional): Called as progress_callback(completed, total)
+                from the calling thread after each request finishes
+            result_callback (callable, optional): Called as result_callback(position, row) from the
+                calling thread for every analyzed row as soon as it is available, where position
+                is the row's index among the returned results
+            checkpoint (RunCheckpoint, optional): Durable record of finished rows. Rows it already
+                holds are not analyzed again, and every newly analyzed row is added to it
+
+        Returns:
+            list: One dictionary per analyzed review, combining the row data and the analysis
+        """
+        self.errors = []
+
+        rows = collect_reviews(df)
+        total = len(rows)
+        results = [None] * total
+        if total == 0:
+            return []
+
+        def finish(position, analysis, durable=True):
+            results[position] = {**rows[position][0], **analysis}
+            if checkpoint is not None and durable:
+                checkpoint.add(position, analysis)
+            if result_callback:
+                result_callback(position, results[position])
+
+        # Rows finished by an earlier attempt of this run are taken from the checkpoint
+        completed = 0
+        self.resumed_rows = 0
+        if checkpoint is not None:
+            for position, analysis in checkpoint.completed().items():
+                if 0 <= position < total:
+                    finish(position, analysis, durable=False)
+                    completed += 1
+            self.resumed_rows = completed
+            if completed:
+                logger.info(f"Resuming run {checkpoint.run_id} with {completed} of {total} reviews already analyzed")
+                if progress_callback:
+                    progress_callback(completed, total)
+
+        # Only one representative per cluster of near-duplicates is sent to Claude
+        if self.dedupe:
+            dedup = cluster_near_duplicates(
+                [dedup_text(content, title) for _, content, title, _ in rows],
+                group_keys=[rating for _, _, _, rating in rows]
+            )
+            members = dedup.members()
+            self.dedup_stats = dedup.stats()
+        else:
+            members = {position: [position] for position in range(total)}
+            self.dedup_stats = None
+
+        # Clusters whose members all came from the checkpoint need no work
+        for position in list(members):
+            pending = [member for member in members[position] if results[member] is None]
+            if pending:
+                members[position] = pending
+            else:
+                del members[position]
+
+        tasks = [(position,) + rows[position][1:] for position in sorted(members)]
+
+        # Reviews the local classifier is confident about never reach Claude
+        if self.local_classifier is not None and self.local_classifier.is_trained:
+            predictions = self.local_classifier.predict(
+                [review_input_text(content, title, rating) for _, content, title, rating in tasks],
+                threshold=self.local_threshold
+            )
+            remaining = []
+            labeled = 0
+            for task, prediction in zip(tasks, predictions):
+                if prediction is None:
+                    remaining.append(task)
+                    continue
+                for member in members[task[0]]:
+                    finish(member, prediction)
+                labeled += len(members[task[0]])
+            completed += labeled
+            self.local_stats = {'labeled_locally': labeled, 'sent_to_llm': total - completed}
+            logger.info(f"Labeled {labeled} of {total} reviews with the local classifier")
+            tasks = remaining
+            if progress_callback and labeled:
+                progress_callback(completed, total)
+        else:
+            self.local_stats = None
+
+        # Group rows into units of work, one Claude request each
+        units = [tasks[i:i + self.batch_size] for i in range(0, len(tasks), self.batch_size)]
+
+        logger.info(f"Analyzing {total - completed} reviews in {len(units)} requests with up to {self.max_workers} in flight")
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {executor.submit(self._analyze_unit, unit): unit for unit in units}
+
+                try:
+                    for future in as_completed(futures):
+                        unit = futures[future]
+                        try:
+                            unit_results = future.result()
+                        except Exception as e:
+                            self._record_error(e)
+                            unit_results = {}
+
+                        if len(unit_results) < len(unit) and len(unit) > 1:
+                            self._record_error("Some reviews of a batch could not be analyzed")
+
+                        for position, _, _, _ in unit:
+                            result = unit_results.get(position)
+                            # Failed rows are not checkpointed, so a resumed run retries them
+                            durable = result is not None
+                            if result is None:
+                                result = dict(FALLBACK_RESULT)
+                            # Fan the result out to every member of the cluster
+                            for member in members[position]:
+                                finish(member, result, durable)
+                            completed += len(members[position])
+
+                        if progress_callback:
+                            progress_callback(completed, total)
+                except BaseException:
+                    # Stop promptly when interrupted, e.g. by a progress callback cancelling the run
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+        finally:
+            # Whatever finished is kept, even when the run is interrupted
+            if checkpoint is not None:
+                checkpoint.flush()
+
+        logger.info(f"Finished analyzing {total} reviews")
+        return results
+
+
+def analyze_reviews_dataframe(df, api_key=None, max_workers=DEFAULT_MAX_WORKERS, batch_size=DEFAULT_BATCH_SIZE,
+                              dedupe=False, cascade=None, local_classifier=None,
+                              local_threshold=DEFAULT_ROUTING_THRESHOLD, progress_callback=None):
+    """
+    Main function to analyze all reviews in a DataFrame concurrently
+
+    Args:
+        df (pd.DataFrame): The reviews to analyze
+        api_key (str, optional): The Anthropic API key
+        max_workers (int): Maximum number of Claude requests in flight at the same time
+        batch_size (int): Number of reviews packed into one request
+        dedupe (bool): Analyze one representative per cluster of near-duplicate reviews
+        cascade (ModelCascade, optional): Route each review through cheap-first model tiers,
+            its stats report the escalation rate and savings afterwards
+        local_classifier (LocalReviewClassifier, optional): Label confident reviews locally
+        local_threshold (float): Minimum local classifier confidence on every field
+        progress_callback (callable, optional): Called as progress_callback(completed, total)
+
+    Returns:
+        tuple: (analyzed_data, errors, dedup_stats) - the analyzed rows in input order, a list of
+            error messages and the near-duplicate statistics (None when dedupe is off)
+    """
+    engine = ReviewAnalysisEngine(api_key=api_key, max_workers=max_workers, batch_size=batch_size,
+                                  dedupe=dedupe, cascade=cascade, local_classifier=local_classifier,
+                                  local_threshold=local_threshold)
+    analyzed_data = engine.analyze_dataframe(df, progress_callback=progress_callback)
+    return analyzed_data, engine.errors, engine.dedup_stats
+
+
+def bulk_analyze_dataframe(df, api_key=None, bulk_options=None):
+    """
+    Analyze every non-empty review in a DataFrame offline through the Message Batches API
+
+    Identical reviews are sent once. Each review is identified by a hash of its content,
+    title and rating, so an interrupted run over the same reviews resumes its batch.
+
+    Args:
+        df (pd.DataFrame): The reviews to analyze
+        api_key (str, optional): The Anthropic API key
+        bulk_options (dict, optional): Extra bulk_analyze_reviews arguments, e.g. base_url or poll_interval
+
+    Returns:
+        tuple: (analyzed_data, errors) - one dictionary per analyzed review in input order, combining
+            the row data and the analysis, and a list of error messages. Reviews without a result
+            get FALLBACK_RESULT, as in analyze_dataframe_parallel
+    """
+    rows = collect_reviews(df)
+    review_ids = []
+    reviews = {}
+    for _, content, title, rating in rows:
+        review_id = hashlib.sha1(f"{content}\n{title}\n{rating}".encode('utf-8')).hexdigest()[:32]
+        review_ids.append(review_id)
+        reviews.setdefault(review_id, {'id': review_id, 'content': content, 'title': title, 'rating': rating})
+    logger.info(f"Analyzing {len(rows)} reviews as a batch of up to {len(reviews)} requests")
+    results, failed = bulk_analyze_reviews(list(reviews.values()), api_key=api_key, **dict(bulk_options or {}))
+    errors = [f"Error analyzing review {position}: {failed[review_id]}"
+              for position, review_id in enumerate(review_ids) if review_id in failed]
+    analyzed_data = [{**row, **results.get(review_id, FALLBACK_RESULT)}
+                     for (row, _, _, _), review_id in zip(rows, review_ids)]
+    return analyzed_data, errors
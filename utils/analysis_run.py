@@ -0,0 +1,312 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils.anthropic_helper import generate_category_summary, bulk_generate_category_summaries, SUMMARY_PROMPT_VERSION
+from utils.analysis_engine import ReviewAnalysisEngine, build_categories, collect_reviews
+from utils.checkpoint import compute_run_id, get_checkpoint_store
+from utils.knowledge_store import get_knowledge_base_store, review_fingerprints, DEFAULT_REGENERATE_THRESHOLD
+from utils.rate_limiter import get_rate_limiter
+from utils.taxonomy import get_issue_taxonomy
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("AnalysisRun")
+
+# Knowledge base summaries requested at the same time
+DEFAULT_SUMMARY_WORKERS = 8
+
+
+class AnalysisResultsStore:
+    def __init__(self, total=0, run_id=None):
+        """
+        Thread-safe store that an analysis run fills in while the UI reads from it
+
+        Args:
+            total (int): Number of reviews the run will analyze
+            run_id (str, optional): ID of the run's checkpoint
+        """
+        self._lock = threading.Lock()
+        self.total = total
+        self.run_id = run_id
+        self.resumed_rows = 0
+        self.status = "running"
+        self.started_at = time.time()
+        self.first_result_at = None
+        self.finished_at = None
+        self._results = {}
+        self.knowledge_base = {}
+        self.issue_type_count = 0
+        self.errors = []
+        self.summary_errors = {}
+        self.stats = {}
+
+    def add_result(self, position, row):
+        """Record one analyzed row at its position among the run's results"""
+        with self._lock:
+            if self.first_result_at is None:
+                self.first_result_at = time.time()
+            self._results[position] = row
+
+    def add_summary(self, issue_type, summary):
+        with self._lock:
+            self.knowledge_base[issue_type] = summary
+
+    def add_summary_error(self, issue_type, error):
+        with self._lock:
+            self.summary_errors[issue_type] = str(error)
+
+    def set_status(self, status):
+        with self._lock:
+            self.status = status
+            if status in ("done", "failed"):
+                self.finished_at = time.time()
+
+    @property
+    def completed(self):
+        with self._lock:
+            return len(self._results)
+
+    @property
+    def is_running(self):
+        with self._lock:
+            return self.status not in ("done", "failed")
+
+    def snapshot(self):
+        """
+        Return the rows analyzed so far, in input order
+
+        Returns:
+            list: Copies of the analyzed row dictionaries
+        """
+        with self._lock:
+            return [self._results[position] for position in sorted(self._results)]
+
+    def knowledge_base_snapshot(self):
+        with self._lock:
+            return dict(self.knowledge_base)
+
+    def time_to_first_result(self):
+        """Seconds from the start of the run to the first analyzed review, or None"""
+        with self._lock:
+            if self.first_result_at is None:
+                return None
+            return self.first_result_at - self.started_at
+
+
+def generate_knowledge_base(analyzed_data, api_key, summary_callback=None, error_callback=None,
+                            progress_callback=None, max_workers=DEFAULT_SUMMARY_WORKERS, issue_types=None,
+                            regenerate_threshold=DEFAULT_REGENERATE_THRESHOLD, text_callback=None, bulk_options=None):
+    """
+    Generate one knowledge base summary per issue type
+
+    Issue types are first merged into the categories of the persistent taxonomy, so
+    differently worded issue types share one summary. A stored summary is reused while
+    its issue type's reviews changed by no more than regenerate_threshold, see
+    utils.knowledge_store. The remaining summaries are requested concurrently. Every
+    request still goes through the shared rate limiter, so the limiter rather than
+    max_workers sets the actual request rate. The callbacks run on the calling thread,
+    reused summaries first, then in the order summaries finish.
+
+    Args:
+        analyzed_data (list): Analyzed review rows
+        api_key (str): The Anthropic API key
+        summary_callback (callable, optional): Called as summary_callback(issue_type, summary)
+        error_callback (callable, optional): Called as error_callback(issue_type, error)
+        progress_callback (callable, optional): Called as progress_callback(completed, total)
+            before the first and after every issue type
+        max_workers (int): Summaries requested at the same time
+        issue_types (list, optional): Only summarize these issue types, e.g. to retry the ones
+            that failed in an earlier run
+        regenerate_threshold (float, optional): Share of added or removed reviews above which
+            a stored summary is regenerated, None regenerates every summary
+        text_callback (callable, optional): Called as text_callback(issue_type, text) with every
+            piece of a summary as it is generated, from the worker threads
+        bulk_options (dict, optional): Generate the summaries offline through the Message Batches
+            API, with these extra bulk_generate_category_summaries arguments. max_workers and
+            text_callback do not apply then
+
+    Returns:
+        tuple: (knowledge_base, failed) - issue type to summary, and issue type to error message
+    """
+    analyzed_data = get_issue_taxonomy().apply(analyzed_data)
+    categories = build_categories(analyzed_data)
+    known_issue_types = set(categories['issue_type'])
+    if issue_types is None:
+        issue_types = list(known_issue_types)
+    else:
+        issue_types = [issue_type for issue_type in dict.fromkeys(issue_types) if issue_type in known_issue_types]
+    knowledge_base = {}
+    failed = {}
+    if progress_callback:
+        progress_callback(0, len(issue_types))
+
+    # Get all reviews for every issue type
+    issue_reviews = {issue_type: [] for issue_type in issue_types}
+    for data in analyzed_data:
+        if data['issue_type'] in issue_reviews:
+            issue_reviews[data['issue_type']].append(data.get('review_content', data.get('Detailed Review', '')))
+
+    # Reuse the stored summaries of issue types whose reviews barely changed
+    store = get_knowledge_base_store()
+    fingerprints = {issue_type: review_fingerprints(reviews) for issue_type, reviews in issue_reviews.items() if reviews}
+    if regenerate_threshold is not None:
+        for issue_type, issue_fingerprints in fingerprints.items():
+            summary = store.reusable(issue_type, issue_fingerprints, SUMMARY_PROMPT_VERSION, regenerate_threshold)
+            if summary is not None:
+                knowledge_base[issue_type] = summary
+                if summary_callback:
+                    summary_callback(issue_type, summary)
+    reused = len(knowledge_base)
+    pending = [issue_type for issue_type in fingerprints if issue_type not in knowledge_base]
+
+    if bulk_options is not None:
+        generated, failed = bulk_generate_category_summaries(
+            {issue_type: issue_reviews[issue_type] for issue_type in pending}, api_key=api_key, **bulk_options
+        )
+        for issue_type, summary in generated.items():
+            knowledge_base[issue_type] = summary
+            store.save(issue_type, summary, fingerprints[issue_type], SUMMARY_PROMPT_VERSION)
+            if summary_callback:
+                summary_callback(issue_type, summary)
+        for issue_type, error in failed.items():
+            logger.warning(f"Summary for {issue_type} failed: {error}")
+            if error_callback:
+                error_callback(issue_type, RuntimeError(error))
+        if progress_callback:
+            progress_callback(len(issue_types), len(issue_types))
+        return knowledge_base, failed
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(
+                generate_category_summary, issue_type, issue_reviews[issue_type], api_key,
+                **({'text_callback': lambda text, issue_type=issue_type: text_callback(issue_type, text)}
+                   if text_callback else {})
+            ): issue_type
+            for issue_type in pending
+        }
+        completed = len(issue_types) - len(futures)
+        if progress_callback and completed:
+            progress_callback(completed, len(issue_types))
+        # One failed issue type does not affect the others
+        for future in as_completed(futures):
+            issue_type = futures[future]
+            try:
+                knowledge_base[issue_type] = future.result()
+                store.save(issue_type, knowledge_base[issue_type], fingerprints[issue_type], SUMMARY_PROMPT_VERSION)
+                if summary_callback:
+                    summary_callback(issue_type, knowledge_base[issue_type])
+            except Exception as e:
+                failed[issue_type] = str(e)
+                logger.warning(f"Summary for {issue_type} failed: {e}")
+                if error_callback:
+                    error_callback(issue_type, e)
+            completed += 1
+            if progress_callback:
+                progress_callback(completed, len(issue_types))
+    if reused:
+        logger.info(f"Reused {reused} stored summaries and generated {len(futures)} of {len(issue_types)} issue types")
+    return knowledge_base, failed
+
+
+class BackgroundAnalysisRun:
+    def __init__(self, df, api_key, engine_options=None, summarize=True, resumable=True, progress_callback=None,
+                 result_callback=None):
+        """
+        Analyze reviews and build the knowledge base on a background thread
+
+        Results are written into an AnalysisResultsStore as they complete, so the
+        dashboard can show partial results while the run continues.
+
+        Args:
+            df (pd.DataFrame): The reviews to analyze
+            api_key (str): The Anthropic API key
+            engine_options (dict, optional): Extra ReviewAnalysisEngine arguments
+            summarize (bool): Generate knowledge base summaries once analysis finishes
+            resumable (bool): Checkpoint finished rows under a run ID derived from the input,
+                so restarting the same input skips the rows already analyzed
+            progress_callback (callable, optional): Called as progress_callback(completed, total)
+                from the run's thread as reviews finish
+            result_callback (callable, optional): Called as result_callback(position, row) for every
+                analyzed row, in addition to filling the store
+        """
+        self.df = df
+        self.api_key = api_key
+        self.engine_options = dict(engine_options or {})
+        self.summarize = summarize
+        self.resumable = resumable
+        self.progress_callback = progress_callback
+        self.result_callback = result_callback
+        review_fields = [fields[1:] for fields in collect_reviews(df)]
+        self.store = AnalysisResultsStore(len(review_fields), compute_run_id(review_fields))
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self.run()
+        except Exception as e:
+            logger.error(f"Analysis run failed: {e}")
+            self.store.errors.append(str(e))
+            self.store.set_status("failed")
+
+    def run(self):
+        """
+        Run the analysis and summaries on the calling thread
+
+        Raises:
+            Exception: Whatever stopped the run, including exceptions raised by the progress callback
+        """
+        rate_limiter = get_rate_limiter(self.api_key)
+        limiter_before = rate_limiter.metrics()
+
+        checkpoint = None
+        if self.resumable:
+            checkpoint = get_checkpoint_store().open_run(self.store.run_id, self.store.total)
+
+        engine = ReviewAnalysisEngine(api_key=self.api_key, **self.engine_options)
+        analyzed_data = engine.analyze_dataframe(self.df, progress_callback=self.progress_callback,
+                                                 result_callback=self._add_result, checkpoint=checkpoint)
+        self.store.resumed_rows = engine.resumed_rows
+        # Rows that failed are not checkpointed, so a run with errors stays resumable
+        if checkpoint is not None and not engine.errors:
+            checkpoint.mark_complete()
+
+        limiter_after = rate_limiter.metrics()
+        cascade = self.engine_options.get('cascade')
+        self.store.errors = list(engine.errors)
+        self.store.stats = {
+            'dedup': engine.dedup_stats,
+            'local': engine.local_stats,
+            'cascade': cascade.stats.report() if cascade is not None else None,
+            'cascade_model': cascade.tiers[-1] if cascade is not None else None,
+            'limiter': {
+                name: limiter_after[name] - limiter_before[name]
+                for name in ('throttled_responses', 'retries', 'throttle_wait_seconds')
+            },
+            'concurrency': limiter_after['concurrency']
+        }
+
+        if self.summarize:
+            self.store.set_status("summarizing")
+            generate_knowledge_base(
+                analyzed_data, self.api_key,
+                summary_callback=self.store.add_summary,
+                error_callback=self.store.add_summary_error,
+                progress_callback=self._set_issue_type_count
+            )
+        self.store.set_status("done")
+        return analyzed_data
+
+    def _add_result(self, position, row):
+        self.store.add_result(position, row)
+        if self.result_callback:
+            self.result_callback(position, row)
+
+    def _set_issue_type_count(self, completed, total):
+        self.store.issue_type_count = total
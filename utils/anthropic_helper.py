@@ -1,51 +1,143 @@
 import os
+import re
 import json
+import time
+import queue
+import hashlib
+import logging
+import threading
+from types import SimpleNamespace
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import anthropic
 import pandas as pd
-from anthropic import Anthropic
+from utils.client_manager import get_client_manager
+from utils.rate_limiter import get_rate_limiter
+from utils.llm_cache import get_default_cache, make_cache_key, normalize_review_text, prompt_fingerprint
+from utils.representatives import select_representatives
 
-def get_anthropic_client(api_key=None):
-    """
-    Initialize and return the Anthropic client using the provided API key
-    """
+logger = logging.getLogger("AnthropicHelper")
+
+def _resolve_api_key(api_key=None):
+    """Return the given API key or the one from the environment"""
     if not api_key:
         api_key = os.environ.get("ANTHROPIC_API_KEY")
     
     if not api_key:
         raise ValueError("Anthropic API key not found. Please provide the API key.")
+    return api_key
+
+def get_anthropic_client(api_key=None, base_url=None):
+    """
+    Return the shared, pooled Anthropic client for the provided API key
+    
+    Clients come from the process-wide client manager, so repeated calls reuse
+    the same connection pool and can be shared across worker threads.
     
-    return Anthropic(api_key=api_key)
+    Args:
+        api_key (str, optional): The Anthropic API key, defaults to ANTHROPIC_API_KEY
+        base_url (str, optional): Alternative API endpoint, e.g. the local batch stub server
+    """
+    return get_client_manager().get_client(_resolve_api_key(api_key), base_url=base_url)
 
-def analyze_review(review_content, review_title="", rating=None, api_key=None):
+def get_async_anthropic_client(api_key=None, base_url=None):
     """
-    Analyze a review using Anthropic Claude to determine sentiment, aspect, and issue type
+    Return the shared async Anthropic client for the provided API key on the running event loop
     
     Args:
-        review_content (str): The main content of the review
-        review_title (str, optional): The title of the review, if available
-        rating (float, optional): The numerical rating, if available
+        api_key (str, optional): The Anthropic API key, defaults to ANTHROPIC_API_KEY
+        base_url (str, optional): Alternative API endpoint
+    """
+    return get_client_manager().get_async_client(_resolve_api_key(api_key), base_url=base_url)
+
+def _estimate_tokens(params):
+    """Roughly estimate the tokens a request will use (about 4 characters per token)"""
+    characters = len(str(params.get("system", ""))) + sum(len(str(m.get("content", ""))) for m in params.get("messages", []))
+    return characters // 4 + params.get("max_tokens", 0)
+
+def create_message(params, api_key=None):
+    """
+    Send a Messages API request through the shared rate limiter
+    
+    The limiter enforces the per-call timeout, adapts concurrency and retries
+    429/529 and transient errors with jittered backoff before giving up.
+    
+    Args:
+        params (dict): Messages API parameters
         api_key (str, optional): The Anthropic API key
     
     Returns:
-        dict: A dictionary containing the analysis results
+        Message: The parsed Claude response
     """
-    # Ensure we have valid input data
-    if review_title is None:
-        review_title = ""
-    if not isinstance(review_content, str):
-        review_content = str(review_content)
+    api_key = _resolve_api_key(api_key)
+    # Retries are handled by the limiter, not by the SDK
+    client = get_anthropic_client(api_key).with_options(max_retries=0)
+    limiter = get_rate_limiter(api_key)
+    return limiter.call(
+        lambda timeout: client.messages.with_raw_response.create(**params, timeout=timeout),
+        estimated_tokens=_estimate_tokens(params)
+    )
+
+class _StreamedResponse:
+    def __init__(self, headers, message):
+        """A fully consumed stream in the shape AdaptiveRateLimiter.call expects from a raw response"""
+        self.headers = headers
+        self._message = message
     
-    # Create a complete prompt with all available information
-    full_review = ""
-    if review_title and not (isinstance(review_title, float) and pd.isna(review_title)):
-        full_review += f"Title: {review_title}\n"
+    def parse(self):
+        return self._message
+
+def create_message_stream(params, text_callback, api_key=None):
+    """
+    Send a Messages API request through the shared rate limiter, streaming the text as it is generated
     
-    if rating is not None and not (isinstance(rating, float) and pd.isna(rating)):
-        full_review += f"Rating: {rating}\n"
+    Failures before any text arrived are retried like those of create_message. A stream that
+    breaks off after text was passed on raises instead, so text_callback never sees text twice.
     
-    full_review += f"Content: {review_content}"
+    Args:
+        params (dict): Messages API parameters
+        text_callback (callable): Called with every text delta, in order
+        api_key (str, optional): The Anthropic API key
+    
+    Returns:
+        object: A Message-like response with the complete text, usage and stop_reason
+    """
+    api_key = _resolve_api_key(api_key)
+    client = get_anthropic_client(api_key).with_options(max_retries=0)
+    limiter = get_rate_limiter(api_key)
+    
+    # The whole stream is consumed inside the request, so the limiter's timeout and slot cover it
+    def request(timeout):
+        raw_response = client.messages.with_raw_response.create(**params, stream=True, timeout=timeout)
+        parts = []
+        usage = {'input_tokens': 0, 'output_tokens': 0}
+        stop_reason = None
+        try:
+            for event in raw_response.parse():
+                if event.type == "message_start":
+                    usage['input_tokens'] = event.message.usage.input_tokens
+                elif event.type == "content_block_delta" and getattr(event.delta, 'text', None):
+                    parts.append(event.delta.text)
+                    text_callback(event.delta.text)
+                elif event.type == "message_delta":
+                    usage['output_tokens'] = event.usage.output_tokens
+                    stop_reason = event.delta.stop_reason
+        except anthropic.APIError as e:
+            if parts:
+                raise RuntimeError(f"Stream interrupted after partial output: {e}") from e
+            raise
+        message = SimpleNamespace(content=[SimpleNamespace(type="text", text="".join(parts))],
+                                  usage=SimpleNamespace(**usage), stop_reason=stop_reason)
+        return _StreamedResponse(raw_response.headers, message)
     
-    # System prompt for the analysis
-    system_prompt = """
+    return limiter.call(request, estimated_tokens=_estimate_tokens(params))
+
+# Model used for review analysis and knowledge base summaries
+#the newest Anthropic model is "claude-3-5-sonnet-20241022" which was released October 22, 2024
+ANALYSIS_MODEL = "claude-3-5-sonnet-20241022"
+
+# System prompt for the analysis
+ANALYSIS_SYSTEM_PROMPT = """
     You are an expert review analyst. Analyze the given review and categorize it according to these levels:
     
     1. Sentiment: Determine if the overall review is "Positive" or "Negative"
@@ -61,7 +153,10 @@ def analyze_review(review_content, review_title="", rating=None, api_key=None):
     - Urgency Level: How urgent the issue appears (high, medium, low)
     
     Provide a confidence score (0.0 to 1.0) for your categorization.
-    
+    """
+
+# Output instructions for a single review
+SINGLE_OUTPUT_INSTRUCTIONS = """
     Important: Respond with ONLY JSON data and nothing else. Do not include explanations or additional text.
     Use exactly this format:
     {
@@ -75,132 +170,420 @@ def analyze_review(review_content, review_title="", rating=None, api_key=None):
         "confidence": number between 0 and 1
     }
     """
+
+# Output instructions when several reviews are packed into one request
+BATCH_OUTPUT_INSTRUCTIONS = """
+    You will receive several reviews, each wrapped in <review id="..."> tags. Analyze every review independently.
     
-    try:
-        # Get Anthropic client with provided API key
-        client = get_anthropic_client(api_key)
-        
-        # Make the API call
-        #the newest Anthropic model is "claude-3-5-sonnet-20241022" which was released October 22, 2024
-        response = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            system=system_prompt,
-            messages=[
-                {"role": "user", "content": full_review}
-            ],
-            max_tokens=1000,
-            temperature=0.1  # Lower temperature for more consistent outputs
-        )
-        
-        # Parse the response - Claude API returns content differently from OpenAI
+    Important: Respond with ONLY a JSON array and nothing else. Do not include explanations or additional text.
+    Return exactly one object per review, copying its id, in this format:
+    [
+        {
+            "id": "the review id",
+            "sentiment": "Positive or Negative",
+            "sentiment_score": number between -1.0 and 1.0,
+            "key_emotions": ["emotion1", "emotion2"],
+            "emotion": "Primary emotion",
+            "urgency": "High, Medium, or Low",
+            "aspect": "Product, Service, or Other",
+            "issue_type": "Specific issue category",
+            "confidence": number between 0 and 1
+        }
+    ]
+    """
+
+# Fields every analysis result must have, with the values used when they are missing
+DEFAULT_ANALYSIS_RESULT = {
+    "sentiment": "Neutral",
+    "sentiment_score": 0.0,
+    "key_emotions": ["Neutral"],
+    "emotion": "Neutral",
+    "urgency": "Low",
+    "aspect": "Other",
+    "issue_type": "General Feedback",
+    "confidence": 0.5
+}
+
+# Version of the analysis prompt, part of every analysis cache key
+ANALYSIS_PROMPT_VERSION = prompt_fingerprint(ANALYSIS_SYSTEM_PROMPT, SINGLE_OUTPUT_INSTRUCTIONS, BATCH_OUTPUT_INSTRUCTIONS)
+
+# Batching limits for analyze_reviews_batch
+MAX_REVIEWS_PER_REQUEST = 20
+MAX_BATCH_CHARS = 12000
+OUTPUT_TOKENS_PER_REVIEW = 200
+MAX_OUTPUT_TOKENS = 8192
+
+
+def _format_review(review_content, review_title="", rating=None):
+    """Build the review text sent to Claude from the available fields"""
+    # Ensure we have valid input data
+    if review_title is None:
+        review_title = ""
+    if not isinstance(review_content, str):
+        review_content = str(review_content)
+    
+    # Create a complete prompt with all available information
+    full_review = ""
+    if review_title and not (isinstance(review_title, float) and pd.isna(review_title)):
+        full_review += f"Title: {review_title}\n"
+    
+    if rating is not None and not (isinstance(rating, float) and pd.isna(rating)):
+        full_review += f"Rating: {rating}\n"
+    
+    full_review += f"Content: {review_content}"
+    return full_review
+
+
+def _extract_response_text(response):
+    """Extract the text of the first content block of a Claude response"""
+    # Parse the response - Claude API returns content differently from OpenAI
+    if not (hasattr(response, 'content') and response.content):
+        raise ValueError("Empty response received from API")
+    
+    content_block = response.content[0]
+    
+    # Extract the text - Claude API might format responses differently
+    if hasattr(content_block, 'text'):
+        content = content_block.text
+    elif hasattr(content_block, 'value'):
+        content = content_block.value
+    else:
+        # Try to convert the content block to string
+        content = str(content_block).strip()
+    
+    if not content:
+        raise ValueError("Empty response content received from API")
+    return content
+
+
+def _complete_analysis(result):
+    """Fill in any missing analysis fields with their default values"""
+    # Ensure urgency_level is mapped to urgency to handle format inconsistencies
+    if "urgency_level" in result and "urgency" not in result:
+        result["urgency"] = result["urgency_level"]
+    
+    for field, default_value in DEFAULT_ANALYSIS_RESULT.items():
+        if field not in result:
+            result[field] = default_value
+    return result
+
+
+def _parse_analysis_json(content):
+    """Parse a single analysis JSON object from the response text"""
+    # Find the first '{' and last '}' for JSON extraction
+    start_idx = content.find('{')
+    end_idx = content.rfind('}') + 1
+    
+    if start_idx < 0 or end_idx <= start_idx:
+        raise ValueError("No valid JSON found in response content")
+    
+    return _complete_analysis(json.loads(content[start_idx:end_idx]))
+
+
+def _parse_analysis_array(content):
+    """
+    Parse a JSON array of analysis objects from the response text
+    
+    Falls back to decoding objects one by one, so a truncated or partly
+    malformed array still yields every complete item.
+    """
+    start_idx = content.find('[')
+    end_idx = content.rfind(']') + 1
+    if start_idx >= 0 and end_idx > start_idx:
         try:
-            # For Claude API - extract content from response
-            if hasattr(response, 'content') and response.content:
-                # Get the message content
-                content_block = response.content[0]
-                
-                # Extract the text - Claude API might format responses differently
-                if hasattr(content_block, 'text'):
-                    content = content_block.text
-                elif hasattr(content_block, 'value'):
-                    content = content_block.value
-                else:
-                    # Try to convert the content block to string
-                    content = str(content_block).strip()
-                
-                # Clean up the content to ensure it's valid JSON
-                # Remove any non-JSON content
-                if content:
-                    # Find the first '{' and last '}' for JSON extraction
-                    start_idx = content.find('{')
-                    end_idx = content.rfind('}') + 1
-                    
-                    if start_idx >= 0 and end_idx > start_idx:
-                        # Extract only the JSON part
-                        json_content = content[start_idx:end_idx]
-                        result = json.loads(json_content)
-                        
-                        # Ensure all required fields are present with default values if missing
-                        required_fields = {
-                            "sentiment": "Neutral",
-                            "aspect": "Other",
-                            "issue_type": "General Feedback",
-                            "confidence": 0.5,
-                            "emotion": "Neutral", 
-                            "urgency": "Low",
-                            "sentiment_score": 0.0,
-                            "key_emotions": ["Neutral"]
-                        }
-                        
-                        # Fill in any missing fields with defaults
-                        for field, default_value in required_fields.items():
-                            if field not in result:
-                                result[field] = default_value
-                        
-                        # Ensure urgency_level is mapped to urgency to handle format inconsistencies
-                        if "urgency_level" in result and "urgency" not in result:
-                            result["urgency"] = result["urgency_level"]
-                        
-                        return result
-                    else:
-                        raise ValueError("No valid JSON found in response content")
-                else:
-                    raise ValueError("Empty response content received from API")
-            else:
-                raise ValueError("Empty response received from API")
-        except Exception as e:
-            # Create a default fallback response
-            default_response = {
-                "sentiment": "Neutral",
-                "sentiment_score": 0.0,
-                "key_emotions": ["Neutral"],
-                "emotion": "Neutral",
-                "urgency": "Low",
-                "aspect": "Other",
-                "issue_type": "General Feedback",
-                "confidence": 0.5
-            }
-            return default_response
+            items = json.loads(content[start_idx:end_idx])
+            if isinstance(items, list):
+                return [item for item in items if isinstance(item, dict)]
+        except ValueError:
+            pass
+    
+    # Salvage whatever complete objects we can find
+    decoder = json.JSONDecoder()
+    items = []
+    position = content.find('{')
+    while position >= 0:
+        try:
+            item, end = decoder.raw_decode(content, position)
+            if isinstance(item, dict):
+                items.append(item)
+            position = content.find('{', end)
+        except ValueError:
+            position = content.find('{', position + 1)
+    return items
+
+
+def _normalize_rating(rating):
+    """Normalize a rating for use in cache keys"""
+    if rating is None or (isinstance(rating, float) and pd.isna(rating)):
+        return ""
+    try:
+        return f"{float(rating):g}"
+    except (TypeError, ValueError):
+        return str(rating).strip()
+
+
+def _analysis_cache_key(review_content, review_title="", rating=None, model=ANALYSIS_MODEL):
+    """Build the cache key for one review analysis"""
+    if review_title is None or (isinstance(review_title, float) and pd.isna(review_title)):
+        review_title = ""
+    return make_cache_key(
+        'analysis', model, ANALYSIS_PROMPT_VERSION,
+        normalize_review_text(review_content), normalize_review_text(review_title), _normalize_rating(rating)
+    )
+
+
+def _get_cached_analysis(cache, review_content, review_title="", rating=None, model=ANALYSIS_MODEL):
+    """Return a cached analysis result or None"""
+    if cache is None:
+        return None
+    return cache.get(_analysis_cache_key(review_content, review_title, rating, model))
+
+
+def _store_cached_analysis(cache, result, review_content, review_title="", rating=None, model=ANALYSIS_MODEL):
+    """Store a successful analysis result in the cache"""
+    if cache is None:
+        return
+    cache.set(
+        _analysis_cache_key(review_content, review_title, rating, model), result,
+        'analysis', model, ANALYSIS_PROMPT_VERSION,
+        input_text=_format_review(normalize_review_text(review_content), review_title, rating)
+    )
+
+
+def _analysis_request_params(full_review, model=ANALYSIS_MODEL):
+    """Build the Messages API parameters for analyzing a single review"""
+    return {
+        "model": model,
+        "system": ANALYSIS_SYSTEM_PROMPT + SINGLE_OUTPUT_INSTRUCTIONS,
+        "messages": [
+            {"role": "user", "content": full_review}
+        ],
+        "max_tokens": 1000,
+        "temperature": 0.1  # Lower temperature for more consistent outputs
+    }
+
+
+def _report_usage(usage_callback, model, response, started):
+    """Pass the token usage and latency of a response to the caller's callback"""
+    if usage_callback is None:
+        return
+    usage = getattr(response, 'usage', None)
+    usage_callback(
+        model,
+        getattr(usage, 'input_tokens', 0) or 0,
+        getattr(usage, 'output_tokens', 0) or 0,
+        time.time() - started
+    )
+
+
+def analyze_review(review_content, review_title="", rating=None, api_key=None, use_cache=True,
+                   model=ANALYSIS_MODEL, usage_callback=None):
+    """
+    Analyze a review using Anthropic Claude to determine sentiment, aspect, and issue type
+    
+    Args:
+        review_content (str): The main content of the review
+        review_title (str, optional): The title of the review, if available
+        rating (float, optional): The numerical rating, if available
+        api_key (str, optional): The Anthropic API key
+        use_cache (bool): Reuse and store results in the persistent LLM cache
+        model (str): The Claude model to use
+        usage_callback (callable, optional): Called as usage_callback(model, input_tokens,
+            output_tokens, latency_seconds) after each API call
+    
+    Returns:
+        dict: A dictionary containing the analysis results
+    
+    Raises:
+        Exception: If the request still fails after the rate limiter's retries or the response
+            is unusable. Callers pick their own fallback, which is never cached
+    """
+    cache = get_default_cache() if use_cache else None
+    cached = _get_cached_analysis(cache, review_content, review_title, rating, model)
+    if cached is not None:
+        return cached
+    
+    full_review = _format_review(review_content, review_title, rating)
+    
+    try:
+        # Make the API call, retried by the rate limiter on throttling and transient errors
+        started = time.time()
+        response = create_message(_analysis_request_params(full_review, model), api_key)
+        _report_usage(usage_callback, model, response, started)
         
+        result = _parse_analysis_json(_extract_response_text(response))
+        _store_cached_analysis(cache, result, review_content, review_title, rating, model)
         return result
     
     except Exception as e:
-        # Create a default fallback response
-        default_response = {
-            "sentiment": "Neutral",
-            "sentiment_score": 0.0,
-            "key_emotions": ["Neutral"],
-            "emotion": "Neutral",
-            "urgency": "Low",
-            "aspect": "Other",
-            "issue_type": "General Feedback",
-            "confidence": 0.5
-        }
-        return default_response
+        # Only reached once retries are exhausted or the response is unusable
+        raise Exception(f"Review analysis failed: {str(e)}")
+
 
-def generate_category_summary(issue_type, reviews, api_key=None):
+def _split_review_batches(reviews, max_batch_size, max_batch_chars):
+    """Split reviews into batches bounded by review count and prompt size"""
+    batches = []
+    current = []
+    current_chars = 0
+    for review in reviews:
+        review_chars = len(review['text'])
+        if current and (len(current) >= max_batch_size or current_chars + review_chars > max_batch_chars):
+            batches.append(current)
+            current = []
+            current_chars = 0
+        current.append(review)
+        current_chars += review_chars
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _request_review_batch(api_key, batch, model=ANALYSIS_MODEL, usage_callback=None):
     """
-    Generate a summary and best practices for a specific issue type based on multiple reviews
+    Send one batch of reviews to Claude and return the parsed results by ID
+    
+    Returns:
+        tuple: (results, truncated) - results maps review ID to analysis dict,
+            truncated is True when the response hit the output token limit
+    """
+    user_content = "\n\n".join(
+        f'<review id="{review["id"]}">\n{review["text"]}\n</review>' for review in batch
+    )
+    max_tokens = min(MAX_OUTPUT_TOKENS, OUTPUT_TOKENS_PER_REVIEW * len(batch) + 200)
+    
+    started = time.time()
+    response = create_message({
+        "model": model,
+        "system": ANALYSIS_SYSTEM_PROMPT + BATCH_OUTPUT_INSTRUCTIONS,
+        "messages": [
+            {"role": "user", "content": user_content}
+        ],
+        "max_tokens": max_tokens,
+        "temperature": 0.1  # Lower temperature for more consistent outputs
+    }, api_key)
+    _report_usage(usage_callback, model, response, started)
+    
+    truncated = getattr(response, 'stop_reason', None) == "max_tokens"
+    batch_ids = {review['id'] for review in batch}
+    results = {}
+    for item in _parse_analysis_array(_extract_response_text(response)):
+        review_id = str(item.pop('id', ''))
+        if review_id in batch_ids and review_id not in results:
+            results[review_id] = _complete_analysis(item)
+    return results, truncated
+
+
+def analyze_reviews_batch(reviews, api_key=None, max_batch_size=MAX_REVIEWS_PER_REQUEST,
+                          max_batch_chars=MAX_BATCH_CHARS, max_attempts=2, use_cache=True,
+                          model=ANALYSIS_MODEL, usage_callback=None):
+    """
+    Analyze several reviews per Claude request to cut round-trips and repeated prompt tokens
+    
+    Reviews are packed into batches with stable IDs and Claude answers with a
+    JSON array. Batches that exceed the size limits are split, truncated
+    responses shrink the next batch, and only the reviews whose result could
+    not be parsed are re-sent. Reviews that still fail are analyzed one by one,
+    and those that fail on their own too are left out of the result. API errors
+    are not retried here, the rate limiter already retried the transient ones.
     
     Args:
-        issue_type (str): The category/issue type to summarize
-        reviews (list): List of review contents related to this issue type
+        reviews (list): Dictionaries with 'id', 'content' and optional 'title' and 'rating' keys
+        api_key (str, optional): The Anthropic API key
+        max_batch_size (int): Maximum number of reviews per request
+        max_batch_chars (int): Maximum number of review characters per request
+        max_attempts (int): Number of batched attempts before falling back to single calls
+        use_cache (bool): Reuse and store results in the persistent LLM cache
+        model (str): The Claude model to use
+        usage_callback (callable, optional): Called as usage_callback(model, input_tokens,
+            output_tokens, latency_seconds) after each API call
     
     Returns:
-        str: A markdown-formatted summary with insights and best practices
+        dict: Review ID to analysis result, with the same shape as analyze_review, for
+            every review that could be analyzed
+    
+    Raises:
+        Exception: Any error of a request, e.g. an invalid API key or a rate limit the limiter gave up on
     """
-    # Limit the number of reviews to avoid token limits
-    max_reviews = 15
-    if len(reviews) > max_reviews:
-        # Take a representative sample
-        import random
-        reviews = random.sample(reviews, max_reviews)
+    cache = get_default_cache() if use_cache else None
+    results = {}
+    pending = []
+    for review in reviews:
+        review_id = str(review['id'])
+        cached = _get_cached_analysis(cache, review.get('content', ''), review.get('title', ''),
+                                      review.get('rating'), model)
+        if cached is not None:
+            results[review_id] = cached
+            continue
+        pending.append({
+            'id': review_id,
+            'text': _format_review(review.get('content', ''), review.get('title', ''), review.get('rating')),
+            'review': review
+        })
+    
+    try:
+        api_key = _resolve_api_key(api_key)
+    except ValueError:
+        api_key = None
+    
+    batch_size = max(1, int(max_batch_size))
+    for attempt in range(max_attempts):
+        if not pending or api_key is None:
+            break
+        
+        failed = []
+        any_truncated = False
+        for batch in _split_review_batches(pending, batch_size, max_batch_chars):
+            try:
+                batch_results, truncated = _request_review_batch(api_key, batch, model, usage_callback)
+            except ValueError:
+                # Empty response, the reviews are re-sent in smaller batches
+                batch_results, truncated = {}, False
+            any_truncated = any_truncated or truncated
+            
+            for review in batch:
+                if review['id'] in batch_results:
+                    original = review['review']
+                    _store_cached_analysis(cache, batch_results[review['id']], original.get('content', ''),
+                                           original.get('title', ''), original.get('rating'), model)
+            results.update(batch_results)
+            failed.extend(review for review in batch if review['id'] not in batch_results)
+        
+        pending = failed
+        # Smaller batches for the retry when the model ran out of output tokens
+        if any_truncated or failed:
+            batch_size = max(1, batch_size // 2)
     
-    # Join the reviews with separators
-    reviews_text = "\n---\n".join(reviews)
+    # Anything still missing is analyzed on its own
+    for review in pending:
+        original = review['review']
+        try:
+            results[review['id']] = analyze_review(
+                original.get('content', ''), original.get('title', ''), original.get('rating'), api_key,
+                use_cache=use_cache, model=model, usage_callback=usage_callback
+            )
+        except Exception as e:
+            logger.warning(f"Review {review['id']} could not be analyzed: {e}")
     
-    # System prompt for the summary generation
-    system_prompt = f"""
+    return results
+
+# Review tokens sent to Claude in one summary request, and partial summaries merged per request
+SUMMARY_CHUNK_TOKENS = 6000
+SUMMARY_REDUCE_FANIN = 8
+
+# Distinct reviews summarized per issue type. Larger categories are clustered and one
+# review per cluster is sent along with the cluster's size. This also bounds the number
+# of chunks, all of which are summarized and merged.
+MAX_SUMMARY_REPRESENTATIVES = 1000
+
+# Chunk and merge requests running at the same time for one issue type
+DEFAULT_SUMMARY_CHUNK_WORKERS = 4
+
+# Output tokens of the final summary and of every partial summary
+SUMMARY_MAX_TOKENS = 1500
+PARTIAL_SUMMARY_MAX_TOKENS = 800
+
+# System prompt for the summary generation
+SUMMARY_SYSTEM_PROMPT = """
     You are a customer experience expert. Based on the reviews related to "{issue_type}", create a comprehensive summary that includes:
     
     1. A clear overview of the common issues/pain points
@@ -211,35 +594,568 @@ def generate_category_summary(issue_type, reviews, api_key=None):
     
     Format your response in Markdown with appropriate headers, bullet points, and sections.
     """
+
+# System prompt for the partial summaries of one chunk of reviews, or of several partial summaries
+PARTIAL_SUMMARY_SYSTEM_PROMPT = """
+    You are a customer experience analyst condensing customer feedback related to "{issue_type}".
+    Write concise notes that another analyst will merge with notes on other groups of reviews. Cover:
+    
+    1. The recurring issues and pain points, with how often each comes up (e.g. "most", "about a third", "a few")
+    2. What customers expected instead
+    3. Fixes or workarounds customers mention
+    4. Short representative quotes
+    
+    Keep every distinct issue, even rare ones, and do not add recommendations. Use a plain bullet list.
+    """
+
+# Explains the "[N similar reviews]" prefix of representative reviews
+REVIEW_WEIGHTS_NOTE = "A review starting with [N similar reviews] stands for N reviews that say much the same thing."
+
+# Version of the summary prompts, part of every summary cache key
+SUMMARY_PROMPT_VERSION = prompt_fingerprint(SUMMARY_SYSTEM_PROMPT, PARTIAL_SUMMARY_SYSTEM_PROMPT, REVIEW_WEIGHTS_NOTE,
+                                            SUMMARY_CHUNK_TOKENS, SUMMARY_REDUCE_FANIN, MAX_SUMMARY_REPRESENTATIVES)
+
+
+def _summary_cache_key(issue_type, reviews):
+    """Build the cache key for a summary of one issue type and its set of reviews"""
+    normalized_reviews = sorted(normalize_review_text(review) for review in reviews)
+    return make_cache_key('summary', ANALYSIS_MODEL, SUMMARY_PROMPT_VERSION, issue_type, *normalized_reviews)
+
+
+def purge_stale_cache_entries():
+    """
+    Drop cached analyses and summaries produced by older versions of the prompts
+    
+    Returns:
+        int: Number of removed cache entries
+    """
+    cache = get_default_cache()
+    if cache is None:
+        return 0
+    removed = cache.invalidate('analysis', keep_prompt_version=ANALYSIS_PROMPT_VERSION)
+    removed += cache.invalidate('summary', keep_prompt_version=SUMMARY_PROMPT_VERSION)
+    return removed
+
+
+def _text_tokens(text):
+    """Roughly estimate the tokens of a text (about 4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def _pack_texts(texts, max_tokens, max_items=None):
+    """
+    Split texts into consecutive groups of at most max_tokens, keeping their order
+    
+    A text longer than the budget is cut to it and gets a group of its own.
+    """
+    groups = []
+    current = []
+    current_tokens = 0
+    for text in texts:
+        text = text[:max_tokens * 4]
+        tokens = _text_tokens(text)
+        if current and (current_tokens + tokens > max_tokens or (max_items and len(current) >= max_items)):
+            groups.append(current)
+            current = []
+            current_tokens = 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _summary_reviews(reviews):
+    """Return the non-empty review texts, ordered by a hash of their normalized text"""
+    texts = [str(review).strip() for review in reviews if review is not None and str(review).strip()]
+    texts.sort(key=lambda text: (hashlib.sha1(normalize_review_text(text).encode("utf-8")).hexdigest(), text))
+    return texts
+
+
+def _summary_chunks(reviews):
+    """
+    Split the reviews of one issue type into token-budgeted chunks
+    
+    Repeated reviews are sent once, and categories with more than MAX_SUMMARY_REPRESENTATIVES
+    distinct reviews are reduced to one representative per cluster of similar reviews. Each
+    is prefixed with the number of reviews it stands for, largest clusters first. The chunks
+    only depend on the set of reviews.
+    
+    Returns:
+        list: Lists of review texts
+    """
+    texts = []
+    for text, count in select_representatives(_summary_reviews(reviews), MAX_SUMMARY_REPRESENTATIVES):
+        texts.append(text if count == 1 else f"[{count} similar reviews] {text}")
+    return _pack_texts(texts, SUMMARY_CHUNK_TOKENS)
+
+
+def _summary_request_params(issue_type, reviews, chunk=None):
+    """
+    Build the Messages API parameters for summarizing one issue type from a single chunk of reviews
+    
+    Only the first chunk is sent unless `chunk` is given, see generate_category_summary for larger categories.
+    """
+    if chunk is None:
+        chunks = _summary_chunks(reviews)
+        chunk = chunks[0] if chunks else []
+    reviews_text = "\n---\n".join(chunk)
+    
+    return {
+        "model": ANALYSIS_MODEL,
+        "system": SUMMARY_SYSTEM_PROMPT.format(issue_type=issue_type),
+        "messages": [
+            {"role": "user", "content": f"Here are the reviews related to {issue_type}. {REVIEW_WEIGHTS_NOTE}\n\n{reviews_text}"}
+        ],
+        "max_tokens": SUMMARY_MAX_TOKENS
+    }
+
+
+def _partial_summary_request_params(issue_type, texts, merging):
+    """Build the Messages API parameters for the notes on one chunk of reviews or of partial summaries"""
+    if merging:
+        content = f"Merge these notes on separate groups of reviews related to {issue_type} into one set of notes:\n\n"
+    else:
+        content = f"Here are reviews related to {issue_type}. {REVIEW_WEIGHTS_NOTE}\n\n"
+    return {
+        "model": ANALYSIS_MODEL,
+        "system": PARTIAL_SUMMARY_SYSTEM_PROMPT.format(issue_type=issue_type),
+        "messages": [{"role": "user", "content": content + "\n---\n".join(texts)}],
+        "max_tokens": PARTIAL_SUMMARY_MAX_TOKENS
+    }
+
+
+def _final_summary_request_params(issue_type, notes, review_count):
+    """Build the Messages API parameters for the summary merged from the notes on every chunk"""
+    notes_text = "\n---\n".join(notes)
+    return {
+        "model": ANALYSIS_MODEL,
+        "system": SUMMARY_SYSTEM_PROMPT.format(issue_type=issue_type),
+        "messages": [
+            {"role": "user", "content": f"Here are notes on {review_count} reviews related to {issue_type}, "
+                                        f"taken from separate groups of reviews:\n\n{notes_text}"}
+        ],
+        "max_tokens": SUMMARY_MAX_TOKENS
+    }
+
+
+def _request_text(params, api_key, text_callback=None):
+    if text_callback is not None:
+        return _extract_response_text(create_message_stream(params, text_callback, api_key))
+    return _extract_response_text(create_message(params, api_key))
+
+
+def _map_concurrently(fn, items, max_workers):
+    """Apply fn to every item on a thread pool, returning the results in order"""
+    if len(items) == 1:
+        return [fn(items[0])]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as executor:
+        return list(executor.map(fn, items))
+
+
+def _map_reduce_summary(issue_type, chunks, review_count, api_key, max_workers, text_callback=None):
+    """
+    Summarize several chunks of reviews and merge the partial summaries in a tree
+    
+    Each level merges up to SUMMARY_REDUCE_FANIN partial summaries per request, so a category
+    needs about log(chunks) levels on top of the concurrent chunk requests.
+    """
+    notes = _map_concurrently(
+        lambda chunk: _request_text(_partial_summary_request_params(issue_type, chunk, merging=False), api_key),
+        chunks, max_workers
+    )
+    levels = 0
+    while len(notes) > SUMMARY_REDUCE_FANIN or sum(_text_tokens(note) for note in notes) > SUMMARY_CHUNK_TOKENS:
+        groups = _pack_texts(notes, SUMMARY_CHUNK_TOKENS, max_items=SUMMARY_REDUCE_FANIN)
+        if len(groups) == len(notes):
+            # Every note fills a request on its own, merging would not make progress
+            break
+        notes = _map_concurrently(
+            lambda group: group[0] if len(group) == 1 else
+            _request_text(_partial_summary_request_params(issue_type, group, merging=True), api_key),
+            groups, max_workers
+        )
+        levels += 1
+    
+    summary = _request_text(_final_summary_request_params(issue_type, notes, review_count), api_key, text_callback)
+    logger.info(f"Summarized {review_count} {issue_type} reviews from {len(chunks)} chunks "
+                f"with {levels + 1} merge levels")
+    return summary
+
+
+def generate_category_summary(issue_type, reviews, api_key=None, use_cache=True,
+                              max_workers=DEFAULT_SUMMARY_CHUNK_WORKERS, text_callback=None):
+    """
+    Generate a summary and best practices for a specific issue type based on multiple reviews
+    
+    Categories that fit one request are summarized directly. Larger ones are split into
+    token-budgeted chunks that are summarized concurrently and merged in a reduce tree,
+    with the final merge producing the same markdown format.
+    
+    Args:
+        issue_type (str): The category/issue type to summarize
+        reviews (list): List of review contents related to this issue type
+        api_key (str, optional): The Anthropic API key
+        use_cache (bool): Reuse and store summaries in the persistent LLM cache
+        max_workers (int): Chunk and merge requests running at the same time
+        text_callback (callable, optional): Called with every piece of the summary as it is
+            generated, a cached summary comes as one piece
+    
+    Returns:
+        str: A markdown-formatted summary with insights and best practices
+    """
+    cache = get_default_cache() if use_cache else None
+    cache_key = _summary_cache_key(issue_type, reviews) if cache is not None else None
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            if text_callback is not None:
+                text_callback(cached)
+            return cached
     
     try:
-        # Get Anthropic client with provided API key
-        client = get_anthropic_client(api_key)
+        # Every request goes through the shared rate limiter, only the final one is streamed
+        chunks = _summary_chunks(reviews)
+        if len(chunks) <= 1:
+            summary = _request_text(_summary_request_params(issue_type, reviews, chunks[0] if chunks else []), api_key,
+                                    text_callback)
+        else:
+            summary = _map_reduce_summary(issue_type, chunks, len(_summary_reviews(reviews)), api_key, max_workers,
+                                          text_callback)
         
-        # Make the API call
-        #the newest Anthropic model is "claude-3-5-sonnet-20241022" which was released October 22, 2024
-        response = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            system=system_prompt,
-            messages=[
-                {"role": "user", "content": f"Here are the reviews related to {issue_type}:\n\n{reviews_text}"}
-            ],
-            max_tokens=1500
-        )
+        if cache is not None:
+            cache.set(cache_key, summary, 'summary', ANALYSIS_MODEL, SUMMARY_PROMPT_VERSION)
+        return summary
+    
+    except Exception as e:
+        raise Exception(f"Failed to generate summary: {str(e)}")
+
+def stream_category_summary(issue_type, reviews, api_key=None, use_cache=True,
+                            max_workers=DEFAULT_SUMMARY_CHUNK_WORKERS):
+    """
+    Generate a category summary like generate_category_summary, yielding its text as it is written
+    
+    The summary is generated on a background thread. Joined together the yielded pieces are the
+    summary generate_category_summary returns, and its errors are raised from the generator.
+    
+    Yields:
+        str: The next piece of the summary
+    """
+    pieces = queue.Queue()
+    end = object()
+    
+    def generate():
+        try:
+            generate_category_summary(issue_type, reviews, api_key=api_key, use_cache=use_cache,
+                                      max_workers=max_workers, text_callback=pieces.put)
+            pieces.put(end)
+        except Exception as e:
+            pieces.put(e)
+    
+    threading.Thread(target=generate, daemon=True).start()
+    while True:
+        piece = pieces.get()
+        if piece is end:
+            return
+        if isinstance(piece, Exception):
+            raise piece
+        yield piece
+
+
+# Directory where bulk batch state is kept so polling can resume after a restart
+BULK_STATE_DIR = os.environ.get("REVIEW_BULK_STATE_DIR", ".bulk_batches")
+
+# Seconds between Message Batch status checks
+BULK_POLL_INTERVAL = 60
+
+
+def _bulk_custom_id(prefix, key):
+    """Build a Message Batch custom ID (letters, digits, '-' and '_', at most 64 characters)"""
+    key = str(key)
+    safe_key = re.sub(r'[^a-zA-Z0-9_-]', '_', key)
+    if len(prefix) + 1 + len(safe_key) > 64 or safe_key != key:
+        safe_key = hashlib.sha1(key.encode('utf-8')).hexdigest()[:40]
+    return f"{prefix}-{safe_key}"
+
+
+def _bulk_ids_hash(custom_ids):
+    """Fingerprint the set of custom IDs in a batch, independent of their order"""
+    return hashlib.sha1("\n".join(sorted(custom_ids)).encode('utf-8')).hexdigest()[:16]
+
+
+def _bulk_state_path(state_path, kind, custom_ids):
+    """
+    Resolve the state file of a batch of these custom IDs
+    
+    Without an explicit state_path the file name carries the ID hash, so batches of
+    different requests never share a state file. An explicit state file that records
+    a batch of other requests is refused rather than resumed.
+    
+    Raises:
+        ValueError: If state_path holds the state of a batch of different requests
+    """
+    ids_hash = _bulk_ids_hash(custom_ids)
+    if state_path is None:
+        return os.path.join(BULK_STATE_DIR, f"{kind}_batch_{ids_hash}.json")
+    state = load_bulk_state(state_path)
+    if state is not None and state.get('ids_hash') != ids_hash:
+        raise ValueError(f"{state_path} records batch {state.get('batch_id')} of different requests, "
+                         f"remove it with clear_bulk_state or pass another state_path")
+    return state_path
+
+
+def _save_bulk_state(state_path, state):
+    """Write the bulk batch state atomically"""
+    os.makedirs(os.path.dirname(os.path.abspath(state_path)), exist_ok=True)
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, state_path)
+
+
+def load_bulk_state(state_path):
+    """
+    Load a previously saved bulk batch state
+    
+    Args:
+        state_path (str): Path of the state file
+    
+    Returns:
+        dict or None: The saved state, or None if there is no saved batch
+    """
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def clear_bulk_state(state_path):
+    """Remove a saved bulk batch state so the next bulk run submits a fresh batch"""
+    if os.path.exists(state_path):
+        os.remove(state_path)
+
+
+def submit_bulk_batch(requests, kind, custom_id_map, state_path, api_key=None, base_url=None):
+    """
+    Submit prepared requests as a Message Batch and persist its state
+    
+    Args:
+        requests (list): Message Batch requests with 'custom_id' and 'params'
+        kind (str): 'analysis' or 'summary', used when mapping results back
+        custom_id_map (dict): Custom ID to the caller's key (row ID or issue type)
+        state_path (str): Where to save the batch state for resuming
+        api_key (str, optional): The Anthropic API key
+        base_url (str, optional): Alternative API endpoint, e.g. the local stub server
+    
+    Returns:
+        dict: The saved batch state
+    """
+    client = get_anthropic_client(api_key, base_url=base_url)
+    batch = client.messages.batches.create(requests=requests)
+    
+    state = {
+        'batch_id': batch.id,
+        'kind': kind,
+        'custom_id_map': custom_id_map,
+        'ids_hash': _bulk_ids_hash(custom_id_map),
+        'submitted_at': datetime.now().isoformat(),
+        'processing_status': batch.processing_status
+    }
+    _save_bulk_state(state_path, state)
+    logger.info(f"Submitted {kind} batch {batch.id} with {len(requests)} requests")
+    return state
+
+
+def wait_for_bulk_batch(state_path, api_key=None, base_url=None, poll_interval=BULK_POLL_INTERVAL, timeout=None):
+    """
+    Poll a saved Message Batch until it has ended and map its results back by custom ID
+    
+    Safe to call again after a restart: it picks up the batch recorded in the state file.
+    
+    Args:
+        state_path (str): Path of the state file written by submit_bulk_batch
+        api_key (str, optional): The Anthropic API key
+        base_url (str, optional): Alternative API endpoint, e.g. the local stub server
+        poll_interval (float): Seconds between status checks
+        timeout (float, optional): Give up after this many seconds
+    
+    Returns:
+        tuple: (results, failed) - results maps the caller's keys to response text,
+            failed maps the caller's keys to the error type of requests that did not succeed
+    """
+    state = load_bulk_state(state_path)
+    if not state:
+        raise ValueError(f"No bulk batch state found at {state_path}")
+    
+    client = get_anthropic_client(api_key, base_url=base_url)
+    started = time.time()
+    
+    while True:
+        batch = client.messages.batches.retrieve(state['batch_id'])
+        if batch.processing_status != state.get('processing_status'):
+            state['processing_status'] = batch.processing_status
+            _save_bulk_state(state_path, state)
         
-        # Return the generated summary
-        # Extract the text based on different possible response formats
-        if hasattr(response, 'content') and response.content:
-            content_block = response.content[0]
-            
-            if hasattr(content_block, 'text'):
-                return content_block.text
-            elif hasattr(content_block, 'value'):
-                return content_block.value
-            else:
-                return str(content_block)
+        if batch.processing_status == "ended":
+            break
+        if timeout is not None and time.time() - started > timeout:
+            raise TimeoutError(f"Batch {state['batch_id']} did not finish within {timeout} seconds")
+        
+        logger.info(f"Batch {state['batch_id']} is {batch.processing_status}, checking again in {poll_interval}s")
+        time.sleep(poll_interval)
+    
+    results = {}
+    failed = {}
+    custom_id_map = state['custom_id_map']
+    for entry in client.messages.batches.results(state['batch_id']):
+        key = custom_id_map.get(entry.custom_id)
+        if key is None:
+            continue
+        if entry.result.type == "succeeded":
+            try:
+                results[key] = _extract_response_text(entry.result.message)
+            except ValueError as e:
+                failed[key] = str(e)
         else:
-            raise ValueError("No content in response")
+            failed[key] = entry.result.type
     
-    except Exception as e:
-        raise Exception(f"Failed to generate summary: {str(e)}")
\ No newline at end of file
+    state['completed_at'] = datetime.now().isoformat()
+    _save_bulk_state(state_path, state)
+    return results, failed
+
+
+def bulk_analyze_reviews(reviews, state_path=None, api_key=None, base_url=None,
+                         poll_interval=BULK_POLL_INTERVAL, timeout=None):
+    """
+    Analyze reviews offline through the Message Batches API
+    
+    Submits one analyze_review request per review, or resumes the batch of the same
+    requests recorded in the state file, then waits for it and parses each result.
+    The state file is removed once the results are mapped back.
+    
+    Args:
+        reviews (list): Dictionaries with 'id', 'content' and optional 'title' and 'rating' keys
+        state_path (str, optional): State file used to resume after a restart, by default
+            one per set of requests in BULK_STATE_DIR
+        api_key (str, optional): The Anthropic API key
+        base_url (str, optional): Alternative API endpoint, e.g. the local stub server
+        poll_interval (float): Seconds between status checks
+        timeout (float, optional): Give up after this many seconds
+    
+    Returns:
+        tuple: (results, failed) - review ID to analysis result with the same shape as
+            analyze_review, and review ID to error for the reviews without a usable result
+    
+    Raises:
+        ValueError: If state_path records a batch of different reviews
+    """
+    cache = get_default_cache()
+    
+    # Reviews already in the cache are not sent again
+    results = {}
+    uncached = []
+    for review in reviews:
+        cached = _get_cached_analysis(cache, review.get('content', ''), review.get('title', ''), review.get('rating'))
+        if cached is not None:
+            results[str(review['id'])] = cached
+        else:
+            uncached.append(review)
+    
+    if not uncached:
+        return results, {}
+    
+    requests = []
+    custom_id_map = {}
+    for review in uncached:
+        custom_id = _bulk_custom_id("review", review['id'])
+        custom_id_map[custom_id] = str(review['id'])
+        full_review = _format_review(review.get('content', ''), review.get('title', ''), review.get('rating'))
+        requests.append({'custom_id': custom_id, 'params': _analysis_request_params(full_review)})
+    state_path = _bulk_state_path(state_path, "analysis", custom_id_map)
+    if load_bulk_state(state_path) is None:
+        submit_bulk_batch(requests, 'analysis', custom_id_map, state_path, api_key=api_key, base_url=base_url)
+    
+    texts, failed = wait_for_bulk_batch(state_path, api_key=api_key, base_url=base_url,
+                                        poll_interval=poll_interval, timeout=timeout)
+    
+    for review in uncached:
+        review_id = str(review['id'])
+        if review_id in failed:
+            continue
+        try:
+            results[review_id] = _parse_analysis_json(texts[review_id])
+        except KeyError:
+            failed[review_id] = "missing from the batch results"
+            continue
+        except ValueError as e:
+            failed[review_id] = str(e)
+            continue
+        _store_cached_analysis(cache, results[review_id], review.get('content', ''),
+                               review.get('title', ''), review.get('rating'))
+    clear_bulk_state(state_path)
+    
+    if failed:
+        logger.warning(f"{len(failed)} reviews could not be analyzed in the batch")
+    return results, failed
+
+
+def bulk_generate_category_summaries(issue_reviews, state_path=None, api_key=None, base_url=None,
+                                     poll_interval=BULK_POLL_INTERVAL, timeout=None):
+    """
+    Generate knowledge base summaries offline through the Message Batches API
+    
+    Issue types whose reviews fit one request are summarized in the batch. Larger ones need
+    several rounds of requests and are summarized with generate_category_summary instead,
+    while the batch is processing. The state file is removed once the results are mapped back.
+    
+    Args:
+        issue_reviews (dict): Issue type to list of review contents
+        state_path (str, optional): State file used to resume after a restart, by default
+            one per set of requests in BULK_STATE_DIR
+        api_key (str, optional): The Anthropic API key
+        base_url (str, optional): Alternative API endpoint, e.g. the local stub server
+        poll_interval (float): Seconds between status checks
+        timeout (float, optional): Give up after this many seconds
+    
+    Returns:
+        tuple: (knowledge_base, failed) - issue type to markdown summary, and issue type to error
+    
+    Raises:
+        ValueError: If state_path records a batch of different requests
+    """
+    requests = []
+    custom_id_map = {}
+    large = {}
+    for issue_type, reviews in issue_reviews.items():
+        if not reviews:
+            continue
+        chunks = _summary_chunks(reviews)
+        if len(chunks) > 1:
+            large[issue_type] = reviews
+            continue
+        custom_id = _bulk_custom_id("summary", issue_type)
+        custom_id_map[custom_id] = issue_type
+        requests.append({'custom_id': custom_id, 'params': _summary_request_params(issue_type, reviews, chunks[0])})
+    
+    knowledge_base = {}
+    failed = {}
+    if requests:
+        state_path = _bulk_state_path(state_path, "summary", custom_id_map)
+        if load_bulk_state(state_path) is None:
+            submit_bulk_batch(requests, 'summary', custom_id_map, state_path, api_key=api_key, base_url=base_url)
+    
+    if large:
+        logger.info(f"Summarizing {len(large)} issue types too large for one request outside the batch")
+    for issue_type, reviews in large.items():
+        try:
+            knowledge_base[issue_type] = generate_category_summary(issue_type, reviews, api_key)
+        except Exception as e:
+            failed[issue_type] = str(e)
+    
+    if requests:
+        texts, batch_failed = wait_for_bulk_batch(state_path, api_key=api_key, base_url=base_url,
+                                                  poll_interval=poll_interval, timeout=timeout)
+        knowledge_base.update(texts)
+        failed.update(batch_failed)
+        clear_bulk_state(state_path)
+    return knowledge_base, failed
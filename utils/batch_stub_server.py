@@ -0,0 +1,209 @@
+import json
+import time
+import uuid
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("BatchStubServer")
+
+# Canned analysis returned for review analysis requests
+STUB_ANALYSIS = {
+    "sentiment": "Negative",
+    "sentiment_score": -0.5,
+    "key_emotions": ["frustration"],
+    "emotion": "Frustration",
+    "urgency": "Medium",
+    "aspect": "Product",
+    "issue_type": "Functionality Issue",
+    "confidence": 0.9
+}
+
+
+def default_responder(params):
+    """
+    Produce a canned response text for a Messages API request
+
+    Requests asking for JSON get a fixed analysis, everything else gets a small markdown summary.
+    """
+    system = params.get('system', '')
+    if isinstance(system, str) and 'JSON' in system:
+        return json.dumps(STUB_ANALYSIS)
+    return "## Overview\n\n- Stub summary generated offline\n"
+
+
+def _isoformat(moment):
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class _StubBatch:
+    def __init__(self, requests, processing_delay):
+        self.id = f"msgbatch_stub_{uuid.uuid4().hex[:16]}"
+        self.requests = requests
+        self.created_at = datetime.now(timezone.utc)
+        self.ready_at = time.time() + processing_delay
+
+    def ended(self):
+        return time.time() >= self.ready_at
+
+
+class BatchStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, processing_delay=0.0, responder=None):
+        """
+        Local stand-in for the Message Batches endpoints of the Anthropic API
+
+        Args:
+            address (tuple): (host, port) to listen on, port 0 picks a free port
+            processing_delay (float): Seconds before a submitted batch reports as ended
+            responder (callable, optional): Maps request params to response text
+        """
+        super().__init__(address, _StubHandler)
+        self.processing_delay = processing_delay
+        self.responder = responder or default_responder
+        self.batches = {}
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def batch_object(self, batch):
+        """Build the MessageBatch JSON object for a stored batch"""
+        ended = batch.ended()
+        count = len(batch.requests)
+        return {
+            "id": batch.id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else count,
+                "succeeded": count if ended else 0,
+                "errored": 0,
+                "canceled": 0,
+                "expired": 0
+            },
+            "created_at": _isoformat(batch.created_at),
+            "expires_at": _isoformat(batch.created_at + timedelta(days=1)),
+            "ended_at": _isoformat(datetime.now(timezone.utc)) if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{self.base_url}/v1/messages/batches/{batch.id}/results" if ended else None
+        }
+
+    def result_lines(self, batch):
+        """Build the JSONL results for a finished batch"""
+        for request in batch.requests:
+            params = request.get('params', {})
+            text = self.responder(params)
+            message = {
+                "id": f"msg_stub_{uuid.uuid4().hex[:16]}",
+                "type": "message",
+                "role": "assistant",
+                "model": params.get('model', ''),
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": {"input_tokens": 0, "output_tokens": 0}
+            }
+            yield json.dumps({
+                "custom_id": request['custom_id'],
+                "result": {"type": "succeeded", "message": message}
+            })
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_found(self):
+        self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": "Not found"}})
+
+    def do_POST(self):
+        path = self.path.split('?')[0].rstrip('/')
+        if path != '/v1/messages/batches':
+            return self._not_found()
+
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        batch = _StubBatch(payload.get('requests', []), self.server.processing_delay)
+        with self.server.lock:
+            self.server.batches[batch.id] = batch
+        logger.info(f"Accepted stub batch {batch.id} with {len(batch.requests)} requests")
+        self._send_json(200, self.server.batch_object(batch))
+
+    def do_GET(self):
+        parts = self.path.split('?')[0].strip('/').split('/')
+        if parts[:3] != ['v1', 'messages', 'batches'] or len(parts) < 4:
+            return self._not_found()
+
+        with self.server.lock:
+            batch = self.server.batches.get(parts[3])
+        if batch is None:
+            return self._not_found()
+
+        if len(parts) == 4:
+            return self._send_json(200, self.server.batch_object(batch))
+
+        if len(parts) == 5 and parts[4] == 'results' and batch.ended():
+            body = "\n".join(self.server.result_lines(batch)).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-jsonl')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self._not_found()
+
+
+def start_stub_server(host="127.0.0.1", port=0, processing_delay=0.0, responder=None):
+    """
+    Start the Message Batches stub server in a background thread
+
+    Pass the returned server's base_url to the bulk functions in anthropic_helper
+    to run the whole submit/poll/results flow offline.
+
+    Args:
+        host (str): Interface to listen on
+        port (int): Port to listen on, 0 picks a free port
+        processing_delay (float): Seconds before a submitted batch reports as ended
+        responder (callable, optional): Maps request params to response text
+
+    Returns:
+        BatchStubServer: The running server, stop it with shutdown()
+    """
+    server = BatchStubServer((host, port), processing_delay=processing_delay, responder=responder)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    logger.info(f"Batch stub server listening on {server.base_url}")
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local Message Batches stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=5.0, help="Seconds before a batch reports as ended")
+    args = parser.parse_args()
+
+    server = BatchStubServer((args.host, args.port), processing_delay=args.delay)
+    logger.info(f"Batch stub server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from utils.anthropic_helper import ANALYSIS_PROMPT_VERSION, _normalize_rating
+from utils.llm_cache import normalize_review_text
+
+logger = logging.getLogger("AnalysisCheckpoint")
+
+# Location of the checkpoint database, override with REVIEW_CHECKPOINT_PATH
+DEFAULT_CHECKPOINT_PATH = os.environ.get(
+    "REVIEW_CHECKPOINT_PATH", os.path.join(".cache", "analysis_checkpoints.sqlite")
+)
+
+# Completed rows are buffered and written once either limit is reached
+CHECKPOINT_FLUSH_ROWS = 50
+CHECKPOINT_FLUSH_SECONDS = 5.0
+
+# Checkpoints untouched for longer than this are dropped
+DEFAULT_MAX_AGE_DAYS = 14
+
+
+def compute_run_id(review_fields):
+    """
+    Derive a stable run ID from the reviews being analyzed
+
+    The same reviews in the same order, analyzed with the same prompt, always
+    get the same ID, so a restarted run finds its earlier checkpoint.
+
+    Args:
+        review_fields (list): (content, title, rating) for every analyzable review
+
+    Returns:
+        str: Short hex run ID
+    """
+    digest = hashlib.sha256(ANALYSIS_PROMPT_VERSION.encode('utf-8'))
+    for content, title, rating in review_fields:
+        if title is None or (isinstance(title, float) and title != title):
+            title = ""
+        payload = json.dumps([normalize_review_text(content), normalize_review_text(title), _normalize_rating(rating)],
+                             ensure_ascii=False)
+        digest.update(payload.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()[:16]
+
+
+class CheckpointStore:
+    def __init__(self, path=DEFAULT_CHECKPOINT_PATH, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        """
+        Durable SQLite store of completed analysis rows, grouped by run ID
+
+        Args:
+            path (str): Database file path
+            max_age_days (float): Runs not updated for this long are purged on open
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS analysis_runs (
+                run_id TEXT PRIMARY KEY,
+                total INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS analysis_rows (
+                run_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                result TEXT NOT NULL,
+                PRIMARY KEY (run_id, position)
+            )
+        """)
+        self._conn.commit()
+        if max_age_days:
+            self.purge(max_age_days)
+
+    def open_run(self, run_id, total):
+        """
+        Open the checkpoint of a run, creating it when it does not exist yet
+
+        A stored run whose size differs from `total` cannot belong to the same
+        input, so it is discarded and started over.
+
+        Returns:
+            RunCheckpoint
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT total FROM analysis_runs WHERE run_id = ?", (run_id,)).fetchone()
+            if row is not None and row[0] != total:
+                logger.warning(f"Checkpoint {run_id} has {row[0]} rows instead of {total}, starting over")
+                self._delete(run_id)
+                row = None
+            if row is None:
+                self._conn.execute(
+                    "INSERT INTO analysis_runs (run_id, total, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (run_id, total, "running", now, now)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE analysis_runs SET status = 'running', updated_at = ? WHERE run_id = ?", (now, run_id)
+                )
+            self._conn.commit()
+        return RunCheckpoint(self, run_id, total)
+
+    def run_info(self, run_id):
+        """
+        Describe a stored run
+
+        Returns:
+            dict or None: total, completed, status and timestamps, or None when unknown
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT total, status, created_at, updated_at FROM analysis_runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            completed = self._conn.execute(
+                "SELECT COUNT(*) FROM analysis_rows WHERE run_id = ?", (run_id,)
+            ).fetchone()[0]
+        total, status, created_at, updated_at = row
+        return {'run_id': run_id, 'total': total, 'completed': completed, 'status': status,
+                'created_at': created_at, 'updated_at': updated_at}
+
+    def load_rows(self, run_id):
+        """
+        Return the rows stored for a run, e.g. to show the progress of a run in another process
+
+        Returns:
+            dict: Row position to analysis result
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT position, result FROM analysis_rows WHERE run_id = ?", (run_id,)
+            ).fetchall()
+        return {position: json.loads(result) for position, result in rows}
+
+    def _write_rows(self, run_id, rows):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO analysis_rows (run_id, position, result) VALUES (?, ?, ?)",
+                [(run_id, position, json.dumps(result, ensure_ascii=False, default=str)) for position, result in rows]
+            )
+            self._conn.execute("UPDATE analysis_runs SET updated_at = ? WHERE run_id = ?", (now, run_id))
+            self._conn.commit()
+
+    def _set_status(self, run_id, status):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE analysis_runs SET status = ?, updated_at = ? WHERE run_id = ?", (status, time.time(), run_id)
+            )
+            self._conn.commit()
+
+    def _delete(self, run_id):
+        self._conn.execute("DELETE FROM analysis_rows WHERE run_id = ?", (run_id,))
+        self._conn.execute("DELETE FROM analysis_runs WHERE run_id = ?", (run_id,))
+
+    def delete_run(self, run_id):
+        """Remove a run and its rows"""
+        with self._lock:
+            self._delete(run_id)
+            self._conn.commit()
+
+    def purge(self, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        """
+        Remove runs that have not been updated for `max_age_days`
+
+        Returns:
+            int: Number of removed runs
+        """
+        cutoff = time.time() - max_age_days * 86400
+        with self._lock:
+            run_ids = [row[0] for row in self._conn.execute(
+                "SELECT run_id FROM analysis_runs WHERE updated_at < ?", (cutoff,)
+            ).fetchall()]
+            for run_id in run_ids:
+                self._delete(run_id)
+            self._conn.commit()
+        if run_ids:
+            logger.info(f"Purged {len(run_ids)} old analysis checkpoints")
+        return len(run_ids)
+
+
+class RunCheckpoint:
+    def __init__(self, store, run_id, total, flush_rows=CHECKPOINT_FLUSH_ROWS, flush_seconds=CHECKPOINT_FLUSH_SECONDS):
+        """
+        Checkpoint of a single analysis run, written to the store in batches
+
+        Args:
+            store (CheckpointStore): Where the rows are persisted
+            run_id (str): The run ID
+            total (int): Number of reviews in the run
+            flush_rows (int): Buffered rows that trigger a write
+            flush_seconds (float): Age of the oldest buffered row that triggers a write
+        """
+        self.store = store
+        self.run_id = run_id
+        self.total = total
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._pending = []
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+
+    def completed(self):
+        """
+        Return the rows finished by earlier attempts of this run
+
+        Returns:
+            dict: Row position to analysis result
+        """
+        return self.store.load_rows(self.run_id)
+
+    def add(self, position, result):
+        """Buffer one finished row, flushing when the batch is full or old enough"""
+        with self._lock:
+            self._pending.append((position, result))
+            due = len(self._pending) >= self.flush_rows or time.time() - self._last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write every buffered row to the store"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._last_flush = time.time()
+        if pending:
+            self.store._write_rows(self.run_id, pending)
+
+    def mark_complete(self):
+        """Flush and record that every row of the run is done"""
+        self.flush()
+        self.store._set_status(self.run_id, "complete")
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_checkpoint_store():
+    """Return the process-wide checkpoint store"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = CheckpointStore()
+        return _default_store
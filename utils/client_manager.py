@@ -0,0 +1,152 @@
+import os
+import asyncio
+import logging
+import threading
+import weakref
+
+import httpx
+from anthropic import Anthropic, AsyncAnthropic
+
+logger = logging.getLogger("AnthropicClientManager")
+
+# Connection pool limits and timeouts, overridable through the environment
+DEFAULT_MAX_CONNECTIONS = int(os.environ.get("ANTHROPIC_POOL_MAX_CONNECTIONS", 64))
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("ANTHROPIC_POOL_MAX_KEEPALIVE", 32))
+DEFAULT_KEEPALIVE_EXPIRY = float(os.environ.get("ANTHROPIC_POOL_KEEPALIVE_EXPIRY", 60.0))
+DEFAULT_CONNECT_TIMEOUT = float(os.environ.get("ANTHROPIC_CONNECT_TIMEOUT", 10.0))
+DEFAULT_REQUEST_TIMEOUT = float(os.environ.get("ANTHROPIC_REQUEST_TIMEOUT", 120.0))
+DEFAULT_MAX_RETRIES = int(os.environ.get("ANTHROPIC_MAX_RETRIES", 2))
+
+
+class AnthropicClientManager:
+    def __init__(self, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive_connections=DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 request_timeout=DEFAULT_REQUEST_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES):
+        """
+        Process-wide manager keeping one pooled Anthropic client per API key
+
+        Sync clients are shared by all threads. Async clients are created per
+        event loop, because an httpx.AsyncClient cannot be used across loops.
+
+        Args:
+            max_connections (int): Maximum open connections per client
+            max_keepalive_connections (int): Maximum idle connections kept alive per client
+            keepalive_expiry (float): Seconds an idle connection is kept
+            connect_timeout (float): Seconds allowed to establish a connection
+            request_timeout (float): Seconds allowed for a whole request
+            max_retries (int): Retries done by the SDK itself
+        """
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._async_clients = weakref.WeakKeyDictionary()
+        self.configure(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+            connect_timeout=connect_timeout,
+            request_timeout=request_timeout,
+            max_retries=max_retries
+        )
+
+    def configure(self, **settings):
+        """
+        Change pool limits or timeouts
+
+        Existing clients are closed, so new settings apply to every later call.
+
+        Args:
+            **settings: Any of the constructor arguments
+        """
+        with self._lock:
+            for name, value in settings.items():
+                setattr(self, name, value)
+            self._close_sync_clients()
+            self._async_clients = weakref.WeakKeyDictionary()
+
+    def _limits(self):
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+    def _timeout(self):
+        return httpx.Timeout(self.request_timeout, connect=self.connect_timeout)
+
+    def get_client(self, api_key, base_url=None):
+        """
+        Return the shared sync client for an API key, creating it on first use
+
+        Args:
+            api_key (str): The Anthropic API key
+            base_url (str, optional): Alternative API endpoint
+
+        Returns:
+            Anthropic: A thread-safe client backed by a pooled HTTP client
+        """
+        key = (api_key, base_url)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                http_client = httpx.Client(limits=self._limits(), timeout=self._timeout())
+                options = {'api_key': api_key, 'http_client': http_client,
+                           'timeout': self._timeout(), 'max_retries': self.max_retries}
+                if base_url:
+                    options['base_url'] = base_url
+                client = Anthropic(**options)
+                self._clients[key] = client
+                logger.info("Created pooled Anthropic client")
+            return client
+
+    def get_async_client(self, api_key, base_url=None):
+        """
+        Return the shared async client for an API key on the running event loop
+
+        Args:
+            api_key (str): The Anthropic API key
+            base_url (str, optional): Alternative API endpoint
+
+        Returns:
+            AsyncAnthropic: A client that can be shared by all tasks on this loop
+        """
+        loop = asyncio.get_running_loop()
+        key = (api_key, base_url)
+        with self._lock:
+            loop_clients = self._async_clients.setdefault(loop, {})
+            client = loop_clients.get(key)
+            if client is None:
+                http_client = httpx.AsyncClient(limits=self._limits(), timeout=self._timeout())
+                options = {'api_key': api_key, 'http_client': http_client,
+                           'timeout': self._timeout(), 'max_retries': self.max_retries}
+                if base_url:
+                    options['base_url'] = base_url
+                client = AsyncAnthropic(**options)
+                loop_clients[key] = client
+            return client
+
+    def _close_sync_clients(self):
+        for client in self._clients.values():
+            try:
+                client.close()
+            except Exception as e:
+                logger.debug(f"Error closing Anthropic client: {e}")
+        self._clients = {}
+
+    def close(self):
+        """Close every pooled sync client"""
+        with self._lock:
+            self._close_sync_clients()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_client_manager():
+    """Return the process-wide client manager"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = AnthropicClientManager()
+        return _manager
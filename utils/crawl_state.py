@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+
+logger = logging.getLogger("CrawlState")
+
+# Location of the crawl state database, override with REVIEW_CRAWL_STATE_PATH
+DEFAULT_CRAWL_STATE_PATH = os.environ.get(
+    "REVIEW_CRAWL_STATE_PATH", os.path.join(".cache", "crawl_state.sqlite")
+)
+
+# Crawl states
+RUNNING = "running"
+STOPPED = "stopped"
+COMPLETE = "complete"
+
+
+class CrawlStateStore:
+    def __init__(self, path=DEFAULT_CRAWL_STATE_PATH):
+        """
+        Position of every full-history crawl, saved after each page so a crawl resumes where it stopped
+
+        Args:
+            path (str): Database file path
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS crawls (
+                source TEXT NOT NULL,
+                target TEXT NOT NULL,
+                token TEXT,
+                pages INTEGER NOT NULL DEFAULT 0,
+                reviews INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (source, target)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, source, target):
+        """
+        Return the state of a crawl
+
+        Returns:
+            dict or None: token (dict or None), pages, reviews, status, started_at and updated_at,
+                or None if the target was never crawled
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT token, pages, reviews, status, started_at, updated_at FROM crawls "
+                "WHERE source = ? AND target = ?", (source, target)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'source': source, 'target': target, 'token': json.loads(row[0]) if row[0] else None,
+                'pages': row[1], 'reviews': row[2], 'status': row[3], 'started_at': row[4], 'updated_at': row[5]}
+
+    def start(self, source, target):
+        """Record a crawl starting from the first page"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO crawls (source, target, token, pages, reviews, status, started_at, updated_at) "
+                "VALUES (?, ?, NULL, 0, 0, ?, ?, ?)", (source, target, RUNNING, now, now)
+            )
+            self._conn.commit()
+
+    def save(self, source, target, token, pages, reviews, status=RUNNING):
+        """
+        Record the position after a page
+
+        Args:
+            token (dict or None): What the next page is requested with, None once the crawl is complete
+            pages (int): Pages fetched so far
+            reviews (int): Reviews stored so far
+            status (str): RUNNING, STOPPED or COMPLETE
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE crawls SET token = ?, pages = ?, reviews = ?, status = ?, updated_at = ? "
+                "WHERE source = ? AND target = ?",
+                (json.dumps(token) if token else None, pages, reviews, status, time.time(), source, target)
+            )
+            self._conn.commit()
+
+    def reset(self, source=None, target=None):
+        """Forget one crawl, every crawl of a source, or all of them, so they start over"""
+        query = "DELETE FROM crawls"
+        params = []
+        if source is not None:
+            query += " WHERE source = ?"
+            params.append(source)
+            if target is not None:
+                query += " AND target = ?"
+                params.append(target)
+        with self._lock:
+            self._conn.execute(query, params)
+            self._conn.commit()
+
+    def list(self):
+        """Return the state of every crawl"""
+        with self._lock:
+            rows = self._conn.execute("SELECT source, target FROM crawls ORDER BY source, target").fetchall()
+        return [self.get(source, target) for source, target in rows]
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_crawl_state_store():
+    """Return the process-wide crawl state store"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = CrawlStateStore()
+        return _default_store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or reset full-history crawls")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="Show every crawl")
+    reset_parser = subparsers.add_parser("reset", help="Forget crawls so they start over from the newest review")
+    reset_parser.add_argument("--source", help="Only this source, e.g. 'Google Play Store'")
+    reset_parser.add_argument("--target", help="Only this app ID")
+
+    args = parser.parse_args()
+    store = CrawlStateStore()
+    if args.command == "list":
+        for crawl in store.list():
+            print(f"{crawl['source']:<18} {crawl['target']:<40} {crawl['status']:<9} "
+                  f"{crawl['pages']} pages, {crawl['reviews']} reviews")
+    else:
+        store.reset(args.source, args.target)
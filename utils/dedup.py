@@ -0,0 +1,271 @@
+import re
+import zlib
+import logging
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+logger = logging.getLogger("ReviewDedup")
+
+# Similarity above which two reviews are treated as the same review
+DEFAULT_SIMILARITY_THRESHOLD = 0.8
+
+# MinHash signature length and LSH banding (NUM_PERMUTATIONS must be divisible by NUM_BANDS)
+NUM_PERMUTATIONS = 64
+NUM_BANDS = 16
+
+# Shingle size in UTF-8 bytes (at most 4, so a shingle fits the 32-bit hash input)
+SHINGLE_SIZE = 4
+
+# Number of texts hashed together when computing signatures
+SIGNATURE_CHUNK_SIZE = 2000
+
+# Maximum number of (permutation, shingle) hash values held in memory at once
+MAX_HASH_CELLS = 1 << 22
+
+# Shift of the multiply-shift hash family, keeps the top 32 bits of the 64-bit product
+_HASH_SHIFT = np.uint64(32)
+
+
+def normalize_for_dedup(text):
+    """
+    Aggressively normalize review text for near-duplicate detection
+
+    Lowercases, removes punctuation and emoji, squeezes characters repeated
+    more than twice ("goooood" -> "good") and collapses whitespace.
+    """
+    if text is None:
+        return ""
+    if not isinstance(text, str):
+        text = str(text)
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = re.sub(r'[^\w\s]', ' ', text)
+    text = re.sub(r'(.)\1{2,}', r'\1\1', text)
+    return " ".join(text.split())
+
+
+def _shingle_values(normalized_texts):
+    """
+    Turn texts into their byte shingles, vectorized over the whole list
+
+    Each shingle of SHINGLE_SIZE UTF-8 bytes is packed into one integer, so no
+    per-shingle hashing is needed before MinHash.
+
+    Returns:
+        tuple: (values, offsets) - shingle values of all texts back to back,
+            and the index of the first shingle of every text
+    """
+    encoded = [text.encode('utf-8').ljust(SHINGLE_SIZE, b'\0') for text in normalized_texts]
+    lengths = np.fromiter((len(item) for item in encoded), dtype=np.int64, count=len(encoded))
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.uint64)
+    owner = np.repeat(np.arange(len(encoded)), lengths)
+
+    windows = len(data) - SHINGLE_SIZE + 1
+    values = np.zeros(windows, dtype=np.uint64)
+    for offset in range(SHINGLE_SIZE):
+        values |= data[offset:offset + windows] << np.uint64(8 * offset)
+
+    # Drop the windows that straddle two texts
+    valid = owner[:windows] == owner[SHINGLE_SIZE - 1:]
+    shingle_counts = lengths - SHINGLE_SIZE + 1
+    offsets = np.concatenate(([0], np.cumsum(shingle_counts)[:-1]))
+    return values[valid], offsets
+
+
+class MinHasher:
+    def __init__(self, num_permutations=NUM_PERMUTATIONS, seed=1):
+        """
+        MinHash signatures over byte shingles
+
+        Args:
+            num_permutations (int): Signature length
+            seed (int): Seed for the hash family, fixed so signatures are reproducible
+        """
+        rng = np.random.RandomState(seed)
+        self.num_permutations = num_permutations
+        # Random odd multipliers and random offsets over the full 64-bit range
+        self.a = rng.randint(0, 1 << 62, size=num_permutations, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.randint(0, 1 << 62, size=num_permutations, dtype=np.int64).astype(np.uint64)
+
+    def signature(self, normalized_text):
+        """Compute the MinHash signature of a normalized text"""
+        return self.signatures([normalized_text])[0]
+
+    def signatures(self, normalized_texts, chunk_size=SIGNATURE_CHUNK_SIZE):
+        """
+        Compute MinHash signatures for many normalized texts at once
+
+        Returns:
+            np.ndarray: Array of shape (len(normalized_texts), num_permutations)
+        """
+        result = np.empty((len(normalized_texts), self.num_permutations), dtype=np.uint64)
+        for start in range(0, len(normalized_texts), chunk_size):
+            chunk = normalized_texts[start:start + chunk_size]
+            values, offsets = _shingle_values(chunk)
+            # Hash a block of permutations at a time so long chunks stay within MAX_HASH_CELLS
+            rows = max(1, MAX_HASH_CELLS // max(1, len(values)))
+            for first in range(0, self.num_permutations, rows):
+                a, b = self.a[first:first + rows], self.b[first:first + rows]
+                # (a * x + b) mod 2^64, keep the top 32 bits, minimum over each text's shingles
+                permuted = (np.outer(a, values) + b[:, None]) >> _HASH_SHIFT
+                result[start:start + len(chunk), first:first + rows] = np.minimum.reduceat(permuted, offsets, axis=1).T
+        return result
+
+
+class _UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, item):
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, first, second):
+        first_root, second_root = self.find(first), self.find(second)
+        if first_root != second_root:
+            # Keep the earliest item as the root so cluster IDs follow input order
+            if second_root < first_root:
+                first_root, second_root = second_root, first_root
+            self.parent[second_root] = first_root
+
+
+class DedupResult:
+    def __init__(self, labels, representatives, normalized_texts):
+        """
+        Result of near-duplicate clustering
+
+        Args:
+            labels (list): Cluster representative position for every input position
+            representatives (list): Input positions chosen to represent each cluster
+            normalized_texts (list): The normalized texts that were compared
+        """
+        self.labels = labels
+        self.representatives = representatives
+        self.normalized_texts = normalized_texts
+
+    @property
+    def total(self):
+        return len(self.labels)
+
+    @property
+    def cluster_count(self):
+        return len(self.representatives)
+
+    @property
+    def calls_saved(self):
+        return self.total - self.cluster_count
+
+    def members(self):
+        """
+        Map each representative to the positions it stands for
+
+        Returns:
+            dict: Representative position to list of member positions
+        """
+        clusters = defaultdict(list)
+        for position, representative in enumerate(self.labels):
+            clusters[representative].append(position)
+        return dict(clusters)
+
+    def stats(self):
+        """Return a summary of how many calls the clustering saved"""
+        return {
+            'total_reviews': self.total,
+            'clusters': self.cluster_count,
+            'calls_saved': self.calls_saved,
+            'saved_fraction': self.calls_saved / self.total if self.total else 0.0
+        }
+
+
+def cluster_near_duplicates(texts, group_keys=None, threshold=DEFAULT_SIMILARITY_THRESHOLD,
+                            num_permutations=NUM_PERMUTATIONS, num_bands=NUM_BANDS):
+    """
+    Cluster near-duplicate reviews with MinHash and locality-sensitive hashing
+
+    Exact duplicates (after normalization) are merged first, then one MinHash
+    signature per distinct text is bucketed by LSH band. Each bucket is compared
+    against its first member only, so the work stays close to linear in the
+    number of reviews. Reviews with different group keys never share a cluster.
+
+    Args:
+        texts (list): Review texts
+        group_keys (list, optional): Per-review key that must match within a cluster, e.g. the rating
+        threshold (float): Minimum estimated Jaccard similarity of byte shingles
+        num_permutations (int): MinHash signature length
+        num_bands (int): Number of LSH bands
+
+    Returns:
+        DedupResult: Cluster labels and representatives
+    """
+    if num_permutations % num_bands:
+        raise ValueError("num_permutations must be divisible by num_bands")
+
+    total = len(texts)
+    if group_keys is None:
+        group_keys = [""] * total
+    # Emoji-only reviews normalize to nothing, so they fall back to their raw text
+    normalized = [normalize_for_dedup(text) or str(text).strip() for text in texts]
+    union_find = _UnionFind(total)
+
+    # Exact duplicates after normalization
+    first_seen = {}
+    distinct_positions = []
+    for position, (text, group) in enumerate(zip(normalized, group_keys)):
+        key = (str(group), text)
+        if key in first_seen:
+            union_find.union(first_seen[key], position)
+        else:
+            first_seen[key] = position
+            distinct_positions.append(position)
+
+    # Near duplicates among the distinct texts
+    candidates = [position for position in distinct_positions if normalized[position]]
+    if candidates:
+        hasher = MinHasher(num_permutations)
+        signatures = hasher.signatures([normalized[position] for position in candidates])
+        candidates = np.asarray(candidates)
+        _, group_ids = np.unique([str(group_keys[position]) for position in candidates], return_inverse=True)
+
+        # Collapse each band of the signature into a single 64-bit bucket key
+        rows_per_band = num_permutations // num_bands
+        band_weights = np.arange(1, rows_per_band + 1, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+        band_keys = (signatures.reshape(len(candidates), num_bands, rows_per_band) * band_weights).sum(axis=2)
+
+        group_salt = group_ids.astype(np.uint64) * np.uint64(0xC2B2AE3D27D4EB4F)
+
+        for band in range(num_bands):
+            # Compare every text with the first text of its (group, band) bucket
+            _, first_index, inverse = np.unique(band_keys[:, band] ^ group_salt,
+                                                return_index=True, return_inverse=True)
+            heads = first_index[inverse.ravel()]
+            pairs = np.nonzero((heads != np.arange(len(candidates))) & (group_ids[heads] == group_ids))[0]
+            if len(pairs) == 0:
+                continue
+            similarity = (signatures[heads[pairs]] == signatures[pairs]).mean(axis=1)
+            for member in pairs[similarity >= threshold]:
+                union_find.union(int(candidates[heads[member]]), int(candidates[member]))
+
+    # Pick the most common exact text in each cluster as its representative
+    roots = [union_find.find(position) for position in range(total)]
+    text_counts = defaultdict(lambda: defaultdict(int))
+    first_position = {}
+    for position, root in enumerate(roots):
+        text_counts[root][normalized[position]] += 1
+        first_position.setdefault((root, normalized[position]), position)
+
+    representative_of_root = {}
+    for root, counts in text_counts.items():
+        best_text = max(counts.items(), key=lambda item: (item[1], -first_position[(root, item[0])]))[0]
+        representative_of_root[root] = first_position[(root, best_text)]
+
+    labels = [representative_of_root[root] for root in roots]
+    representatives = sorted(set(labels))
+
+    result = DedupResult(labels, representatives, normalized)
+    logger.info(f"Collapsed {total} reviews into {result.cluster_count} clusters, saving {result.calls_saved} calls")
+    return result
@@ -1,21 +1,43 @@
 import time
 import random
+import types
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import logging
+from utils.progress import ProgressReporter
+from utils.watermarks import IncrementalScrape
+from utils.review_store import get_review_store, UNKNOWN_COMPANY
+from utils.crawl_state import get_crawl_state_store, COMPLETE, RUNNING, STOPPED
 try:
     from google_play_scraper import Sort, reviews, app
     GOOGLE_PLAY_AVAILABLE = True
 except ImportError:
     GOOGLE_PLAY_AVAILABLE = False
     Sort = None
-import streamlit as st
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("GooglePlayScraper")
 
+# Reviews requested per page of a full-history crawl. google_play_scraper fetches at most 199
+# reviews per HTTP request and sends larger counts as back-to-back requests, so this keeps one
+# request per page, with the politeness delay between pages and the position saved after each
+FULL_HISTORY_PAGE_SIZE = 199
+
+# google_play_scraper also returns an empty continuation token when a request fails, so the
+# last page is requested this many more times before the history is taken as complete
+END_CONFIRMATIONS = 2
+
+# Consecutive failed pages after which a full-history crawl stops, resumable
+MAX_CONSECUTIVE_ERRORS = 5
+
+# Pages between compactions of the partitions a full-history crawl writes
+COMPACT_EVERY_PAGES = 50
+
+# Continuation token attributes saved to resume a crawl
+TOKEN_FIELDS = ('token', 'lang', 'country', 'sort', 'count', 'filter_score_with', 'filter_device_with')
+
 class GooglePlayReviewsScraper:
     def __init__(self, app_id, language="en", country="us", 
                  min_delay=2.0, max_delay=5.0, sort_method=Sort.NEWEST):
@@ -78,31 +100,55 @@ class GooglePlayReviewsScraper:
                 
         return cleaned
     
-    def scrape_reviews(self, max_reviews=100, company_name="", progress_container=None):
+    def _standardize_review(self, review, company_name):
+        """Map a google_play_scraper review to the standardized review columns"""
+        cleaned_review = self._clean_review_data(review)
+        # Create standardized columns as per user requirements
+        return {
+            'Review Id': cleaned_review.get('reviewId', ''),
+            'User name as on Playstore': cleaned_review.get('userName', ''),
+            'Detailed Review': cleaned_review.get('content', ''),
+            'Ratings on Playstore': cleaned_review.get('score', None),
+            'Other User Approval Count': cleaned_review.get('thumbsUpCount', 0),
+            'App playstore version': cleaned_review.get('reviewCreatedVersion', ''),
+            'Review Date time': cleaned_review.get('at', ''),
+            'company_name': company_name,
+            'source': 'Google Play Store',
+            'scraped_at': datetime.now().isoformat(),
+            'Review Title': ''  # Google Play doesn't have review titles
+        }
+    
+    def iter_review_batches(self, max_reviews=100, company_name="", progress_callback=None, should_stop=None,
+                            watermarks=None):
         """
-        Scrape Google Play Store reviews with progress tracking
+        Scrape Google Play Store reviews, yielding each page as soon as it arrives
         
         Args:
             max_reviews (int): Maximum number of reviews to collect
             company_name (str): Company name for identification
-            progress_container: Streamlit container for progress updates
+            progress_callback (callable, optional): Receives progress events, see utils.progress
+            should_stop (callable, optional): Checked before every page, returning True ends the
+                scrape early
+            watermarks (WatermarkStore, optional): Scrape incrementally, yielding only reviews newer
+                than the app's watermark and stopping at the first page that reaches it
             
-        Returns:
-            pd.DataFrame: DataFrame containing all the reviews
+        Yields:
+            list: The standardized review dictionaries of one page, never empty
         """
         logger.info(f"Starting to scrape up to {max_reviews} reviews for {self.app_id}...")
+        progress = ProgressReporter(progress_callback, 'Google Play Store', company_name, max_reviews)
+        # Incremental scrapes rely on the newest-first order
+        incremental = IncrementalScrape(watermarks, 'Google Play Store', self.app_id) if watermarks else None
         
-        self.reviews = []
+        collected = 0
         batches = 0
         batch_size = max(1, round(max_reviews / 2))
+        # A stopped scrape leaves the watermark alone, one that ran out of reviews may move it
+        stopped = False
+        exhausted = False
         
         try:
-            # Update progress
-            if progress_container:
-                with progress_container:
-                    st.info(f"🔍 Starting Google Play Store scraping for {company_name}...")
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
+            progress.start()
             
             # First batch
             first_batch_size = min(random.randint(20, batch_size), max_reviews)
@@ -118,40 +164,27 @@ class GooglePlayReviewsScraper:
             batches += 1
             
             # Clean and add the first batch of reviews
-            cleaned_results = []
-            for review in result:
-                cleaned_review = self._clean_review_data(review)
-                # Create standardized columns as per user requirements
-                standardized_review = {
-                    'Review Id': cleaned_review.get('reviewId', ''),
-                    'User name as on Playstore': cleaned_review.get('userName', ''),
-                    'Detailed Review': cleaned_review.get('content', ''),
-                    'Ratings on Playstore': cleaned_review.get('score', None),
-                    'Other User Approval Count': cleaned_review.get('thumbsUpCount', 0),
-                    'App playstore version': cleaned_review.get('reviewCreatedVersion', ''),
-                    'Review Date time': cleaned_review.get('at', ''),
-                    'company_name': company_name,
-                    'source': 'Google Play Store',
-                    'scraped_at': datetime.now().isoformat(),
-                    'Review Title': ''  # Google Play doesn't have review titles
-                }
-                
-                cleaned_results.append(standardized_review)
+            cleaned_results = [self._standardize_review(review, company_name) for review in result]
             
-            self.reviews.extend(cleaned_results)
-            
-            # Update progress
-            if progress_container:
-                with progress_container:
-                    progress = len(self.reviews) / max_reviews
-                    progress_bar.progress(min(progress, 1.0))
-                    status_text.text(f"📱 Google Play: {len(self.reviews)}/{max_reviews} reviews collected")
+            if incremental:
+                cleaned_results = incremental.filter_new(cleaned_results)
+            collected += len(cleaned_results)
+            progress.update(collected)
+            if cleaned_results:
+                yield cleaned_results
             
             # Continue fetching if we need more reviews and have a continuation token
-            while continuation_token and len(self.reviews) < max_reviews:
+            while continuation_token and collected < max_reviews:
+                if incremental and incremental.reached_watermark:
+                    logger.info("Reached reviews collected by an earlier scrape")
+                    break
                 self._random_delay()
+                if should_stop and should_stop():
+                    logger.info(f"Stopping early with {collected} reviews")
+                    stopped = True
+                    break
                 
-                remaining = max_reviews - len(self.reviews)
+                remaining = max_reviews - collected
                 current_batch_size = min(remaining, random.randint(batch_size-10, batch_size+10))
                 
                 try:
@@ -161,74 +194,181 @@ class GooglePlayReviewsScraper:
                         count=current_batch_size
                     )
                     batches += 1
-                    
-                    if not batch:
-                        logger.info("No more reviews available")
-                        break
-                    
-                    # Clean and add the batch to our collection
-                    cleaned_batch = []
-                    for review in batch:
-                        cleaned_review = self._clean_review_data(review)
-                        # Create standardized columns as per user requirements
-                        standardized_review = {
-                            'Review Id': cleaned_review.get('reviewId', ''),
-                            'User name as on Playstore': cleaned_review.get('userName', ''),
-                            'Detailed Review': cleaned_review.get('content', ''),
-                            'Ratings on Playstore': cleaned_review.get('score', None),
-                            'Other User Approval Count': cleaned_review.get('thumbsUpCount', 0),
-                            'App playstore version': cleaned_review.get('reviewCreatedVersion', ''),
-                            'Review Date time': cleaned_review.get('at', ''),
-                            'company_name': company_name,
-                            'source': 'Google Play Store',
-                            'scraped_at': datetime.now().isoformat(),
-                            'Review Title': ''  # Google Play doesn't have review titles
-                        }
-                        
-                        cleaned_batch.append(standardized_review)
-                    
-                    self.reviews.extend(cleaned_batch)
-                    
-                    # Update progress
-                    if progress_container:
-                        with progress_container:
-                            progress = len(self.reviews) / max_reviews
-                            progress_bar.progress(min(progress, 1.0))
-                            status_text.text(f"📱 Google Play: {len(self.reviews)}/{max_reviews} reviews collected")
-                    
                 except Exception as e:
                     logger.error(f"Error fetching batch {batches}: {e}")
+                    progress.warning(f"Error fetching batch {batches}: {e}", collected)
                     error_delay = random.uniform(5, 10)
                     time.sleep(error_delay)
+                    continue
                 
-            # Final progress update
-            if progress_container:
-                with progress_container:
-                    progress_bar.progress(1.0)
-                    st.success(f"✅ Google Play Store scraping completed! Collected {len(self.reviews)} reviews")
-            
-            logger.info(f"Finished scraping {len(self.reviews)} reviews in {batches} batches")
-            
-            # Convert to DataFrame
-            if not self.reviews:
-                logger.warning("No reviews collected")
-                return pd.DataFrame()
+                if not batch:
+                    logger.info("No more reviews available")
+                    exhausted = True
+                    break
+                
+                # Clean and add the batch to our collection
+                cleaned_batch = [self._standardize_review(review, company_name) for review in batch]
                 
-            df = pd.DataFrame(self.reviews)
-            return df
+                if incremental:
+                    cleaned_batch = incremental.filter_new(cleaned_batch)
+                collected += len(cleaned_batch)
+                progress.update(collected)
+                if cleaned_batch:
+                    yield cleaned_batch
+                
+            progress.done(collected)
+            if incremental and not stopped:
+                incremental.commit(exhausted=exhausted or not continuation_token)
+            
+            logger.info(f"Finished scraping {collected} reviews in {batches} batches")
             
         except Exception as e:
             logger.error(f"Error during review scraping: {e}")
-            if progress_container:
-                with progress_container:
-                    st.error(f"❌ Error scraping Google Play Store: {str(e)}")
+            progress.error(f"Error scraping Google Play Store: {str(e)}", collected)
+    
+    def scrape_reviews(self, max_reviews=100, company_name="", progress_callback=None, should_stop=None,
+                       watermarks=None, batch_callback=None):
+        """
+        Scrape Google Play Store reviews with progress tracking
+        
+        Args:
+            max_reviews (int): Maximum number of reviews to collect
+            company_name (str): Company name for identification
+            progress_callback (callable, optional): Receives progress events, see utils.progress
+            should_stop (callable, optional): Checked before every page, returning True ends the
+                scrape early with the reviews collected so far
+            watermarks (WatermarkStore, optional): Scrape incrementally, returning only reviews newer
+                than the app's watermark and stopping at the first page that reaches it
+            batch_callback (callable, optional): Called with the review dictionaries of every page
+                as soon as it arrives
             
-            # Return whatever we've collected so far
-            if self.reviews:
-                return pd.DataFrame(self.reviews)
+        Returns:
+            pd.DataFrame: DataFrame containing all the reviews, including those collected
+                before an error
+        """
+        self.reviews = []
+        for batch in self.iter_review_batches(max_reviews, company_name, progress_callback, should_stop, watermarks):
+            self.reviews.extend(batch)
+            if batch_callback:
+                batch_callback(batch)
+        
+        # Convert to DataFrame
+        if not self.reviews:
+            logger.warning("No reviews collected")
             return pd.DataFrame()
+        return pd.DataFrame(self.reviews)
+    
+    def _fetch_page(self, token, page_size):
+        """Fetch one page of the newest-first review history, starting over when token is None"""
+        if token is None:
+            return reviews(self.app_id, lang=self.language, country=self.country,
+                           sort=self.sort_method, count=page_size)
+        return reviews(self.app_id, continuation_token=token)
+    
+    def crawl_full_history(self, company_name="", page_size=FULL_HISTORY_PAGE_SIZE, progress_callback=None,
+                           should_stop=None, restart=False, store=None, state_store=None):
+        """
+        Crawl every review of the app into the review store, resuming a crawl that stopped
+        
+        Each page is written to the store as soon as it arrives and the continuation token is
+        saved after it, so memory stays bounded by one page and a crashed or stopped crawl
+        continues with the page after the last stored one. A page fetched twice is deduplicated
+        by the store.
+        
+        Args:
+            company_name (str): Company name for identification
+            page_size (int): Reviews per page, only used when a crawl starts from the first page
+            progress_callback (callable, optional): Receives progress events, see utils.progress
+            should_stop (callable, optional): Checked before every page, returning True stops the
+                crawl, which resumes from there on the next call
+            restart (bool): Start from the newest review even if an earlier crawl did not finish
+            store (ReviewStore, optional): Where the reviews go
+            state_store (CrawlStateStore, optional): Where the crawl position is saved
+            
+        Returns:
+            dict: app_id, pages, reviews (stored over all runs of this crawl) and complete
+        """
+        store = store or get_review_store()
+        state_store = state_store or get_crawl_state_store()
+        state = state_store.get('Google Play Store', self.app_id)
+        partitions = {'companies': [company_name or UNKNOWN_COMPANY], 'sources': ['Google Play Store']}
+        
+        if state and state['status'] != COMPLETE and state['token'] and not restart:
+            token = types.SimpleNamespace(**state['token'])
+            pages, collected = state['pages'], state['reviews']
+            logger.info(f"Resuming the crawl of {self.app_id} after {pages} pages and {collected} reviews")
+        else:
+            token = None
+            pages, collected = 0, 0
+            state_store.start('Google Play Store', self.app_id)
+            logger.info(f"Starting a full-history crawl of {self.app_id}")
+        
+        total = (self.get_app_info() or {}).get('reviews') or 0
+        progress = ProgressReporter(progress_callback, 'Google Play Store', company_name, total)
+        progress.start(f"Resuming after {collected} reviews" if pages else "")
+        status = RUNNING
+        errors = 0
+        
+        while status == RUNNING:
+            if should_stop and should_stop():
+                logger.info(f"Stopping the crawl of {self.app_id} after {pages} pages, it resumes from here")
+                status = STOPPED
+                break
+            if pages or errors:
+                self._random_delay()
+            
+            try:
+                batch, next_token = self._fetch_page(token, page_size)
+                confirmations = 0
+                # An empty token is either the end of the history or a failed request
+                while next_token.token is None and confirmations < END_CONFIRMATIONS:
+                    confirmations += 1
+                    self._random_delay()
+                    retry_batch, retry_token = self._fetch_page(token, page_size)
+                    if retry_token.token is not None or len(retry_batch) > len(batch):
+                        batch, next_token = retry_batch, retry_token
+            except Exception as e:
+                errors += 1
+                logger.error(f"Error fetching page {pages + 1} of {self.app_id}: {e}")
+                progress.warning(f"Error fetching page {pages + 1}: {e}", collected)
+                if errors >= MAX_CONSECUTIVE_ERRORS:
+                    progress.error(f"Stopped after {errors} failed pages, the crawl resumes from page {pages + 1}",
+                                   collected)
+                    status = STOPPED
+                    break
+                time.sleep(random.uniform(5, 10))
+                continue
+            errors = 0
+            
+            # Store the page before moving the saved position past it
+            if batch:
+                page = pd.DataFrame([self._standardize_review(review, company_name) for review in batch])
+                store.upsert(page, count_existing=False)
+            pages += 1
+            collected += len(batch)
+            token = next_token
+            if token.token is None:
+                status = COMPLETE
+            state_store.save('Google Play Store', self.app_id,
+                             {field: getattr(token, field) for field in TOKEN_FIELDS} if status != COMPLETE else None,
+                             pages, collected, status)
+            progress.update(collected)
+            
+            if pages % COMPACT_EVERY_PAGES == 0:
+                store.compact(**partitions)
+        
+        if status == STOPPED:
+            state_store.save('Google Play Store', self.app_id,
+                             {field: getattr(token, field) for field in TOKEN_FIELDS} if token else None,
+                             pages, collected, STOPPED)
+        store.compact(**partitions)
+        progress.done(collected, f"Crawled {collected} reviews in {pages} pages" +
+                      ("" if status == COMPLETE else ", resumable"))
+        logger.info(f"Full-history crawl of {self.app_id} {status} after {pages} pages and {collected} reviews")
+        return {'app_id': self.app_id, 'pages': pages, 'reviews': collected, 'complete': status == COMPLETE}
 
-def scrape_google_play_reviews(app_id, max_reviews=100, company_name="", progress_container=None):
+def scrape_google_play_reviews(app_id, max_reviews=100, company_name="", progress_callback=None, should_stop=None,
+                               watermarks=None, batch_callback=None):
     """
     Main function to scrape Google Play Store reviews
     
@@ -236,10 +376,46 @@ def scrape_google_play_reviews(app_id, max_reviews=100, company_name="", progres
         app_id (str): Google Play Store app ID
         max_reviews (int): Maximum number of reviews to scrape
         company_name (str): Company name for identification
-        progress_container: Streamlit container for progress updates
+        progress_callback (callable, optional): Receives progress events, see utils.progress
+        should_stop (callable, optional): Returning True ends the scrape early
+        watermarks (WatermarkStore, optional): Only return reviews newer than the app's watermark
+        batch_callback (callable, optional): Called with the reviews of every page as it arrives
         
     Returns:
         pd.DataFrame: DataFrame containing scraped reviews
     """
     scraper = GooglePlayReviewsScraper(app_id)
-    return scraper.scrape_reviews(max_reviews, company_name, progress_container)
\ No newline at end of file
+    return scraper.scrape_reviews(max_reviews, company_name, progress_callback, should_stop, watermarks,
+                                  batch_callback)
+
+def iter_google_play_reviews(app_id, max_reviews=100, company_name="", progress_callback=None, should_stop=None,
+                             watermarks=None):
+    """
+    Scrape Google Play Store reviews page by page
+    
+    Takes the same arguments as scrape_google_play_reviews.
+    
+    Yields:
+        list: The standardized review dictionaries of one page
+    """
+    scraper = GooglePlayReviewsScraper(app_id)
+    return scraper.iter_review_batches(max_reviews, company_name, progress_callback, should_stop, watermarks)
+
+
+def crawl_google_play_history(app_id, company_name="", progress_callback=None, should_stop=None, restart=False):
+    """
+    Crawl every review of a Google Play app into the review store, resumably
+    
+    Args:
+        app_id (str): Google Play Store app ID
+        company_name (str): Company name for identification
+        progress_callback (callable, optional): Receives progress events, see utils.progress
+        should_stop (callable, optional): Returning True stops the crawl until the next call
+        restart (bool): Start over instead of resuming an unfinished crawl
+        
+    Returns:
+        dict: app_id, pages, reviews and complete
+    """
+    scraper = GooglePlayReviewsScraper(app_id)
+    return scraper.crawl_full_history(company_name, progress_callback=progress_callback,
+                                      should_stop=should_stop, restart=restart)
@@ -0,0 +1,636 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import pickle
+import sqlite3
+import logging
+import argparse
+import threading
+import traceback
+import subprocess
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("JobQueue")
+
+# Location of the job database and job files, override with REVIEW_JOBS_DIR
+JOBS_DIR = os.environ.get("REVIEW_JOBS_DIR", ".jobs")
+DEFAULT_QUEUE_PATH = os.path.join(JOBS_DIR, "jobs.sqlite")
+
+# Number of worker processes started by ensure_workers
+DEFAULT_WORKER_COUNT = int(os.environ.get("REVIEW_JOB_WORKERS", 2))
+
+# Seconds between queue polls of an idle worker
+POLL_INTERVAL = 1.0
+
+# Running jobs and workers refresh their heartbeat this often, and are considered
+# dead once it is older than STALE_AFTER
+HEARTBEAT_INTERVAL = 10.0
+STALE_AFTER = 60.0
+
+# A job interrupted by a dead worker is re-queued at most this many times
+MAX_ATTEMPTS = 3
+
+# Minimum seconds between progress writes of a running job
+PROGRESS_INTERVAL = 0.5
+
+# Environment variable through which ensure_workers hands job secrets such as the API key
+# to the worker processes it starts. Secrets never reach the queue database.
+SECRETS_ENV_VAR = "REVIEW_JOB_SECRETS"
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job handler once cancellation of its job was requested"""
+
+
+def secrets_fingerprint(secrets):
+    """Identify a set of secrets without revealing them, None when there are none"""
+    if not secrets:
+        return None
+    return hashlib.sha256(json.dumps(secrets, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+class JobQueue:
+    def __init__(self, path=DEFAULT_QUEUE_PATH):
+        """
+        Persistent SQLite job queue shared by the UI and the worker processes
+
+        Jobs only record a fingerprint of their secrets. The secrets themselves live in the
+        environment of the workers started for them, see ensure_workers.
+
+        Args:
+            path (str): Database file path, job files are kept next to it
+        """
+        self.path = path
+        self.jobs_dir = os.path.dirname(os.path.abspath(path))
+        self._lock = threading.Lock()
+
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                params TEXT NOT NULL,
+                secrets TEXT,
+                owner TEXT,
+                status TEXT NOT NULL,
+                progress_completed INTEGER NOT NULL DEFAULT 0,
+                progress_total INTEGER NOT NULL DEFAULT 0,
+                message TEXT,
+                result TEXT,
+                error TEXT,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker_pid INTEGER,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                heartbeat_at REAL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                level TEXT NOT NULL,
+                message TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_job_logs_job ON job_logs (job_id, id)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS workers (
+                pid INTEGER PRIMARY KEY,
+                started_at REAL NOT NULL,
+                heartbeat_at REAL NOT NULL
+            )
+        """)
+        self._add_column("jobs", "secrets_key", "TEXT")
+        self._add_column("workers", "secrets_key", "TEXT")
+        self._add_column("workers", "retired", "INTEGER NOT NULL DEFAULT 0")
+        # Queues written by earlier versions kept secrets in plain text, overwrite them on disk
+        self._conn.execute("PRAGMA secure_delete = ON")
+        self._conn.execute("UPDATE jobs SET secrets = NULL WHERE secrets IS NOT NULL")
+
+    def _add_column(self, table, column, definition):
+        columns = [row[1] for row in self._conn.execute(f"PRAGMA table_info({table})").fetchall()]
+        if column not in columns:
+            self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def _execute(self, query, params=()):
+        with self._lock:
+            self._conn.execute(query, params)
+
+    def _query(self, query, params=()):
+        with self._lock:
+            return self._conn.execute(query, params).fetchall()
+
+    def job_dir(self, job_id):
+        """Directory holding a job's input and output files"""
+        path = os.path.join(self.jobs_dir, str(job_id))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def save_file(self, job_id, name, value):
+        """Pickle a value, e.g. an input or output DataFrame, into the job's directory"""
+        path = os.path.join(self.job_dir(job_id), f"{name}.pkl")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f)
+        os.replace(tmp_path, path)
+        return path
+
+    def load_file(self, job_id, name):
+        """Load a value saved with save_file, or None when it does not exist"""
+        path = os.path.join(self.jobs_dir, str(job_id), f"{name}.pkl")
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def submit(self, kind, params=None, owner=None, files=None, secrets=None):
+        """
+        Add a job to the queue
+
+        Args:
+            kind (str): Handler name, see utils.pipeline.JOB_HANDLERS
+            params (dict, optional): JSON-serializable job parameters
+            owner (str, optional): Who submitted the job, used to filter job lists
+            files (dict, optional): Name to value of inputs too large for params, e.g. DataFrames
+            secrets (dict, optional): Values such as API keys the job needs. Only their fingerprint
+                is stored, and only workers started with the same secrets by ensure_workers run the job
+
+        Returns:
+            int: The job ID
+        """
+        now = time.time()
+        with self._lock:
+            # Files are written before the job becomes visible to workers
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (kind, params, secrets_key, owner, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, json.dumps(params or {}), secrets_fingerprint(secrets), owner, "submitting", now)
+            )
+            job_id = cursor.lastrowid
+        for name, value in (files or {}).items():
+            self.save_file(job_id, name, value)
+        self._execute("UPDATE jobs SET status = ? WHERE id = ?", (QUEUED, job_id))
+        logger.info(f"Queued {kind} job {job_id}")
+        return job_id
+
+    def claim(self, worker_pid, secrets_key=None):
+        """
+        Atomically take the oldest queued job the worker has the secrets for
+
+        Args:
+            worker_pid (int): The claiming worker
+            secrets_key (str, optional): Fingerprint of the worker's secrets
+
+        Returns:
+            dict or None: The claimed job, or None when the queue is empty
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = ? AND cancel_requested = 0 "
+                    "AND (secrets_key IS NULL OR secrets_key = ?) ORDER BY id LIMIT 1", (QUEUED, secrets_key)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, worker_pid = ?, started_at = ?, heartbeat_at = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (RUNNING, worker_pid, now, now, row[0])
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row[0])
+
+    def get(self, job_id):
+        """
+        Return a job as a dictionary, or None when it does not exist
+
+        The 'params' and 'result' fields are decoded from JSON.
+        """
+        with self._lock:
+            self._conn.row_factory = sqlite3.Row
+            try:
+                row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            finally:
+                self._conn.row_factory = None
+        return self._decode(row)
+
+    @staticmethod
+    def _decode(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job.pop('secrets', None)
+        job['params'] = json.loads(job['params']) if job['params'] else {}
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def list_jobs(self, owner=None, limit=20):
+        """Return the most recent jobs, newest first, optionally only those of one owner"""
+        query = "SELECT * FROM jobs WHERE status != 'submitting'"
+        params = []
+        if owner is not None:
+            query += " AND owner = ?"
+            params.append(owner)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            self._conn.row_factory = sqlite3.Row
+            try:
+                rows = self._conn.execute(query, params).fetchall()
+            finally:
+                self._conn.row_factory = None
+        return [self._decode(row) for row in rows]
+
+    def update_progress(self, job_id, completed=None, total=None, message=None):
+        """Record a running job's progress and refresh its heartbeat"""
+        assignments = ["heartbeat_at = ?"]
+        params = [time.time()]
+        if completed is not None:
+            assignments.append("progress_completed = ?")
+            params.append(int(completed))
+        if total is not None:
+            assignments.append("progress_total = ?")
+            params.append(int(total))
+        if message is not None:
+            assignments.append("message = ?")
+            params.append(message)
+        params.append(job_id)
+        self._execute(f"UPDATE jobs SET {', '.join(assignments)} WHERE id = ?", params)
+
+    def heartbeat(self, job_id):
+        self._execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def finish(self, job_id, status, result=None, error=None):
+        """Move a job into one of the finished states"""
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, json.dumps(result, default=str) if result is not None else None, error, time.time(), job_id)
+        )
+
+    def request_cancel(self, job_id):
+        """
+        Ask for a job to be cancelled
+
+        Queued jobs are cancelled immediately, running jobs stop at their next cancellation check.
+        """
+        self._execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+        self._execute(
+            "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+            (CANCELLED, time.time(), job_id, QUEUED)
+        )
+
+    def is_cancel_requested(self, job_id):
+        rows = self._query("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,))
+        return bool(rows and rows[0][0])
+
+    def append_log(self, job_id, level, message):
+        self._execute(
+            "INSERT INTO job_logs (job_id, created_at, level, message) VALUES (?, ?, ?, ?)",
+            (job_id, time.time(), level, message)
+        )
+
+    def logs(self, job_id, after_id=0, limit=500):
+        """
+        Return a job's captured log lines
+
+        Returns:
+            list: (log_id, created_at, level, message) tuples in order
+        """
+        return self._query(
+            "SELECT id, created_at, level, message FROM job_logs WHERE job_id = ? AND id > ? ORDER BY id LIMIT ?",
+            (job_id, after_id, limit)
+        )
+
+    def register_worker(self, pid, secrets_key=None):
+        now = time.time()
+        self._execute("INSERT OR REPLACE INTO workers (pid, started_at, heartbeat_at, secrets_key, retired) "
+                      "VALUES (?, ?, ?, ?, 0)", (pid, now, now, secrets_key))
+
+    def worker_heartbeat(self, pid):
+        self._execute("UPDATE workers SET heartbeat_at = ? WHERE pid = ?", (time.time(), pid))
+
+    def unregister_worker(self, pid):
+        self._execute("DELETE FROM workers WHERE pid = ?", (pid,))
+
+    def live_workers(self, secrets_key=None, any_secrets=True):
+        """
+        Return the PIDs of workers whose heartbeat is recent and that were not retired
+
+        Args:
+            secrets_key (str, optional): Only workers holding the secrets with this fingerprint
+            any_secrets (bool): Ignore secrets_key and return every live worker
+        """
+        cutoff = time.time() - STALE_AFTER
+        self._execute("DELETE FROM workers WHERE heartbeat_at < ?", (cutoff,))
+        if any_secrets:
+            return [row[0] for row in self._query("SELECT pid FROM workers WHERE retired = 0")]
+        return [row[0] for row in self._query("SELECT pid FROM workers WHERE retired = 0 AND secrets_key IS ?",
+                                              (secrets_key,))]
+
+    def retire_workers(self, secrets_key):
+        """
+        Retire the workers holding other secrets than these
+
+        A retired worker finishes the queued jobs it has the secrets for and then exits, so
+        replaced secrets do not stay in a running process.
+        """
+        self._execute("UPDATE workers SET retired = 1 WHERE secrets_key IS NOT ?", (secrets_key,))
+        # Queued jobs whose secrets no live worker holds any more can never run
+        orphaned = self._query(
+            "SELECT id FROM jobs WHERE status = ? AND secrets_key IS NOT NULL AND secrets_key IS NOT ? "
+            "AND secrets_key NOT IN (SELECT secrets_key FROM workers WHERE secrets_key IS NOT NULL)",
+            (QUEUED, secrets_key)
+        )
+        for (job_id,) in orphaned:
+            self.finish(job_id, FAILED, error="The API key this job was submitted with is no longer available, "
+                                              "submit it again")
+
+    def is_retired(self, pid):
+        rows = self._query("SELECT retired FROM workers WHERE pid = ?", (pid,))
+        return bool(rows and rows[0][0])
+
+    def recover_stale_jobs(self):
+        """
+        Re-queue running jobs whose worker stopped sending heartbeats
+
+        Jobs that already used MAX_ATTEMPTS attempts are failed instead.
+
+        Returns:
+            int: Number of recovered jobs
+        """
+        cutoff = time.time() - STALE_AFTER
+        stale = self._query(
+            "SELECT id, attempts, cancel_requested FROM jobs WHERE status = ? AND heartbeat_at < ?", (RUNNING, cutoff)
+        )
+        for job_id, attempts, cancel_requested in stale:
+            if cancel_requested:
+                self.finish(job_id, CANCELLED)
+            elif attempts >= MAX_ATTEMPTS:
+                self.finish(job_id, FAILED, error="Worker stopped responding")
+            else:
+                logger.warning(f"Re-queuing job {job_id} after its worker stopped responding")
+                self._execute("UPDATE jobs SET status = ?, worker_pid = NULL WHERE id = ?", (QUEUED, job_id))
+        return len(stale)
+
+
+class JobContext:
+    def __init__(self, queue, job, secrets=None):
+        """
+        Handle given to a job handler for reporting progress and checking cancellation
+
+        Args:
+            queue (JobQueue): The job queue
+            job (dict): The running job
+            secrets (dict, optional): The running worker's secrets, which match the job's
+        """
+        self.queue = queue
+        self.job = job
+        self.job_id = job['id']
+        self.params = job['params']
+        self.secrets = dict(secrets or {}) if job.get('secrets_key') else {}
+        self.logger = logging.getLogger(f"Job.{job['kind']}")
+        self._last_progress = 0.0
+
+    def progress(self, completed=None, total=None, message=None):
+        """
+        Report progress, raising JobCancelled if the job should stop
+
+        Frequent calls are written at most every PROGRESS_INTERVAL seconds, except
+        for message changes and the final update.
+        """
+        now = time.time()
+        final = completed is not None and total is not None and completed >= total
+        if message is None and not final and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        self.queue.update_progress(self.job_id, completed, total, message)
+        self.check_cancelled()
+
+    def submit(self, kind, params=None, files=None):
+        """Queue a follow-up job for the same owner with the same secrets"""
+        return self.queue.submit(kind, params, owner=self.job['owner'], files=files, secrets=self.secrets)
+
+    def check_cancelled(self):
+        if self.queue.is_cancel_requested(self.job_id):
+            raise JobCancelled(f"Job {self.job_id} was cancelled")
+
+    def cancel_requested(self):
+        return self.queue.is_cancel_requested(self.job_id)
+
+    def load_file(self, name):
+        return self.queue.load_file(self.job_id, name)
+
+    def save_file(self, name, value):
+        return self.queue.save_file(self.job_id, name, value)
+
+
+class _JobLogHandler(logging.Handler):
+    def __init__(self, queue):
+        """Copies log records emitted while a job runs into that job's log"""
+        super().__init__(level=logging.INFO)
+        self.queue = queue
+        self.job_id = None
+
+    def emit(self, record):
+        job_id = self.job_id
+        if job_id is None or record.name == logger.name:
+            return
+        try:
+            self.queue.append_log(job_id, record.levelname, self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+def run_worker(queue_path=DEFAULT_QUEUE_PATH, poll_interval=POLL_INTERVAL, once=False, secrets=None):
+    """
+    Process jobs from the queue until stopped
+
+    Args:
+        queue_path (str): Database file path
+        poll_interval (float): Seconds between polls of an empty queue
+        once (bool): Exit as soon as the queue is empty
+        secrets (dict, optional): Secrets such as the API key, by default read from SECRETS_ENV_VAR.
+            The worker only runs jobs submitted with the same secrets, or with none
+    """
+    # Imported here so the queue itself has no dependency on the handlers
+    from utils.pipeline import JOB_HANDLERS
+
+    if secrets is None:
+        secrets = json.loads(os.environ.get(SECRETS_ENV_VAR) or "{}")
+    secrets_key = secrets_fingerprint(secrets)
+    queue = JobQueue(queue_path)
+    pid = os.getpid()
+    queue.register_worker(pid, secrets_key)
+    log_handler = _JobLogHandler(queue)
+    log_handler.setFormatter(logging.Formatter("%(name)s: %(message)s"))
+    logging.getLogger().addHandler(log_handler)
+
+    current = {'job_id': None}
+    stop = threading.Event()
+
+    def send_heartbeats():
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            queue.worker_heartbeat(pid)
+            if current['job_id'] is not None:
+                queue.heartbeat(current['job_id'])
+
+    threading.Thread(target=send_heartbeats, daemon=True).start()
+    logger.info(f"Worker {pid} started")
+
+    try:
+        while True:
+            queue.recover_stale_jobs()
+            job = queue.claim(pid, secrets_key)
+            if job is None:
+                if once or queue.is_retired(pid):
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            current['job_id'] = log_handler.job_id = job['id']
+            context = JobContext(queue, job, secrets)
+            handler = JOB_HANDLERS.get(job['kind'])
+            try:
+                if handler is None:
+                    raise ValueError(f"Unknown job kind: {job['kind']}")
+                result = handler(context)
+                queue.finish(job['id'], SUCCEEDED, result=result)
+                logger.info(f"Job {job['id']} succeeded")
+            except JobCancelled:
+                queue.finish(job['id'], CANCELLED)
+                logger.info(f"Job {job['id']} cancelled")
+            except Exception as e:
+                queue.append_log(job['id'], "ERROR", traceback.format_exc())
+                queue.finish(job['id'], FAILED, error=str(e))
+                logger.error(f"Job {job['id']} failed: {e}")
+            finally:
+                current['job_id'] = log_handler.job_id = None
+    finally:
+        stop.set()
+        logging.getLogger().removeHandler(log_handler)
+        queue.unregister_worker(pid)
+
+
+def start_worker_process(queue_path=DEFAULT_QUEUE_PATH, secrets=None):
+    """
+    Launch a detached worker process
+
+    The worker runs in its own session, so it keeps going when the process that
+    started it (e.g. the Streamlit server) exits. Its secrets are passed through its
+    environment, which only processes of the same user can read.
+
+    Returns:
+        subprocess.Popen: The worker process
+    """
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    log_path = os.path.join(os.path.dirname(os.path.abspath(queue_path)), "worker.log")
+    env = dict(os.environ)
+    env.pop(SECRETS_ENV_VAR, None)
+    if secrets:
+        env[SECRETS_ENV_VAR] = json.dumps(secrets)
+    with open(log_path, 'a') as log_file:
+        return subprocess.Popen(
+            [sys.executable, "-m", "utils.jobs", "worker", "--queue", os.path.abspath(queue_path)],
+            cwd=project_root,
+            env=env,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            start_new_session=True
+        )
+
+
+_workers_lock = threading.Lock()
+
+
+def ensure_workers(count=DEFAULT_WORKER_COUNT, queue=None, secrets=None):
+    """
+    Start worker processes until `count` live workers are registered
+
+    Safe to call on every Streamlit rerun. Without secrets any live worker counts. With
+    secrets, workers holding them are started as needed and workers holding other
+    secrets are retired, so call it with the secrets of every job before submitting it.
+
+    Returns:
+        int: Number of workers started by this call
+    """
+    queue = queue or get_job_queue()
+    secrets_key = secrets_fingerprint(secrets)
+    with _workers_lock:
+        if secrets:
+            queue.retire_workers(secrets_key)
+        missing = count - len(queue.live_workers(secrets_key, any_secrets=not secrets))
+        for _ in range(max(0, missing)):
+            process = start_worker_process(queue.path, secrets)
+            # Register right away so concurrent callers do not start extra workers
+            queue.register_worker(process.pid, secrets_key)
+        return max(0, missing)
+
+
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Return the process-wide job queue"""
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue()
+        return _default_queue
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run or inspect the background job queue")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    worker_parser = subparsers.add_parser("worker", help="Process queued jobs")
+    worker_parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH)
+    worker_parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+
+    list_parser = subparsers.add_parser("list", help="Show recent jobs")
+    list_parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH)
+    list_parser.add_argument("--limit", type=int, default=20)
+
+    cancel_parser = subparsers.add_parser("cancel", help="Cancel a job")
+    cancel_parser.add_argument("job_id", type=int)
+    cancel_parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH)
+
+    logs_parser = subparsers.add_parser("logs", help="Print a job's log")
+    logs_parser.add_argument("job_id", type=int)
+    logs_parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH)
+
+    args = parser.parse_args()
+    if args.command == "worker":
+        run_worker(args.queue, once=args.once)
+    elif args.command == "list":
+        for listed in JobQueue(args.queue).list_jobs(limit=args.limit):
+            print(f"{listed['id']:>5}  {listed['kind']:<15} {listed['status']:<10} "
+                  f"{listed['progress_completed']}/{listed['progress_total']}  {listed['message'] or ''}")
+    elif args.command == "cancel":
+        JobQueue(args.queue).request_cancel(args.job_id)
+    else:
+        for _, _, level, message in JobQueue(args.queue).logs(args.job_id, limit=100000):
+            print(f"{level}: {message}")
@@ -0,0 +1,180 @@
+import os
+import time
+import hashlib
+import sqlite3
+import logging
+import argparse
+import threading
+
+import numpy as np
+
+from utils.llm_cache import normalize_review_text
+
+logger = logging.getLogger("KnowledgeBaseStore")
+
+# Location of the knowledge base database, override with REVIEW_KNOWLEDGE_BASE_PATH
+DEFAULT_KNOWLEDGE_BASE_PATH = os.environ.get(
+    "REVIEW_KNOWLEDGE_BASE_PATH", os.path.join(".cache", "knowledge_base.sqlite")
+)
+
+# Share of an issue type's reviews that must have changed before its summary is regenerated
+DEFAULT_REGENERATE_THRESHOLD = 0.1
+
+
+def review_fingerprints(reviews):
+    """
+    Fingerprint the set of reviews behind a summary
+
+    Returns:
+        np.ndarray: Sorted, distinct 64-bit hashes of the normalized review texts
+    """
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.sha1(normalize_review_text(review).encode("utf-8")).digest()[:8], "little")
+         for review in reviews),
+        dtype=np.uint64, count=len(reviews)
+    )
+    return np.unique(hashes)
+
+
+def membership_change(previous, current):
+    """
+    Share of the reviews that were added or removed between two fingerprint sets
+
+    Returns:
+        float: Size of the symmetric difference over the size of the union, 0 for identical sets
+    """
+    union = len(np.union1d(previous, current))
+    if not union:
+        return 0.0
+    return 1.0 - len(np.intersect1d(previous, current, assume_unique=True)) / union
+
+
+class KnowledgeBaseStore:
+    def __init__(self, path=DEFAULT_KNOWLEDGE_BASE_PATH):
+        """
+        The latest summary of every issue type with the fingerprints of the reviews it was made from
+
+        Args:
+            path (str): Database file path
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS summaries (
+                issue_type TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                fingerprints BLOB NOT NULL,
+                reviews INTEGER NOT NULL,
+                prompt_version TEXT NOT NULL,
+                edited INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, issue_type):
+        """
+        Return the stored summary of an issue type
+
+        Returns:
+            dict or None: summary, fingerprints, reviews, prompt_version, edited and updated_at
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, fingerprints, reviews, prompt_version, edited, updated_at FROM summaries "
+                "WHERE issue_type = ?", (issue_type,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'issue_type': issue_type, 'summary': row[0], 'fingerprints': np.frombuffer(row[1], dtype=np.uint64),
+                'reviews': row[2], 'prompt_version': row[3], 'edited': bool(row[4]), 'updated_at': row[5]}
+
+    def reusable(self, issue_type, fingerprints, prompt_version, threshold=DEFAULT_REGENERATE_THRESHOLD):
+        """
+        Return the stored summary if it was made from nearly the same reviews, otherwise None
+
+        Args:
+            issue_type (str): The issue type
+            fingerprints (np.ndarray): review_fingerprints of the issue type's current reviews
+            prompt_version (str): Version of the summary prompt in use
+            threshold (float): Largest membership_change that keeps the stored summary
+        """
+        stored = self.get(issue_type)
+        if stored is None or stored['prompt_version'] != prompt_version:
+            return None
+        if membership_change(stored['fingerprints'], fingerprints) > threshold:
+            return None
+        return stored['summary']
+
+    def save(self, issue_type, summary, fingerprints, prompt_version):
+        """Store a generated summary together with the fingerprints of its reviews"""
+        fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (issue_type, summary, fingerprints, reviews, prompt_version, "
+                "edited, updated_at) VALUES (?, ?, ?, ?, ?, 0, ?)",
+                (issue_type, summary, fingerprints.tobytes(), len(fingerprints), prompt_version, time.time())
+            )
+            self._conn.commit()
+
+    def update_summary(self, issue_type, summary):
+        """Replace the text of a stored summary, e.g. after editing it, keeping its fingerprints"""
+        with self._lock:
+            self._conn.execute("UPDATE summaries SET summary = ?, edited = 1, updated_at = ? WHERE issue_type = ?",
+                               (summary, time.time(), issue_type))
+            self._conn.commit()
+
+    def reset(self, issue_type=None):
+        """Forget one summary or all of them, so they are regenerated next time"""
+        with self._lock:
+            if issue_type is None:
+                self._conn.execute("DELETE FROM summaries")
+            else:
+                self._conn.execute("DELETE FROM summaries WHERE issue_type = ?", (issue_type,))
+            self._conn.commit()
+
+    def list(self):
+        """Return issue_type, reviews, prompt_version, edited and updated_at of every stored summary"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT issue_type, reviews, prompt_version, edited, updated_at FROM summaries ORDER BY issue_type"
+            ).fetchall()
+        return [{'issue_type': issue_type, 'reviews': reviews, 'prompt_version': prompt_version,
+                 'edited': bool(edited), 'updated_at': updated_at}
+                for issue_type, reviews, prompt_version, edited, updated_at in rows]
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_knowledge_base_store():
+    """Return the process-wide knowledge base store"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = KnowledgeBaseStore()
+        return _default_store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or reset the stored knowledge base summaries")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="Show every stored summary")
+    reset_parser = subparsers.add_parser("reset", help="Forget summaries so the next run regenerates them")
+    reset_parser.add_argument("--issue-type", help="Only this issue type")
+
+    args = parser.parse_args()
+    store = KnowledgeBaseStore()
+    if args.command == "list":
+        for entry in store.list():
+            edited = "edited" if entry['edited'] else ""
+            print(f"{entry['issue_type']:<40} {entry['reviews']:>7} reviews  "
+                  f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['updated_at']))}  {edited}")
+    else:
+        store.reset(args.issue_type)
@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+
+logger = logging.getLogger("LLMCache")
+
+# Location of the on-disk cache, override with REVIEW_CACHE_PATH or disable with REVIEW_CACHE_DISABLED=1
+DEFAULT_CACHE_PATH = os.environ.get("REVIEW_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite"))
+
+# Eviction limits
+DEFAULT_MAX_ENTRIES = 500000
+DEFAULT_MAX_AGE_DAYS = 90
+DEFAULT_MAX_SIZE_MB = 512
+
+# Run eviction after this many writes
+EVICTION_INTERVAL = 1000
+
+
+def normalize_review_text(text):
+    """
+    Normalize review text so trivially different copies share a cache key
+
+    Applies Unicode NFKC normalization, collapses whitespace and strips the ends.
+    """
+    if text is None:
+        return ""
+    if not isinstance(text, str):
+        text = str(text)
+    text = unicodedata.normalize('NFKC', text)
+    return " ".join(text.split())
+
+
+def prompt_fingerprint(*parts):
+    """Return a short version string that changes whenever any prompt part changes"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()[:16]
+
+
+def make_cache_key(kind, model, prompt_version, *fields):
+    """
+    Build a content-addressed cache key
+
+    Args:
+        kind (str): 'analysis' or 'summary'
+        model (str): The model name
+        prompt_version (str): Version of the prompt that produced the value
+        *fields: The normalized inputs (review text, title, rating, ...)
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    payload = json.dumps([kind, model, prompt_version] + [str(field) for field in fields], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_age_days=DEFAULT_MAX_AGE_DAYS, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        """
+        Initialize the persistent SQLite cache for LLM results
+
+        Args:
+            path (str): Database file path
+            max_entries (int): Maximum number of cached results
+            max_age_days (float): Results older than this are evicted
+            max_size_mb (float): Maximum total size of cached values
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 86400 if max_age_days else None
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                input_text TEXT,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_kind ON llm_cache (kind, prompt_version)")
+        self._conn.commit()
+
+    def get(self, key):
+        """
+        Look up a cached value
+
+        Returns:
+            object or None: The decoded value, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.max_age_seconds and now - row[1] > self.max_age_seconds):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value, kind, model, prompt_version, input_text=None):
+        """
+        Store a value in the cache
+
+        Args:
+            key (str): Key from make_cache_key
+            value (object): JSON-serializable value
+            kind (str): 'analysis' or 'summary'
+            model (str): The model name
+            prompt_version (str): Version of the prompt that produced the value
+            input_text (str, optional): The normalized input, kept for later reuse
+        """
+        encoded = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache "
+                "(key, kind, model, prompt_version, input_text, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, model, prompt_version, input_text, encoded, len(encoded), now, now)
+            )
+            self._conn.commit()
+            self._writes += 1
+            run_eviction = self._writes % EVICTION_INTERVAL == 0
+        if run_eviction:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove expired entries, then the least recently used ones until size limits are met
+
+        Returns:
+            int: Number of removed entries
+        """
+        removed = 0
+        with self._lock:
+            if self.max_age_seconds:
+                cursor = self._conn.execute(
+                    "DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.max_age_seconds,)
+                )
+                removed += cursor.rowcount
+
+            count, total_size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+            excess_entries = count - self.max_entries if self.max_entries else 0
+            if excess_entries > 0:
+                cursor = self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN "
+                    "(SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)", (excess_entries,)
+                )
+                removed += cursor.rowcount
+
+            if self.max_size_bytes:
+                total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+                while total_size > self.max_size_bytes:
+                    rows = self._conn.execute(
+                        "SELECT key, size FROM llm_cache ORDER BY accessed_at ASC LIMIT 1000"
+                    ).fetchall()
+                    if not rows:
+                        break
+                    keys = []
+                    for key, size in rows:
+                        keys.append((key,))
+                        total_size -= size
+                        if total_size <= self.max_size_bytes:
+                            break
+                    self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", keys)
+                    removed += len(keys)
+
+            self._conn.commit()
+        if removed:
+            logger.info(f"Evicted {removed} cached LLM results")
+        return removed
+
+    def invalidate(self, kind=None, keep_prompt_version=None):
+        """
+        Explicitly drop cached results, e.g. after a prompt change
+
+        Args:
+            kind (str, optional): Only drop entries of this kind
+            keep_prompt_version (str, optional): Keep entries produced by this prompt version
+
+        Returns:
+            int: Number of removed entries
+        """
+        query = "DELETE FROM llm_cache WHERE 1 = 1"
+        params = []
+        if kind:
+            query += " AND kind = ?"
+            params.append(kind)
+        if keep_prompt_version:
+            query += " AND prompt_version != ?"
+            params.append(keep_prompt_version)
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+            self._conn.commit()
+        return cursor.rowcount
+
+    def iter_entries(self, kind, prompt_version=None, model=None):
+        """
+        Iterate over cached entries of one kind, optionally of one prompt version and model
+
+        Yields:
+            tuple: (input_text, value)
+        """
+        query = "SELECT input_text, value FROM llm_cache WHERE kind = ?"
+        params = [kind]
+        if prompt_version:
+            query += " AND prompt_version = ?"
+            params.append(prompt_version)
+        if model:
+            query += " AND model = ?"
+            params.append(model)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        for input_text, value in rows:
+            yield input_text, json.loads(value)
+
+    def stats(self):
+        """
+        Return hit/miss counters and the current cache size
+
+        Returns:
+            dict: hits, misses, hit_rate, entries and size_mb
+        """
+        with self._lock:
+            count, total_size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': count,
+            'size_mb': total_size / (1024 * 1024)
+        }
+
+    def reset_stats(self):
+        """Reset the hit/miss counters"""
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        """Remove every cached result"""
+        return self.invalidate()
+
+
+_default_cache = None
+_default_cache_failed = False
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """
+    Return the process-wide cache, or None when caching is disabled
+
+    Returns:
+        LLMCache or None
+    """
+    global _default_cache, _default_cache_failed
+    if os.environ.get("REVIEW_CACHE_DISABLED") == "1" or _default_cache_failed:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = LLMCache()
+            except Exception as e:
+                logger.warning(f"LLM cache unavailable, continuing without it: {e}")
+                _default_cache_failed = True
+                return None
+        return _default_cache
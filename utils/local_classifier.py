@@ -0,0 +1,431 @@
+import os
+import re
+import json
+import time
+import zlib
+import logging
+import argparse
+
+import numpy as np
+
+from utils.anthropic_helper import ANALYSIS_MODEL, ANALYSIS_PROMPT_VERSION, _format_review
+from utils.llm_cache import get_default_cache, normalize_review_text
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("LocalClassifier")
+
+# Where the trained model is stored, override with REVIEW_CLASSIFIER_PATH
+DEFAULT_MODEL_PATH = os.environ.get("REVIEW_CLASSIFIER_PATH", os.path.join(".cache", "local_classifier.npz"))
+
+# Analysis fields learned from Claude's labels
+LABEL_FIELDS = ["sentiment", "aspect", "urgency", "emotion", "issue_type"]
+
+# Minimum probability of every field before a review is labeled locally
+DEFAULT_ROUTING_THRESHOLD = 0.9
+
+# Size of the hashed feature space
+DEFAULT_NUM_FEATURES = 1 << 17
+
+# Labels seen fewer times than this, or beyond the most common MAX_CLASSES, are folded
+# into OTHER_LABEL, which always defers to Claude
+MIN_LABEL_COUNT = 5
+MAX_CLASSES = 50
+OTHER_LABEL = "__other__"
+
+# Share of the examples held out to measure accuracy against Claude's labels
+HOLDOUT_FRACTION = 0.1
+
+# Training schedule
+DEFAULT_EPOCHS = 8
+DEFAULT_LEARNING_RATE = 2.0
+DEFAULT_L2 = 1e-6
+TRAIN_BATCH_SIZE = 256
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+_RATING_PATTERN = re.compile(r"^Rating: ([\d.]+)", re.MULTILINE)
+
+
+def review_input_text(review_content, review_title="", rating=None):
+    """Build the classifier input for a review, in the same form the LLM cache stores it"""
+    return _format_review(normalize_review_text(review_content), review_title, rating)
+
+
+class HashedFeaturizer:
+    def __init__(self, num_features=DEFAULT_NUM_FEATURES):
+        """
+        Map review texts to L2-normalized hashed word unigram and bigram counts
+
+        Args:
+            num_features (int): Size of the hashed feature space
+        """
+        self.num_features = num_features
+
+    def _features(self, text):
+        features = []
+        rating = _RATING_PATTERN.search(text)
+        if rating:
+            try:
+                features.append(f"r:{float(rating.group(1)):g}")
+            except ValueError:
+                pass
+        tokens = _TOKEN_PATTERN.findall(text.casefold())
+        features.extend(f"w:{token}" for token in tokens)
+        features.extend(f"b:{first} {second}" for first, second in zip(tokens, tokens[1:]))
+        return features
+
+    def transform(self, texts):
+        """
+        Featurize texts into a compact sparse representation
+
+        Returns:
+            tuple: (indices, values, offsets) - feature indices and weights of all texts
+                back to back, and the start of every text with a final end marker
+        """
+        indices = []
+        values = []
+        offsets = [0]
+        for text in texts:
+            counts = {}
+            for feature in self._features(text or ""):
+                index = zlib.crc32(feature.encode('utf-8')) % self.num_features
+                counts[index] = counts.get(index, 0) + 1
+            if counts:
+                row_values = np.sqrt(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+                row_values /= np.linalg.norm(row_values)
+                indices.extend(counts.keys())
+                values.append(row_values)
+            offsets.append(len(indices))
+        return (np.asarray(indices, dtype=np.int64),
+                np.concatenate(values) if values else np.zeros(0, dtype=np.float32),
+                np.asarray(offsets, dtype=np.int64))
+
+
+def _select_rows(features, rows):
+    """Take a subset of rows from the sparse representation"""
+    indices, values, offsets = features
+    starts = offsets[rows]
+    lengths = offsets[rows + 1] - starts
+    new_offsets = np.concatenate(([0], np.cumsum(lengths)))
+    take = np.arange(new_offsets[-1]) + np.repeat(starts - new_offsets[:-1], lengths)
+    return indices[take], values[take], new_offsets
+
+
+def _row_ids(offsets):
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    np.exp(logits, out=logits)
+    logits /= logits.sum(axis=1, keepdims=True)
+    return logits
+
+
+class _SoftmaxModel:
+    def __init__(self, num_features, classes):
+        """Multinomial logistic regression over hashed sparse features"""
+        self.classes = list(classes)
+        self.weights = np.zeros((num_features, len(self.classes)), dtype=np.float32)
+        self.bias = np.zeros(len(self.classes), dtype=np.float32)
+
+    def predict_proba(self, features):
+        indices, values, offsets = features
+        rows = len(offsets) - 1
+        logits = np.tile(self.bias, (rows, 1))
+        if len(indices):
+            np.add.at(logits, _row_ids(offsets), self.weights[indices] * values[:, None])
+        return _softmax(logits)
+
+    def fit(self, features, labels, epochs=DEFAULT_EPOCHS, learning_rate=DEFAULT_LEARNING_RATE,
+            l2=DEFAULT_L2, seed=0):
+        """Train with mini-batch gradient descent on the cross-entropy loss"""
+        rng = np.random.RandomState(seed)
+        total = len(labels)
+        for epoch in range(epochs):
+            step = learning_rate / np.sqrt(1 + epoch)
+            order = rng.permutation(total)
+            for start in range(0, total, TRAIN_BATCH_SIZE):
+                rows = order[start:start + TRAIN_BATCH_SIZE]
+                batch = _select_rows(features, rows)
+                gradient = self.predict_proba(batch)
+                gradient[np.arange(len(rows)), labels[rows]] -= 1.0
+                gradient /= len(rows)
+
+                indices, values, offsets = batch
+                if len(indices):
+                    # Lazy L2 decay, only on the features present in this batch
+                    touched = np.unique(indices)
+                    self.weights[touched] *= (1 - step * l2)
+                    np.add.at(self.weights, indices, -step * values[:, None] * gradient[_row_ids(offsets)])
+                self.bias -= step * gradient.sum(axis=0)
+
+
+class LocalReviewClassifier:
+    def __init__(self, num_features=DEFAULT_NUM_FEATURES):
+        """
+        Local classifier distilled from Claude's review analyses
+
+        One softmax model per analysis field is trained on cached analysis results,
+        so routine reviews can be labeled in-process and only uncertain ones go to Claude.
+
+        Args:
+            num_features (int): Size of the hashed feature space
+        """
+        self.featurizer = HashedFeaturizer(num_features)
+        self.models = {}
+        self.metrics = {}
+        self.prompt_version = None
+        self.trained_at = None
+
+    @property
+    def is_trained(self):
+        return bool(self.models)
+
+    def fit(self, texts, results, holdout_fraction=HOLDOUT_FRACTION, epochs=DEFAULT_EPOCHS):
+        """
+        Train on Claude-labeled reviews and measure accuracy on a held-out share
+
+        Args:
+            texts (list): Review input texts, as built by review_input_text
+            results (list): The matching analysis results from Claude
+            holdout_fraction (float): Share of the examples kept aside for evaluation
+            epochs (int): Passes over the training examples
+
+        Returns:
+            dict: Held-out metrics, see evaluate
+        """
+        if not texts:
+            raise ValueError("No labeled reviews to train on")
+
+        # Stable split, so retraining on a larger cache keeps old holdout examples held out
+        holdout = np.array([
+            zlib.crc32(text.encode('utf-8')) % 1000 < holdout_fraction * 1000 for text in texts
+        ])
+        features = self.featurizer.transform(texts)
+        train_rows = np.nonzero(~holdout)[0]
+        test_rows = np.nonzero(holdout)[0]
+        train_features = _select_rows(features, train_rows)
+
+        self.models = {}
+        for field in LABEL_FIELDS:
+            labels = [str(result.get(field, "")) for result in results]
+            counts = {}
+            for row in train_rows:
+                counts[labels[row]] = counts.get(labels[row], 0) + 1
+            frequent = sorted(counts.items(), key=lambda item: -item[1])[:MAX_CLASSES]
+            classes = sorted(label for label, count in frequent if count >= MIN_LABEL_COUNT and label)
+            classes.append(OTHER_LABEL)
+            class_index = {label: index for index, label in enumerate(classes)}
+            encoded = np.array([class_index.get(labels[row], len(classes) - 1) for row in train_rows])
+
+            model = _SoftmaxModel(self.featurizer.num_features, classes)
+            model.fit(train_features, encoded, epochs=epochs)
+            self.models[field] = model
+
+        self.prompt_version = ANALYSIS_PROMPT_VERSION
+        self.trained_at = time.time()
+        self.metrics = self.evaluate(
+            [texts[row] for row in test_rows], [results[row] for row in test_rows]
+        ) if len(test_rows) else {}
+        self.metrics['train_examples'] = int(len(train_rows))
+        logger.info(f"Trained local classifier on {len(train_rows)} reviews, holding out {len(test_rows)}")
+        return self.metrics
+
+    def _predict(self, texts):
+        """Return per-field labels and probabilities, plus the lowest field probability of each text"""
+        features = self.featurizer.transform(texts)
+        labels = {}
+        probabilities = {}
+        confidence = np.ones(len(texts))
+        for field, model in self.models.items():
+            proba = model.predict_proba(features)
+            best = proba.argmax(axis=1)
+            labels[field] = [model.classes[index] for index in best]
+            probabilities[field] = proba
+            field_confidence = proba[np.arange(len(texts)), best]
+            # A review whose best guess is the catch-all label always goes to Claude
+            field_confidence[best == len(model.classes) - 1] = 0.0
+            confidence = np.minimum(confidence, field_confidence)
+        return labels, probabilities, confidence
+
+    def evaluate(self, texts, results, thresholds=(0.5, 0.7, 0.8, 0.9, 0.95)):
+        """
+        Measure agreement with Claude's labels
+
+        Returns:
+            dict: Per-field accuracy over all examples, and for each routing threshold the
+                share of reviews labeled locally and their accuracy on every field
+        """
+        labels, _, confidence = self._predict(texts)
+        total = len(texts)
+        metrics = {'holdout_examples': total, 'field_accuracy': {}, 'routing': {}}
+        agree = np.ones(total, dtype=bool)
+        for field in self.models:
+            expected = np.array([str(result.get(field, "")) for result in results])
+            correct = np.array(labels[field]) == expected
+            metrics['field_accuracy'][field] = float(correct.mean()) if total else 0.0
+            agree &= correct
+
+        for threshold in thresholds:
+            routed = confidence >= threshold
+            metrics['routing'][str(threshold)] = {
+                'coverage': float(routed.mean()) if total else 0.0,
+                'accuracy': float(agree[routed].mean()) if routed.any() else None
+            }
+        return metrics
+
+    def predict(self, texts, threshold=DEFAULT_ROUTING_THRESHOLD):
+        """
+        Label the reviews the classifier is confident about
+
+        Args:
+            texts (list): Review input texts, as built by review_input_text
+            threshold (float): Minimum probability required on every field
+
+        Returns:
+            list: An analysis result for each confident text, None for texts to send to Claude
+        """
+        if not self.is_trained or not texts:
+            return [None] * len(texts)
+
+        labels, probabilities, confidence = self._predict(texts)
+        sentiment_model = self.models['sentiment']
+        predictions = []
+        for row, row_confidence in enumerate(confidence):
+            if row_confidence < threshold:
+                predictions.append(None)
+                continue
+            proba = dict(zip(sentiment_model.classes, probabilities['sentiment'][row]))
+            emotion = labels['emotion'][row]
+            predictions.append({
+                'sentiment': labels['sentiment'][row],
+                'sentiment_score': round(float(proba.get('Positive', 0.0) - proba.get('Negative', 0.0)), 2),
+                'key_emotions': [emotion],
+                'emotion': emotion,
+                'urgency': labels['urgency'][row],
+                'aspect': labels['aspect'][row],
+                'issue_type': labels['issue_type'][row],
+                'confidence': round(float(row_confidence), 2),
+                'analysis_model': 'local'
+            })
+        return predictions
+
+    def save(self, path=DEFAULT_MODEL_PATH):
+        """Write the trained model to an .npz file"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        metadata = {
+            'num_features': self.featurizer.num_features,
+            'classes': {field: model.classes for field, model in self.models.items()},
+            'metrics': self.metrics,
+            'prompt_version': self.prompt_version,
+            'trained_at': self.trained_at
+        }
+        arrays = {}
+        for field, model in self.models.items():
+            arrays[f"{field}_weights"] = model.weights
+            arrays[f"{field}_bias"] = model.bias
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(tmp_path, metadata=np.array(json.dumps(metadata)), **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH):
+        """
+        Load a saved model
+
+        Returns:
+            LocalReviewClassifier or None: None when no model exists or it was trained on another prompt version
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            metadata = json.loads(str(data['metadata']))
+            if metadata.get('prompt_version') != ANALYSIS_PROMPT_VERSION:
+                logger.info("Local classifier was trained on an older analysis prompt, ignoring it")
+                return None
+            classifier = cls(metadata['num_features'])
+            for field, classes in metadata['classes'].items():
+                model = _SoftmaxModel(metadata['num_features'], classes)
+                model.weights = data[f"{field}_weights"]
+                model.bias = data[f"{field}_bias"]
+                classifier.models[field] = model
+        classifier.metrics = metadata.get('metrics', {})
+        classifier.prompt_version = metadata.get('prompt_version')
+        classifier.trained_at = metadata.get('trained_at')
+        return classifier
+
+
+def load_training_data(cache=None, model=ANALYSIS_MODEL):
+    """
+    Collect Claude-labeled reviews from the LLM cache
+
+    Only the analyses of one model are used. With the model cascade the cache also holds
+    cheap-tier answers, including the low-confidence ones the last tier overruled, so
+    training on every model would teach the classifier the labels the cascade rejected.
+
+    Args:
+        cache (LLMCache, optional): The cache to read, by default the process-wide one
+        model (str): Model whose analyses are the labels, the last cascade tier
+
+    Returns:
+        tuple: (texts, results) for every cached analysis of the model and the current prompt version
+    """
+    cache = cache or get_default_cache()
+    if cache is None:
+        return [], []
+    texts = []
+    results = []
+    for input_text, value in cache.iter_entries('analysis', ANALYSIS_PROMPT_VERSION, model):
+        if input_text and isinstance(value, dict):
+            texts.append(input_text)
+            results.append(value)
+    return texts, results
+
+
+def train_local_classifier(path=DEFAULT_MODEL_PATH, cache=None, epochs=DEFAULT_EPOCHS, model=ANALYSIS_MODEL):
+    """
+    Retrain the local classifier on every cached analysis of one Claude model and save it
+
+    Returns:
+        LocalReviewClassifier: The trained classifier, its metrics hold the held-out accuracy
+    """
+    texts, results = load_training_data(cache, model)
+    classifier = LocalReviewClassifier()
+    classifier.fit(texts, results, epochs=epochs)
+    classifier.save(path)
+    return classifier
+
+
+def format_metrics(metrics):
+    """Render classifier metrics as readable lines"""
+    lines = [f"Training examples: {metrics.get('train_examples', 0)}",
+             f"Held-out examples: {metrics.get('holdout_examples', 0)}"]
+    for field, accuracy in metrics.get('field_accuracy', {}).items():
+        lines.append(f"  {field}: {accuracy:.1%} agreement with Claude")
+    for threshold, routing in metrics.get('routing', {}).items():
+        accuracy = routing['accuracy']
+        accuracy_text = f"{accuracy:.1%}" if accuracy is not None else "n/a"
+        lines.append(f"  threshold {threshold}: {routing['coverage']:.1%} labeled locally, "
+                     f"{accuracy_text} fully correct")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train or inspect the local review classifier")
+    parser.add_argument("command", choices=["train", "report"])
+    parser.add_argument("--path", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--epochs", type=int, default=DEFAULT_EPOCHS)
+    parser.add_argument("--model", default=ANALYSIS_MODEL, help="Train on the analyses of this model, the last cascade tier")
+    args = parser.parse_args()
+
+    if args.command == "train":
+        trained = train_local_classifier(args.path, epochs=args.epochs, model=args.model)
+        print(format_metrics(trained.metrics))
+    else:
+        loaded = LocalReviewClassifier.load(args.path)
+        if loaded is None:
+            print("No local classifier trained for the current analysis prompt")
+        else:
+            print(format_metrics(loaded.metrics))
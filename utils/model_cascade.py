@@ -0,0 +1,239 @@
+import logging
+import threading
+
+from utils.anthropic_helper import ANALYSIS_MODEL, analyze_review, analyze_reviews_batch, MAX_REVIEWS_PER_REQUEST
+
+logger = logging.getLogger("ModelCascade")
+
+# Models tried in order, cheapest first
+DEFAULT_MODEL_TIERS = ["claude-3-5-haiku-20241022", ANALYSIS_MODEL]
+
+# Results below this confidence are re-run on the next tier
+DEFAULT_CONFIDENCE_THRESHOLD = 0.7
+
+# USD per million (input, output) tokens, used to estimate the cost saved by routing
+MODEL_PRICES = {
+    "claude-3-5-haiku-20241022": (0.80, 4.00),
+    "claude-3-5-sonnet-20241022": (3.00, 15.00),
+    "claude-3-7-sonnet-20250219": (3.00, 15.00)
+}
+
+VALID_SENTIMENTS = {"Positive", "Negative", "Neutral"}
+VALID_ASPECTS = {"Product", "Service", "Other"}
+VALID_URGENCIES = {"High", "Medium", "Low"}
+
+
+def validate_analysis(result):
+    """
+    Check that an analysis result is well formed
+
+    Args:
+        result (dict): A parsed analysis result
+
+    Returns:
+        bool: True when every field has an allowed value
+    """
+    if not isinstance(result, dict):
+        return False
+    if result.get('sentiment') not in VALID_SENTIMENTS:
+        return False
+    if result.get('aspect') not in VALID_ASPECTS:
+        return False
+    if result.get('urgency') not in VALID_URGENCIES:
+        return False
+    if not isinstance(result.get('issue_type'), str) or not result['issue_type'].strip():
+        return False
+    try:
+        confidence = float(result.get('confidence'))
+        sentiment_score = float(result.get('sentiment_score'))
+    except (TypeError, ValueError):
+        return False
+    return 0.0 <= confidence <= 1.0 and -1.0 <= sentiment_score <= 1.0
+
+
+def _cost(model, input_tokens, output_tokens):
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+class CascadeStats:
+    def __init__(self, tiers):
+        """
+        Thread-safe counters for a model cascade run
+
+        Args:
+            tiers (list): The cascade's model names, cheapest first
+        """
+        self.tiers = list(tiers)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear every counter"""
+        with self._lock:
+            self.reviews = 0
+            self.escalations = {model: 0 for model in self.tiers}
+            self.reviews_by_tier = {model: 0 for model in self.tiers}
+            self.usage = {
+                model: {'calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'latency': 0.0}
+                for model in self.tiers
+            }
+
+    def record_usage(self, model, input_tokens, output_tokens, latency):
+        """Usage callback passed to the analysis functions"""
+        with self._lock:
+            usage = self.usage.setdefault(
+                model, {'calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'latency': 0.0}
+            )
+            usage['calls'] += 1
+            usage['input_tokens'] += input_tokens
+            usage['output_tokens'] += output_tokens
+            usage['latency'] += latency
+
+    def record_reviews(self, model, count, escalated):
+        """Record that `count` reviews ran on a tier and `escalated` of them moved on"""
+        with self._lock:
+            if model == self.tiers[0]:
+                self.reviews += count
+            self.reviews_by_tier[model] = self.reviews_by_tier.get(model, 0) + count
+            self.escalations[model] = self.escalations.get(model, 0) + escalated
+
+    def report(self):
+        """
+        Summarize the routing and estimate its savings against sending everything to the largest model
+
+        The all-largest-model baseline is extrapolated from the reviews that actually
+        reached the largest model, so it is only available once at least one did.
+
+        Returns:
+            dict: Escalated fraction, per-tier usage, and estimated token, latency and cost savings
+        """
+        with self._lock:
+            usage = {model: dict(values) for model, values in self.usage.items()}
+            reviews_by_tier = dict(self.reviews_by_tier)
+            escalations = dict(self.escalations)
+            reviews = self.reviews
+
+        largest = self.tiers[-1]
+        escalated = sum(escalations.get(model, 0) for model in self.tiers[:-1])
+        total_tokens = sum(u['input_tokens'] + u['output_tokens'] for u in usage.values())
+        total_latency = sum(u['latency'] for u in usage.values())
+        total_cost = sum(_cost(model, u['input_tokens'], u['output_tokens']) for model, u in usage.items())
+
+        report = {
+            'reviews': reviews,
+            'escalated_reviews': escalated,
+            'escalated_fraction': escalated / reviews if reviews else 0.0,
+            'reviews_by_tier': reviews_by_tier,
+            'usage': usage,
+            'total_tokens': total_tokens,
+            'total_latency': total_latency,
+            'estimated_cost': total_cost,
+            'baseline_tokens': None,
+            'baseline_latency': None,
+            'baseline_cost': None,
+            'large_model_tokens_saved': None,
+            'latency_saved': None,
+            'cost_saved': None
+        }
+
+        largest_usage = usage.get(largest, {})
+        largest_reviews = reviews_by_tier.get(largest, 0)
+        if reviews and largest_reviews and largest_usage.get('calls'):
+            scale = reviews / largest_reviews
+            baseline_input = largest_usage['input_tokens'] * scale
+            baseline_output = largest_usage['output_tokens'] * scale
+            report['baseline_tokens'] = baseline_input + baseline_output
+            report['baseline_latency'] = largest_usage['latency'] * scale
+            report['baseline_cost'] = _cost(largest, baseline_input, baseline_output)
+            report['large_model_tokens_saved'] = report['baseline_tokens'] - (
+                largest_usage['input_tokens'] + largest_usage['output_tokens'])
+            report['latency_saved'] = report['baseline_latency'] - total_latency
+            report['cost_saved'] = report['baseline_cost'] - total_cost
+        return report
+
+
+class ModelCascade:
+    def __init__(self, tiers=None, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD,
+                 analyze_fn=None, analyze_batch_fn=None):
+        """
+        Route review analysis through a cheap model first, escalating uncertain results
+
+        Every review is analyzed with the first tier. Reviews whose result is below
+        the confidence threshold or fails validation are re-run on the next tier,
+        and so on. The last tier's result is kept whatever its confidence.
+
+        Args:
+            tiers (list, optional): Model names, cheapest first
+            confidence_threshold (float): Minimum confidence accepted without escalation
+            analyze_fn (callable, optional): Replacement for analyze_review, mainly for testing
+            analyze_batch_fn (callable, optional): Replacement for analyze_reviews_batch, mainly for testing
+        """
+        self.tiers = list(tiers or DEFAULT_MODEL_TIERS)
+        if not self.tiers:
+            raise ValueError("A model cascade needs at least one model tier")
+        self.confidence_threshold = confidence_threshold
+        self.analyze_fn = analyze_fn or analyze_review
+        self.analyze_batch_fn = analyze_batch_fn or analyze_reviews_batch
+        self.stats = CascadeStats(self.tiers)
+
+    def needs_escalation(self, result):
+        """Return True when a result should be re-run on a larger model"""
+        if not validate_analysis(result):
+            return True
+        return float(result['confidence']) < self.confidence_threshold
+
+    def analyze(self, review_content, review_title="", rating=None, api_key=None):
+        """
+        Analyze one review through the cascade
+
+        Takes the same arguments as analyze_review and returns the same result,
+        with an extra 'analysis_model' field naming the model that produced it.
+        A tier that fails escalates as well, and a failure of the last tier is raised.
+        """
+        result = None
+        for index, model in enumerate(self.tiers):
+            is_last = index == len(self.tiers) - 1
+            try:
+                result = self.analyze_fn(review_content, review_title, rating, api_key,
+                                         model=model, usage_callback=self.stats.record_usage)
+            except Exception:
+                if is_last:
+                    raise
+                result = None
+            escalate = not is_last and (result is None or self.needs_escalation(result))
+            self.stats.record_reviews(model, 1, int(escalate))
+            if not escalate:
+                break
+        return {**result, 'analysis_model': model}
+
+    def analyze_batch(self, reviews, api_key=None, max_batch_size=MAX_REVIEWS_PER_REQUEST):
+        """
+        Analyze a batch of reviews through the cascade
+
+        Takes the same arguments as analyze_reviews_batch and returns the same
+        mapping. Only the reviews that need escalation or got no result are sent to
+        the next tier, and those the last tier gives no result for are left out.
+        """
+        results = {}
+        pending = list(reviews)
+        for index, model in enumerate(self.tiers):
+            batch_results = self.analyze_batch_fn(pending, api_key, max_batch_size=max_batch_size,
+                                                  model=model, usage_callback=self.stats.record_usage)
+            is_last = index == len(self.tiers) - 1
+            escalated = []
+            for review in pending:
+                result = batch_results.get(str(review['id']))
+                if not is_last and (result is None or self.needs_escalation(result)):
+                    # An escalated review only gets a result from a later tier
+                    escalated.append(review)
+                elif result is not None:
+                    results[str(review['id'])] = {**result, 'analysis_model': model}
+
+            self.stats.record_reviews(model, len(pending), len(escalated))
+            if escalated:
+                logger.info(f"Escalating {len(escalated)} of {len(pending)} reviews from {model}")
+            pending = escalated
+            if not pending:
+                break
+        return results
@@ -0,0 +1,315 @@
+import time
+import logging
+import threading
+
+import pandas as pd
+
+from utils.analysis_run import BackgroundAnalysisRun, generate_knowledge_base, DEFAULT_SUMMARY_WORKERS
+from utils.local_classifier import LocalReviewClassifier, DEFAULT_ROUTING_THRESHOLD
+from utils.model_cascade import ModelCascade, DEFAULT_CONFIDENCE_THRESHOLD
+from utils.scrape_orchestrator import ScrapeOrchestrator, DEFAULT_SCRAPE_WORKERS, GOOGLE_PLAY
+from utils.google_play_scraper import crawl_google_play_history
+from utils.progress import describe_event
+from utils.streaming import StreamingAnalysis
+from utils.watermarks import get_watermark_store
+from utils.knowledge_store import DEFAULT_REGENERATE_THRESHOLD
+from utils.review_store import get_review_store, ANALYZED
+from utils.taxonomy import get_issue_taxonomy
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Pipeline")
+
+# Seconds between saves of the summaries still being written
+DRAFT_SAVE_INTERVAL = 0.5
+
+
+def scraping_sources(config):
+    """
+    List the individual scrapes described by a scraping configuration
+
+    Args:
+        config (dict): {'main_company': {...}, 'competitors': [...], 'incremental': bool,
+            'full_history': bool} as built by the scraping form
+
+    Returns:
+        list: (source, company_name, target, max_reviews) tuples
+    """
+    main_company = config['main_company']
+    sources = []
+    for company in [main_company] + list(config.get('competitors', [])):
+        if company.get('google_id'):
+            sources.append(('Google Play Store', company['name'], company['google_id'], main_company['google_count']))
+        if company.get('trustpilot_url'):
+            sources.append(('Trustpilot', company['name'], company['trustpilot_url'], main_company['trustpilot_count']))
+    return sources
+
+
+def scrape_sources(config, progress_callback=None, event_callback=None, max_workers=DEFAULT_SCRAPE_WORKERS,
+                   deadline=None):
+    """
+    Scrape every source of a scraping configuration, running independent crawls concurrently
+
+    Args:
+        config (dict): The scraping configuration. With 'incremental' set, only reviews newer than
+            each source's watermark are collected. With 'full_history' set, Google Play apps are
+            left to crawl_full_histories
+        progress_callback (callable, optional): Called as progress_callback(finished, total, message)
+            with the aggregate progress of all crawls
+        event_callback (callable, optional): Receives the scrapers' progress events, see utils.progress
+        max_workers (int): Crawls running at the same time, 1 scrapes one source after another
+        deadline (float, optional): Seconds after which the remaining crawls stop with what they have
+
+    Returns:
+        pd.DataFrame: The combined reviews of all sources, in configuration order
+    """
+    sources = scraping_sources(config)
+    if config.get('full_history'):
+        sources = [source for source in sources if source[0] != GOOGLE_PLAY]
+    scrape_options = {'watermarks': get_watermark_store()} if config.get('incremental') else None
+    orchestrator = ScrapeOrchestrator(sources, max_workers=max_workers, deadline=deadline,
+                                      scrape_options=scrape_options)
+    return orchestrator.run(progress_callback=progress_callback, event_callback=event_callback)
+
+
+def stream_scrape_and_analyze(config, api_key, engine_options=None, progress_callback=None, event_callback=None,
+                              result_callback=None, max_workers=DEFAULT_SCRAPE_WORKERS, deadline=None):
+    """
+    Scrape every source of a scraping configuration and analyze the reviews while scraping continues
+
+    The scraped reviews and the analyzed rows are written to the review store afterwards. Analyzed
+    rows use the canonical issue types of the taxonomy, see utils.taxonomy.
+
+    Args:
+        config (dict): The scraping configuration, without 'full_history'
+        api_key (str): The Anthropic API key
+        engine_options (dict, optional): Extra ReviewAnalysisEngine arguments
+        progress_callback (callable, optional): Called as progress_callback(analyzed, scraped)
+        event_callback (callable, optional): Receives the scrapers' progress events
+        result_callback (callable, optional): Called as result_callback(position, row) for every analyzed row
+        max_workers (int): Crawls running at the same time
+        deadline (float, optional): Seconds after which the remaining crawls stop
+
+    Returns:
+        tuple: (stream, analyzed_data, query) - the StreamingAnalysis with the scraped reviews and
+            timing stats, the analyzed rows and the review store query of the scraped reviews
+    """
+    if config.get('full_history'):
+        raise ValueError("Full-history crawls write to the review store and cannot be streamed into analysis")
+    started_ns = time.time_ns()
+    scrape_options = {'watermarks': get_watermark_store()} if config.get('incremental') else None
+    stream = StreamingAnalysis(scraping_sources(config), api_key, engine_options, max_workers=max_workers,
+                               deadline=deadline, scrape_options=scrape_options)
+    taxonomy = get_issue_taxonomy()
+    analyzed_data = taxonomy.apply(stream.run(
+        progress_callback=progress_callback, event_callback=event_callback,
+        result_callback=(lambda position, row: result_callback(position, taxonomy.apply([row])[0]))
+        if result_callback else None
+    ))
+    query, _ = store_scraped_reviews(config, stream.scraped, started_ns)
+    get_review_store(ANALYZED).upsert(pd.DataFrame(analyzed_data))
+    return stream, analyzed_data, query
+
+
+def crawl_full_histories(config, event_callback=None, should_stop=None):
+    """
+    Crawl every review of each Google Play app in a scraping configuration into the review store
+
+    Crawls run one after another, since they all hit the same host, and each resumes where an
+    earlier unfinished crawl of its app stopped.
+
+    Args:
+        config (dict): The scraping configuration
+        event_callback (callable, optional): Receives the crawls' progress events, see utils.progress
+        should_stop (callable, optional): Returning True stops the current crawl and skips the rest
+
+    Returns:
+        list: One crawl_google_play_history result per app
+    """
+    results = []
+    for source, company_name, target, _ in scraping_sources(config):
+        if source != GOOGLE_PLAY or (should_stop and should_stop()):
+            continue
+        results.append(crawl_google_play_history(target, company_name, progress_callback=event_callback,
+                                                 should_stop=should_stop))
+    return results
+
+
+def store_scraped_reviews(config, combined, started_ns):
+    """
+    Write scraped reviews to the review store
+
+    Args:
+        config (dict): The scraping configuration
+        combined (pd.DataFrame): The scraped reviews
+        started_ns (int): time.time_ns() before scraping started
+
+    Returns:
+        tuple: (query, counts). Passing the query to ReviewStore.read returns the reviews of this
+            scrape, or for incremental and full-history scrapes every stored review of the scraped
+            companies and sources.
+            counts holds the 'inserted' and 'updated' review counts.
+    """
+    store = get_review_store()
+    counts = store.upsert(combined)
+    sources = scraping_sources(config)
+    query = {
+        'companies': sorted({company_name for _, company_name, _, _ in sources}),
+        'sources': sorted({source for source, _, _, _ in sources})
+    }
+    if not (config.get('incremental') or config.get('full_history')):
+        query['written_since'] = started_ns
+    return query, counts
+
+
+def run_scrape_job(context):
+    """
+    Scrape every configured source into the review store
+
+    Params:
+        config (dict): The scraping configuration
+        scrape_workers (int, optional): Crawls running at the same time
+        deadline (float, optional): Seconds after which the remaining crawls stop
+
+    The result's 'query' reads the collected reviews back from the review store.
+    """
+    config = context.params['config']
+    started_ns = time.time_ns()
+
+    def report_crawl(event):
+        # Cancelling is picked up by should_stop, between pages
+        if not context.cancel_requested():
+            context.progress(event['completed'], event['total'] or None, describe_event(event))
+
+    crawls = []
+    if config.get('full_history'):
+        crawls = crawl_full_histories(config, event_callback=report_crawl, should_stop=context.cancel_requested)
+        context.check_cancelled()
+    combined = scrape_sources(config, progress_callback=context.progress,
+                              max_workers=context.params.get('scrape_workers', DEFAULT_SCRAPE_WORKERS),
+                              deadline=context.params.get('deadline'))
+    query, counts = store_scraped_reviews(config, combined, started_ns)
+    return {'reviews': len(combined), 'sources': len(scraping_sources(config)), 'query': query, 'crawls': crawls,
+            **counts}
+
+
+def build_engine_options(params):
+    """Turn JSON job parameters into ReviewAnalysisEngine arguments"""
+    options = {key: params[key] for key in ('max_workers', 'batch_size', 'dedupe') if key in params}
+    if params.get('cascade'):
+        options['cascade'] = ModelCascade(
+            tiers=params.get('cascade_tiers'),
+            confidence_threshold=params.get('cascade_threshold', DEFAULT_CONFIDENCE_THRESHOLD)
+        )
+    if params.get('use_local_classifier'):
+        options['local_classifier'] = LocalReviewClassifier.load()
+        options['local_threshold'] = params.get('local_threshold', DEFAULT_ROUTING_THRESHOLD)
+    return options
+
+
+def run_analysis_job(context):
+    """
+    Analyze reviews, checkpointing as it goes, then queue the knowledge base job
+
+    Params:
+        engine options (max_workers, batch_size, dedupe, cascade, cascade_tiers, cascade_threshold,
+            use_local_classifier, local_threshold), summarize (bool), regenerate_threshold (float,
+            passed on to the knowledge base job) and query (dict, optional)
+
+    The reviews come from input file 'input', or from the review store when 'query' holds
+    ReviewStore.read arguments. Output file 'output' holds the analyzed rows with canonical issue
+    types, which are also written to the store's analyzed dataset.
+    """
+    if context.params.get('query') is not None:
+        df = get_review_store().read(**context.params['query'])
+    else:
+        df = context.load_file('input')
+    run = BackgroundAnalysisRun(
+        df, context.secrets.get('api_key'), build_engine_options(context.params), summarize=False,
+        progress_callback=lambda completed, total: context.progress(completed, total, "Analyzing reviews")
+    )
+    context.progress(0, run.store.total, "Analyzing reviews")
+    analyzed_data = get_issue_taxonomy().apply(run.run())
+    context.save_file('output', analyzed_data)
+    get_review_store(ANALYZED).upsert(pd.DataFrame(analyzed_data))
+
+    result = {
+        'run_id': run.store.run_id,
+        'reviews': len(analyzed_data),
+        'resumed_rows': run.store.resumed_rows,
+        'errors': run.store.errors,
+        'stats': run.store.stats,
+        'first_result_seconds': run.store.time_to_first_result(),
+        'knowledge_base_job': None
+    }
+    if context.params.get('summarize', True) and analyzed_data:
+        threshold = context.params.get('regenerate_threshold', DEFAULT_REGENERATE_THRESHOLD)
+        result['knowledge_base_job'] = context.submit('knowledge_base', {'regenerate_threshold': threshold},
+                                                      files={'input': analyzed_data})
+    return result
+
+
+def run_knowledge_base_job(context):
+    """
+    Generate one summary per issue type
+
+    Params:
+        issue_types (list, optional): Only summarize these, e.g. the ones a previous job failed on
+        summary_workers (int, optional): Summaries requested at the same time
+        regenerate_threshold (float, optional): Share of changed reviews above which a stored
+            summary is regenerated, null regenerates every summary
+
+    Input file 'input' holds the analyzed rows. The summaries are returned in the job result.
+    While the job runs, file 'summaries' holds those finished so far and file 'drafts' the text
+    of those still being written.
+    """
+    analyzed_data = context.load_file('input')
+    finished = {}
+    drafts = {}
+    drafts_lock = threading.Lock()
+    last_draft_save = 0.0
+
+    def save_drafts(force=False):
+        # Called with drafts_lock held
+        nonlocal last_draft_save
+        if force or time.time() - last_draft_save >= DRAFT_SAVE_INTERVAL:
+            context.save_file('drafts', dict(drafts))
+            last_draft_save = time.time()
+
+    def add_text(issue_type, text):
+        with drafts_lock:
+            drafts[issue_type] = drafts.get(issue_type, '') + text
+            save_drafts()
+
+    def save_summary(issue_type, summary):
+        finished[issue_type] = summary
+        context.save_file('summaries', dict(finished))
+        with drafts_lock:
+            if drafts.pop(issue_type, None) is not None:
+                save_drafts(force=True)
+
+    def drop_draft(issue_type, error):
+        # A failed summary is reported in the job result, its partial text is not shown as in progress
+        with drafts_lock:
+            if drafts.pop(issue_type, None) is not None:
+                save_drafts(force=True)
+
+    knowledge_base, failed = generate_knowledge_base(
+        analyzed_data, context.secrets.get('api_key'),
+        summary_callback=save_summary,
+        error_callback=drop_draft,
+        progress_callback=lambda completed, total: context.progress(completed, total, "Generating summaries"),
+        text_callback=add_text,
+        max_workers=context.params.get('summary_workers', DEFAULT_SUMMARY_WORKERS),
+        issue_types=context.params.get('issue_types'),
+        regenerate_threshold=context.params.get('regenerate_threshold', DEFAULT_REGENERATE_THRESHOLD)
+    )
+    return {'knowledge_base': knowledge_base, 'failed': failed}
+
+
+# Job kinds understood by the workers
+JOB_HANDLERS = {
+    'scrape': run_scrape_job,
+    'analysis': run_analysis_job,
+    'knowledge_base': run_knowledge_base_job
+}
@@ -0,0 +1,116 @@
+import time
+import logging
+
+logger = logging.getLogger("ScrapeProgress")
+
+# Event kinds
+START = "start"
+PROGRESS = "progress"
+WARNING = "warning"
+DONE = "done"
+ERROR = "error"
+
+# Minimum seconds between two progress events of one reporter, other kinds are never dropped
+DEFAULT_PROGRESS_INTERVAL = 1.0
+
+
+def describe_event(event):
+    """
+    Render a progress event as one line of text
+
+    Args:
+        event (dict): A progress event
+
+    Returns:
+        str: e.g. "Google Play Store: 40/100 reviews collected for Target"
+    """
+    prefix = f"{event['source']}: " if event['source'] else ""
+    suffix = f" for {event['company_name']}" if event['company_name'] else ""
+    if event['message']:
+        return f"{prefix}{event['message']}"
+    if event['kind'] == START:
+        return f"{prefix}starting{suffix}"
+    if event['kind'] == DONE:
+        return f"{prefix}collected {event['completed']} reviews{suffix}"
+    return f"{prefix}{event['completed']}/{event['total']} reviews collected{suffix}"
+
+
+class ProgressReporter:
+    def __init__(self, callback=None, source="", company_name="", total=0, interval=DEFAULT_PROGRESS_INTERVAL):
+        """
+        Emit progress events of one scrape to a callback
+
+        Each event is a dict with 'kind' (start, progress, warning, done or error),
+        'source', 'company_name', 'completed', 'total', 'message' and 'time'.
+        Progress events closer together than `interval` seconds are dropped, so
+        per-page updates of fast crawls do not flood the receiver.
+
+        Args:
+            callback (callable, optional): Called as callback(event), None discards every event
+            source (str): Review source, e.g. 'Google Play Store'
+            company_name (str): Company being scraped
+            total (int): Number of reviews the scrape aims for
+            interval (float): Minimum seconds between progress events
+        """
+        self.callback = callback
+        self.source = source
+        self.company_name = company_name
+        self.total = total
+        self.interval = interval
+        self._last_progress = 0.0
+
+    def _emit(self, kind, completed, message):
+        if self.callback is None:
+            return
+        event = {
+            'kind': kind,
+            'source': self.source,
+            'company_name': self.company_name,
+            'completed': completed,
+            'total': self.total,
+            'message': message,
+            'time': time.time()
+        }
+        try:
+            self.callback(event)
+        except Exception as e:
+            # A broken display must not stop the scrape
+            logger.warning(f"Progress callback failed: {e}")
+
+    def start(self, message=""):
+        self._emit(START, 0, message)
+
+    def update(self, completed, message=""):
+        now = time.time()
+        if now - self._last_progress < self.interval:
+            return
+        self._last_progress = now
+        self._emit(PROGRESS, completed, message)
+
+    def warning(self, message, completed=0):
+        self._emit(WARNING, completed, message)
+
+    def done(self, completed, message=""):
+        self._emit(DONE, completed, message)
+
+    def error(self, message, completed=0):
+        self._emit(ERROR, completed, message)
+
+
+def logging_callback(target_logger=None, level=logging.INFO):
+    """
+    Progress callback that logs every event, for headless and parallel runs
+
+    Warnings and errors are logged at their own levels.
+    """
+    target_logger = target_logger or logger
+
+    def log_event(event):
+        if event['kind'] == WARNING:
+            target_logger.warning(describe_event(event))
+        elif event['kind'] == ERROR:
+            target_logger.error(describe_event(event))
+        else:
+            target_logger.log(level, describe_event(event))
+
+    return log_event
@@ -0,0 +1,326 @@
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+import anthropic
+
+logger = logging.getLogger("RateLimiter")
+
+# Adaptive concurrency bounds (AIMD)
+DEFAULT_INITIAL_CONCURRENCY = 8
+DEFAULT_MIN_CONCURRENCY = 1
+DEFAULT_MAX_CONCURRENCY = 32
+
+# Successful calls needed before the concurrency limit grows by one
+DEFAULT_INCREASE_EVERY = 10
+
+# Retry policy
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+
+# Per-call timeout in seconds
+DEFAULT_CALL_TIMEOUT = float(os.environ.get("ANTHROPIC_CALL_TIMEOUT", 60.0))
+
+# Status codes worth retrying, and those that mean "slow down"
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+THROTTLE_STATUS_CODES = {429, 529}
+
+# Length of the sliding window used for requests and tokens per minute
+WINDOW_SECONDS = 60.0
+
+
+def _parse_reset(value):
+    """Parse an RFC 3339 rate-limit reset header into a UNIX timestamp"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone(timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+
+def _header_int(headers, name):
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _retry_after(error):
+    """Return the server-suggested retry delay of an API error, in seconds"""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    value = response.headers.get('retry-after')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, initial_concurrency=DEFAULT_INITIAL_CONCURRENCY, min_concurrency=DEFAULT_MIN_CONCURRENCY,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, requests_per_minute=None, tokens_per_minute=None,
+                 max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                 call_timeout=DEFAULT_CALL_TIMEOUT, increase_every=DEFAULT_INCREASE_EVERY):
+        """
+        Shared limiter for Claude calls with adaptive concurrency and retries
+
+        Concurrency follows AIMD: it grows by one after every `increase_every`
+        successful calls and halves on 429/529 responses. Requests and tokens
+        per minute are tracked locally and tightened by the API's rate-limit
+        headers. Retries use exponential backoff with full jitter and honor
+        retry-after.
+
+        Args:
+            initial_concurrency (int): Calls allowed in flight at the start
+            min_concurrency (int): Lower bound of the concurrency limit
+            max_concurrency (int): Upper bound of the concurrency limit
+            requests_per_minute (int, optional): Local request budget, learned from headers when None
+            tokens_per_minute (int, optional): Local token budget, learned from headers when None
+            max_retries (int): Retries before giving up on a call
+            base_delay (float): First backoff delay in seconds
+            max_delay (float): Largest backoff delay in seconds
+            call_timeout (float): Timeout of each individual call in seconds
+            increase_every (int): Successful calls per additive concurrency increase
+        """
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.concurrency = max(min_concurrency, min(initial_concurrency, max_concurrency))
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.call_timeout = call_timeout
+        self.increase_every = increase_every
+
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._successes_since_change = 0
+        self._paused_until = 0.0
+        self._request_times = deque()
+        self._token_events = deque()
+        self._window_tokens = 0
+        self._server_requests_remaining = None
+        self._server_requests_reset = None
+        self._server_tokens_remaining = None
+        self._server_tokens_reset = None
+
+        self._metrics = {
+            'calls': 0,
+            'successes': 0,
+            'retries': 0,
+            'throttled_responses': 0,
+            'timeouts': 0,
+            'failures': 0,
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'throttle_wait_seconds': 0.0,
+            'concurrency_wait_seconds': 0.0
+        }
+
+    def _prune_window(self, now):
+        while self._request_times and now - self._request_times[0] > WINDOW_SECONDS:
+            self._request_times.popleft()
+        while self._token_events and now - self._token_events[0][0] > WINDOW_SECONDS:
+            self._window_tokens -= self._token_events.popleft()[1]
+
+    def _budget_delay(self, now, estimated_tokens):
+        """Seconds to wait before the request and token budgets allow another call"""
+        delay = max(0.0, self._paused_until - now)
+
+        if self.requests_per_minute and len(self._request_times) >= self.requests_per_minute:
+            delay = max(delay, self._request_times[0] + WINDOW_SECONDS - now)
+        if self.tokens_per_minute and self._token_events and \
+                self._window_tokens + estimated_tokens > self.tokens_per_minute:
+            delay = max(delay, self._token_events[0][0] + WINDOW_SECONDS - now)
+
+        if self._server_requests_remaining is not None and self._server_requests_remaining <= 0 \
+                and self._server_requests_reset:
+            delay = max(delay, self._server_requests_reset - now)
+        if self._server_tokens_remaining is not None and self._server_tokens_remaining < estimated_tokens \
+                and self._server_tokens_reset:
+            delay = max(delay, self._server_tokens_reset - now)
+        return delay
+
+    def _acquire(self, estimated_tokens):
+        """Block until a concurrency slot and enough request/token budget are available"""
+        with self._condition:
+            while True:
+                now = time.time()
+                self._prune_window(now)
+                if self._in_flight >= self.concurrency:
+                    started = time.time()
+                    self._condition.wait(timeout=1.0)
+                    self._metrics['concurrency_wait_seconds'] += time.time() - started
+                    continue
+
+                delay = self._budget_delay(now, estimated_tokens)
+                if delay > 0:
+                    self._condition.wait(timeout=min(delay, 1.0))
+                    self._metrics['throttle_wait_seconds'] += time.time() - now
+                    continue
+
+                self._in_flight += 1
+                self._request_times.append(now)
+                self._metrics['calls'] += 1
+                return
+
+    def _release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def _record_headers(self, headers):
+        """Update budgets from the API's rate-limit response headers"""
+        with self._condition:
+            requests_limit = _header_int(headers, 'anthropic-ratelimit-requests-limit')
+            tokens_limit = _header_int(headers, 'anthropic-ratelimit-tokens-limit')
+            if requests_limit:
+                self.requests_per_minute = requests_limit
+            if tokens_limit:
+                self.tokens_per_minute = tokens_limit
+
+            requests_remaining = _header_int(headers, 'anthropic-ratelimit-requests-remaining')
+            if requests_remaining is not None:
+                self._server_requests_remaining = requests_remaining
+                self._server_requests_reset = _parse_reset(headers.get('anthropic-ratelimit-requests-reset'))
+            tokens_remaining = _header_int(headers, 'anthropic-ratelimit-tokens-remaining')
+            if tokens_remaining is not None:
+                self._server_tokens_remaining = tokens_remaining
+                self._server_tokens_reset = _parse_reset(headers.get('anthropic-ratelimit-tokens-reset'))
+
+    def _record_success(self, usage):
+        with self._condition:
+            self._metrics['successes'] += 1
+            if usage is not None:
+                input_tokens = getattr(usage, 'input_tokens', 0) or 0
+                output_tokens = getattr(usage, 'output_tokens', 0) or 0
+                self._metrics['input_tokens'] += input_tokens
+                self._metrics['output_tokens'] += output_tokens
+                self._token_events.append((time.time(), input_tokens + output_tokens))
+                self._window_tokens += input_tokens + output_tokens
+
+            # Additive increase
+            self._successes_since_change += 1
+            if self._successes_since_change >= self.increase_every and self.concurrency < self.max_concurrency:
+                self.concurrency += 1
+                self._successes_since_change = 0
+                self._condition.notify_all()
+
+    def _record_throttle(self, delay):
+        """Multiplicative decrease and a shared pause after a 429/529 response"""
+        with self._condition:
+            self._metrics['throttled_responses'] += 1
+            new_concurrency = max(self.min_concurrency, self.concurrency // 2)
+            if new_concurrency != self.concurrency:
+                logger.info(f"Throttled by the API, reducing concurrency from {self.concurrency} to {new_concurrency}")
+            self.concurrency = new_concurrency
+            self._successes_since_change = 0
+            self._paused_until = max(self._paused_until, time.time() + delay)
+
+    def _backoff_delay(self, attempt, retry_after=None):
+        """Exponential backoff with full jitter, never shorter than retry-after"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    @staticmethod
+    def _status_code(error):
+        return getattr(error, 'status_code', None)
+
+    def _is_retryable(self, error):
+        if isinstance(error, (anthropic.APITimeoutError, anthropic.APIConnectionError)):
+            return True
+        return self._status_code(error) in RETRYABLE_STATUS_CODES
+
+    def call(self, request_fn, estimated_tokens=0):
+        """
+        Run one Claude call under the limiter, retrying transient failures
+
+        Args:
+            request_fn (callable): Called as request_fn(timeout) and returning a raw
+                response (from `.with_raw_response`) with headers and parse()
+            estimated_tokens (int): Expected token usage, used for the token budget
+
+        Returns:
+            object: The parsed response
+
+        Raises:
+            Exception: The last error once retries are exhausted, or any non-retryable error
+        """
+        for attempt in range(self.max_retries + 1):
+            self._acquire(estimated_tokens)
+            try:
+                raw_response = request_fn(self.call_timeout)
+            except Exception as e:
+                self._release()
+                if isinstance(e, anthropic.APITimeoutError):
+                    with self._condition:
+                        self._metrics['timeouts'] += 1
+                if not self._is_retryable(e) or attempt == self.max_retries:
+                    with self._condition:
+                        self._metrics['failures'] += 1
+                    raise
+
+                delay = self._backoff_delay(attempt, _retry_after(e))
+                if self._status_code(e) in THROTTLE_STATUS_CODES:
+                    self._record_throttle(delay)
+                with self._condition:
+                    self._metrics['retries'] += 1
+                    self._metrics['throttle_wait_seconds'] += delay
+                logger.debug(f"Retrying Claude call in {delay:.1f}s after: {e}")
+                time.sleep(delay)
+                continue
+
+            self._release()
+            self._record_headers(raw_response.headers)
+            response = raw_response.parse()
+            self._record_success(getattr(response, 'usage', None))
+            return response
+
+    def metrics(self):
+        """
+        Return counters describing the limiter's behavior so far
+
+        Returns:
+            dict: Call, retry, throttle and token counters, time spent waiting, and the current limits
+        """
+        with self._condition:
+            metrics = dict(self._metrics)
+            metrics['concurrency'] = self.concurrency
+            metrics['requests_per_minute'] = self.requests_per_minute
+            metrics['tokens_per_minute'] = self.tokens_per_minute
+        return metrics
+
+    def reset_metrics(self):
+        """Reset the counters, keeping the learned limits"""
+        with self._condition:
+            for name in self._metrics:
+                self._metrics[name] = 0.0 if isinstance(self._metrics[name], float) else 0
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(api_key):
+    """
+    Return the shared limiter for an API key
+
+    Rate limits apply per key, so every caller using the same key shares one limiter.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(api_key)
+        if limiter is None:
+            limiter = AdaptiveRateLimiter()
+            _limiters[api_key] = limiter
+        return limiter
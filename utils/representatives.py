@@ -0,0 +1,158 @@
+import re
+import time
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("Representatives")
+
+# Words kept as features, the ones found in the most reviews
+MAX_VOCABULARY = 20000
+
+# Dimensions the TF-IDF vectors are randomly projected to before clustering, and the
+# dimensions every word contributes to
+EMBEDDING_DIMENSIONS = 128
+PROJECTION_NONZEROS = 4
+
+# Mini-batch k-means schedule
+KMEANS_BATCH_SIZE = 2048
+KMEANS_ITERATIONS = 60
+
+# Rows compared against the cluster centers at once, bounds the memory of large categories
+ASSIGNMENT_CHUNK_SIZE = 8192
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def _embed(texts, seed):
+    """
+    Turn normalized texts into L2-normalized TF-IDF vectors under a sparse random projection
+
+    Every word adds its weight to PROJECTION_NONZEROS random dimensions with random signs,
+    which keeps the cosine similarities of the TF-IDF vectors approximately intact.
+
+    Returns:
+        np.ndarray: Array of shape (len(texts), EMBEDDING_DIMENSIONS)
+    """
+    tokens = [text.split() for text in texts]
+    lengths = np.fromiter((len(row_tokens) for row_tokens in tokens), dtype=np.int64, count=len(tokens))
+    embeddings = np.zeros((len(texts), EMBEDDING_DIMENSIONS), dtype=np.float32)
+    if not lengths.sum():
+        return embeddings
+    all_tokens = np.fromiter((token for row_tokens in tokens for token in row_tokens), dtype=object, count=lengths.sum())
+    token_ids, vocabulary = pd.factorize(all_tokens)
+
+    # Term counts per (row, word) pair
+    rows = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+    pairs, term_counts = np.unique(rows * len(vocabulary) + token_ids, return_counts=True)
+    rows, columns = pairs // len(vocabulary), pairs % len(vocabulary)
+    document_frequency = np.bincount(columns, minlength=len(vocabulary))
+
+    # Keep the most common words, ties broken by first appearance
+    kept = np.argsort(-document_frequency, kind="stable")[:MAX_VOCABULARY]
+    feature_index = np.full(len(vocabulary), -1, dtype=np.int64)
+    feature_index[kept] = np.arange(len(kept))
+    columns = feature_index[columns]
+    keep = columns >= 0
+    rows, columns, term_counts = rows[keep], columns[keep], term_counts[keep]
+
+    idf = np.log((1 + len(texts)) / (1 + document_frequency[kept])) + 1
+    weights = (1 + np.log(term_counts)) * idf[columns]
+
+    rng = np.random.RandomState(seed)
+    dimensions = rng.randint(0, EMBEDDING_DIMENSIONS, size=(len(kept), PROJECTION_NONZEROS))
+    signs = rng.choice([-1.0, 1.0], size=(len(kept), PROJECTION_NONZEROS))
+    cells = (rows[:, None] * EMBEDDING_DIMENSIONS + dimensions[columns]).ravel()
+    embeddings = np.bincount(cells, weights=(weights[:, None] * signs[columns]).ravel(),
+                             minlength=len(texts) * EMBEDDING_DIMENSIONS)
+    embeddings = embeddings.reshape(len(texts), EMBEDDING_DIMENSIONS).astype(np.float32)
+
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def _assign(embeddings, centers):
+    """Return the most similar center of every row and the cosine similarity to it"""
+    labels = np.empty(len(embeddings), dtype=np.int64)
+    similarities = np.empty(len(embeddings), dtype=np.float32)
+    for start in range(0, len(embeddings), ASSIGNMENT_CHUNK_SIZE):
+        scores = embeddings[start:start + ASSIGNMENT_CHUNK_SIZE] @ centers.T
+        labels[start:start + len(scores)] = scores.argmax(axis=1)
+        similarities[start:start + len(scores)] = scores[np.arange(len(scores)), labels[start:start + len(scores)]]
+    return labels, similarities
+
+
+def _minibatch_kmeans(embeddings, weights, clusters, seed):
+    """
+    Spherical mini-batch k-means, with points sampled in proportion to their weight
+
+    Returns:
+        np.ndarray: Cluster centers of shape (clusters, EMBEDDING_DIMENSIONS)
+    """
+    rng = np.random.RandomState(seed)
+    probabilities = weights / weights.sum()
+    centers = embeddings[rng.choice(len(embeddings), size=clusters, replace=False, p=probabilities)].copy()
+    center_counts = np.zeros(clusters, dtype=np.float64)
+    batch_size = min(KMEANS_BATCH_SIZE, len(embeddings))
+    for _ in range(KMEANS_ITERATIONS):
+        batch = embeddings[rng.choice(len(embeddings), size=batch_size, p=probabilities)]
+        labels, _ = _assign(batch, centers)
+        # Per-center learning rate of 1 / points seen, applied to the batch mean
+        batch_counts = np.bincount(labels, minlength=clusters)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, batch)
+        updated = batch_counts > 0
+        center_counts[updated] += batch_counts[updated]
+        rate = (batch_counts[updated] / center_counts[updated])[:, None].astype(np.float32)
+        centers[updated] += rate * (sums[updated] / batch_counts[updated, None] - centers[updated])
+        centers /= np.maximum(np.linalg.norm(centers, axis=1, keepdims=True), 1e-12)
+    return centers
+
+
+def select_representatives(texts, max_representatives, seed=0):
+    """
+    Pick one review per cluster of similar reviews, weighted by the cluster's size
+
+    Reviews with the same words, ignoring case and punctuation, are merged first. If more
+    distinct reviews remain than max_representatives, they are embedded as projected TF-IDF
+    vectors, clustered with mini-batch k-means, and the review closest to each cluster center
+    stands for the whole cluster. Everything is seeded, so the same reviews give the same selection.
+
+    Args:
+        texts (list): Review texts
+        max_representatives (int): Reviews to return at most
+        seed (int): Seed of the projection and the clustering
+
+    Returns:
+        list: (text, count) tuples, count being the number of reviews the text stands for,
+            largest clusters first
+    """
+    started = time.time()
+    groups = {}
+    for text in texts:
+        key = " ".join(_TOKEN_PATTERN.findall(str(text).casefold()))
+        if key in groups:
+            groups[key][1] += 1
+        else:
+            groups[key] = [text, 1]
+    keys = sorted(groups)
+    counts = np.asarray([groups[key][1] for key in keys], dtype=np.float64)
+
+    if len(keys) <= max_representatives:
+        order = np.argsort(-counts, kind="stable")
+        return [(groups[keys[index]][0], int(counts[index])) for index in order]
+
+    embeddings = _embed(keys, seed)
+    centers = _minibatch_kmeans(embeddings, counts, max(1, max_representatives), seed)
+    labels, similarities = _assign(embeddings, centers)
+
+    # The member most similar to its center represents each non-empty cluster
+    order = np.lexsort((-similarities, labels))
+    first = np.concatenate(([True], labels[order][1:] != labels[order][:-1]))
+    representatives = order[first]
+    cluster_sizes = np.bincount(labels, weights=counts)[labels[representatives]]
+    ranking = np.argsort(-cluster_sizes, kind="stable")
+    logger.info(f"Selected {len(representatives)} representatives of {len(texts)} reviews "
+                f"({len(keys)} distinct) in {time.time() - started:.1f}s")
+    return [(groups[keys[representatives[index]]][0], int(cluster_sizes[index])) for index in ranking]
@@ -0,0 +1,424 @@
+import os
+import time
+import uuid
+import hashlib
+import logging
+import argparse
+import threading
+from urllib.parse import quote
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("ReviewStore")
+
+# Root directory of the stores, override with REVIEW_STORE_PATH
+DEFAULT_REVIEW_STORE_PATH = os.environ.get("REVIEW_STORE_PATH", os.path.join(".review_store"))
+
+# Datasets kept under the root: raw reviews and their latest analysis
+REVIEWS = "reviews"
+ANALYZED = "analyzed"
+
+# Columns holding a review's own ID, its company and its date, scraped names first
+ID_COLUMNS = ('Review Id', 'review_id')
+COMPANY_COLUMNS = ('company_name', 'company', 'Company', 'Company Name')
+DATE_COLUMNS = ('Review Date time', 'review_datetime', 'datetime')
+
+# Columns that change between scrapes of the same review and are left out of derived keys
+VOLATILE_COLUMNS = ('scraped_at',)
+
+# Stored next to the review columns
+KEY_COLUMN = 'review_key'
+WRITTEN_COLUMN = '_written_at'
+REVIEWED_COLUMN = '_reviewed_at'
+
+# Partition fields, from the <company>/<source>/<month> directory layout
+PARTITION_FIELDS = ('_company', '_source', '_month')
+
+# Source of rows without a 'source' column, e.g. uploaded files
+DEFAULT_SOURCE = "Upload"
+UNKNOWN_COMPANY = "Unknown"
+UNKNOWN_MONTH = "unknown"
+
+
+def _first_column(df, candidates):
+    return next((column for column in candidates if column in df.columns), None)
+
+
+def _is_missing(value):
+    if value is None:
+        return True
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):
+        # Lists and other containers
+        return False
+
+
+def _derived_key(row, columns):
+    text = "\x1f".join("" if _is_missing(row[column]) else str(row[column]) for column in columns)
+    return "derived_" + hashlib.sha1(text.encode("utf-8")).hexdigest()[:24]
+
+
+def review_keys(df):
+    """
+    Return the store key of every review
+
+    The review's own ID is used when it has one. Rows without an ID, e.g. from
+    uploaded files, are keyed by a hash of their stable columns, so uploading the
+    same file again does not duplicate them.
+
+    Args:
+        df (pd.DataFrame): The reviews
+
+    Returns:
+        pd.Series: One key per row
+    """
+    if KEY_COLUMN in df.columns:
+        keys = df[KEY_COLUMN].astype("string")
+    else:
+        keys = pd.Series(pd.NA, index=df.index, dtype="string")
+    id_column = _first_column(df, ID_COLUMNS)
+    if id_column is not None:
+        ids = df[id_column].astype("string").str.strip().replace("", pd.NA)
+        keys = keys.fillna(ids)
+
+    missing = keys.isna()
+    if missing.any():
+        columns = sorted(column for column in df.columns
+                         if column not in VOLATILE_COLUMNS and column not in (KEY_COLUMN, WRITTEN_COLUMN))
+        derived = [_derived_key(row, columns) for _, row in df.loc[missing].iterrows()]
+        keys = keys.fillna(pd.Series(derived, index=df.index[missing], dtype="string"))
+    return keys
+
+
+def _normalize_column(series, is_date):
+    """Convert a column to a type that stays the same from one write to the next"""
+    if is_date:
+        # Stored as naive UTC, like the scrapers' own dates and what Excel exports accept
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return pd.to_datetime(series, utc=True).dt.tz_convert(None)
+        # Scrapers and uploads mix date formats, sometimes within one column
+        return pd.to_datetime(series, errors="coerce", utc=True, format="mixed").dt.tz_convert(None)
+    if pd.api.types.is_bool_dtype(series):
+        return series
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype("float64")
+    return series.map(lambda value: None if _is_missing(value) else str(value)).astype("string")
+
+
+def _quote(value):
+    return quote(str(value), safe="")
+
+
+def _to_utc(value):
+    timestamp = pd.Timestamp(value)
+    return timestamp if timestamp.tzinfo is None else timestamp.tz_convert("UTC").tz_localize(None)
+
+
+def _unified_schema(schemas):
+    """Combine file schemas, reading a column that was numeric in one write and text in another as text"""
+    types = {}
+    for schema in schemas:
+        for field in schema:
+            if pa.types.is_null(field.type):
+                types.setdefault(field.name, None)
+            elif types.get(field.name) is None:
+                types[field.name] = field.type
+            elif types[field.name] != field.type:
+                types[field.name] = pa.string()
+    return pa.schema([(name, field_type or pa.string()) for name, field_type in types.items()])
+
+
+class ReviewStore:
+    def __init__(self, root=None, dataset=REVIEWS):
+        """
+        Persistent review table, stored as Parquet files partitioned by company, source and month
+
+        Every write adds new files and a review written again replaces its earlier
+        version, matched on its key (see review_keys). Reads keep the latest version
+        of every review, and compact() rewrites partitions to drop the old versions.
+
+        Args:
+            root (str, optional): Root directory shared by all datasets
+            dataset (str): REVIEWS or ANALYZED
+        """
+        if not PYARROW_AVAILABLE:
+            raise ImportError("The review store requires pyarrow, install it with 'pip install pyarrow'")
+        self.root = root or DEFAULT_REVIEW_STORE_PATH
+        self.path = os.path.join(self.root, dataset)
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._schemas = {}
+        self._partitioning = ds.DirectoryPartitioning(
+            pa.schema([(field, pa.string()) for field in PARTITION_FIELDS]), segment_encoding="uri"
+        )
+
+    def _prepare(self, df, source=None, company_name=None):
+        """Add the key, partition and write-time columns and normalize the column types"""
+        prepared = df.copy()
+        date_column = _first_column(prepared, DATE_COLUMNS)
+        for column in prepared.columns:
+            prepared[column] = _normalize_column(prepared[column], is_date=column in DATE_COLUMNS)
+        prepared[KEY_COLUMN] = review_keys(prepared)
+        prepared[WRITTEN_COLUMN] = time.time_ns()
+        if date_column is not None:
+            prepared[REVIEWED_COLUMN] = prepared[date_column]
+        else:
+            prepared[REVIEWED_COLUMN] = pd.Series(pd.NaT, index=prepared.index, dtype="datetime64[ns]")
+
+        company_column = _first_column(prepared, COMPANY_COLUMNS)
+        companies = prepared[company_column] if company_column else pd.Series(pd.NA, index=prepared.index)
+        prepared['_company'] = companies.fillna(company_name or UNKNOWN_COMPANY).replace("", company_name or UNKNOWN_COMPANY)
+        sources = prepared['source'] if 'source' in prepared.columns else pd.Series(pd.NA, index=prepared.index)
+        prepared['_source'] = sources.fillna(source or DEFAULT_SOURCE).replace("", source or DEFAULT_SOURCE)
+        prepared['_month'] = prepared[REVIEWED_COLUMN].dt.strftime("%Y-%m").fillna(UNKNOWN_MONTH)
+
+        # A review written twice in one call keeps its last row
+        return prepared.drop_duplicates(subset=[KEY_COLUMN], keep="last")
+
+    def _partition_dir(self, company, source, month):
+        return os.path.join(self.path, _quote(company), _quote(source), _quote(month))
+
+    def _write_file(self, directory, table, suffix=""):
+        """Write a Parquet file that readers only see once it is complete"""
+        os.makedirs(directory, exist_ok=True)
+        name = f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}{suffix}.parquet"
+        temporary = os.path.join(directory, "." + name)
+        pq.write_table(table, temporary)
+        os.replace(temporary, os.path.join(directory, name))
+
+    def upsert(self, df, source=None, company_name=None, count_existing=True):
+        """
+        Add reviews, replacing earlier versions of the same reviews
+
+        Args:
+            df (pd.DataFrame): Reviews in the scraped or uploaded column layout
+            source (str, optional): Source of rows without a 'source' column
+            company_name (str, optional): Company of rows without a company column
+            count_existing (bool): Tell new and updated reviews apart, which reads the keys
+                already stored in the written partitions
+
+        Returns:
+            dict: 'written', 'inserted' and 'updated' review counts, the last two None
+                without count_existing
+        """
+        if df is None or df.empty:
+            return {'written': 0, 'inserted': 0, 'updated': 0}
+        prepared = self._prepare(df, source=source, company_name=company_name)
+
+        inserted = updated = 0
+        for (company, review_source, month), partition in prepared.groupby(list(PARTITION_FIELDS), sort=False):
+            if count_existing:
+                is_update = partition[KEY_COLUMN].isin(self._partition_keys(company, review_source, month))
+                updated += int(is_update.sum())
+                inserted += int((~is_update).sum())
+            table = pa.Table.from_pandas(partition.drop(columns=list(PARTITION_FIELDS)), preserve_index=False)
+            self._write_file(self._partition_dir(company, review_source, month), table)
+
+        if not count_existing:
+            logger.debug(f"Stored {len(prepared)} reviews in {self.path}")
+            return {'written': len(prepared), 'inserted': None, 'updated': None}
+        logger.info(f"Stored {inserted} new and {updated} updated reviews in {self.path}")
+        return {'written': len(prepared), 'inserted': inserted, 'updated': updated}
+
+    def _partition_keys(self, company, source, month):
+        directory = self._partition_dir(company, source, month)
+        if not os.path.isdir(directory):
+            return set()
+        keys = set()
+        for path in self._partition_files(directory):
+            keys.update(pq.read_table(path, columns=[KEY_COLUMN]).column(KEY_COLUMN).to_pylist())
+        return keys
+
+    @staticmethod
+    def _partition_files(directory):
+        return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                      if name.endswith(".parquet") and not name.startswith((".", "_")))
+
+    def _file_schema(self, path):
+        # Files are never modified after they are written, so their schemas can be cached
+        if path not in self._schemas:
+            self._schemas[path] = pq.read_schema(path)
+        return self._schemas[path]
+
+    def _dataset(self):
+        """Open every file as one dataset, with the columns of all of them"""
+        files = ds.dataset(self.path, format="parquet", partitioning=self._partitioning).files
+        if not files:
+            return None
+
+        schema = _unified_schema(self._file_schema(path) for path in files)
+        for field in PARTITION_FIELDS:
+            schema = schema.append(pa.field(field, pa.string()))
+        return ds.dataset(files, schema=schema, format="parquet", partitioning=self._partitioning,
+                          partition_base_dir=self.path)
+
+    @staticmethod
+    def _filter(companies=None, sources=None, since=None, until=None, written_since=None):
+        expression = None
+
+        def add(condition):
+            nonlocal expression
+            expression = condition if expression is None else expression & condition
+
+        if companies:
+            add(ds.field('_company').isin(list(companies)))
+        if sources:
+            add(ds.field('_source').isin(list(sources)))
+        if since is not None:
+            since = _to_utc(since)
+            # The month directories prune whole partitions, the review date the remaining rows
+            add(ds.field('_month') >= since.strftime("%Y-%m"))
+            add(ds.field(REVIEWED_COLUMN) >= pa.scalar(since.to_pydatetime()))
+        if until is not None:
+            until = _to_utc(until)
+            add(ds.field('_month') <= until.strftime("%Y-%m"))
+            add(ds.field(REVIEWED_COLUMN) < pa.scalar(until.to_pydatetime()))
+        if written_since is not None:
+            add(ds.field(WRITTEN_COLUMN) >= int(written_since))
+        return expression
+
+    def read(self, companies=None, sources=None, since=None, until=None, written_since=None, columns=None):
+        """
+        Read the latest version of the stored reviews
+
+        Company, source and month filters skip whole partitions, the others are
+        pushed down to the Parquet row groups.
+
+        Args:
+            companies (list, optional): Only these companies
+            sources (list, optional): Only these sources, e.g. ['Trustpilot']
+            since (datetime or str, optional): Only reviews posted at or after this time
+            until (datetime or str, optional): Only reviews posted before this time
+            written_since (int, optional): Only reviews stored at or after this time.time_ns()
+            columns (list, optional): Only these columns, plus the review key
+
+        Returns:
+            pd.DataFrame: The matching reviews, with their 'review_key'
+        """
+        expression = self._filter(companies, sources, since, until, written_since)
+
+        for attempt in range(2):
+            dataset = self._dataset()
+            if dataset is None:
+                return pd.DataFrame()
+            read_columns = None
+            if columns is not None:
+                read_columns = [column for column in dict.fromkeys(list(columns) + [KEY_COLUMN, WRITTEN_COLUMN])
+                                if column in dataset.schema.names]
+            try:
+                table = dataset.to_table(columns=read_columns, filter=expression)
+                break
+            except FileNotFoundError:
+                # A compaction removed files after they were listed
+                if attempt:
+                    raise
+                logger.info("Store changed while reading, retrying")
+
+        df = table.to_pandas()
+        if df.empty:
+            return pd.DataFrame()
+        df = df.sort_values(WRITTEN_COLUMN, kind="stable").drop_duplicates(subset=[KEY_COLUMN], keep="last")
+        df = df.drop(columns=[column for column in (WRITTEN_COLUMN, REVIEWED_COLUMN) + PARTITION_FIELDS
+                              if column in df.columns])
+        # Columns that only other companies or sources have
+        empty_columns = [column for column in df.columns if column != KEY_COLUMN and df[column].isna().all()]
+        return df.drop(columns=empty_columns).reset_index(drop=True)
+
+    def partitions(self):
+        """
+        Describe every partition
+
+        Returns:
+            list: Dicts with company, source, month and files
+        """
+        dataset = self._dataset()
+        if dataset is None:
+            return []
+        counts = {}
+        for fragment in dataset.get_fragments():
+            values = ds.get_partition_keys(fragment.partition_expression)
+            key = tuple(values.get(field) for field in PARTITION_FIELDS)
+            counts[key] = counts.get(key, 0) + 1
+        return [{'company': company, 'source': source, 'month': month, 'files': files}
+                for (company, source, month), files in sorted(counts.items())]
+
+    def compact(self, min_files=2, companies=None, sources=None):
+        """
+        Rewrite every partition with at least `min_files` files into one file holding
+        only the latest version of each review
+
+        Files written while a partition is compacted are left alone, and their newer
+        rows still take precedence when reading.
+
+        Args:
+            min_files (int): Skip partitions with fewer files
+            companies (list, optional): Only partitions of these companies
+            sources (list, optional): Only partitions of these sources
+
+        Returns:
+            dict: 'partitions' rewritten, 'files_removed' and 'rows_dropped'
+        """
+        stats = {'partitions': 0, 'files_removed': 0, 'rows_dropped': 0}
+        with self._lock:
+            for partition in self.partitions():
+                if partition['files'] < min_files:
+                    continue
+                if companies and partition['company'] not in companies:
+                    continue
+                if sources and partition['source'] not in sources:
+                    continue
+                directory = self._partition_dir(partition['company'], partition['source'], partition['month'])
+                files = self._partition_files(directory)
+                schema = _unified_schema(self._file_schema(path) for path in files)
+                df = ds.dataset(files, schema=schema, format="parquet").to_table().to_pandas()
+                latest = df.sort_values(WRITTEN_COLUMN, kind="stable").drop_duplicates(subset=[KEY_COLUMN], keep="last")
+                self._write_file(directory, pa.Table.from_pandas(latest, preserve_index=False), suffix="-compacted")
+                for path in files:
+                    os.remove(path)
+                    self._schemas.pop(path, None)
+                stats['partitions'] += 1
+                stats['files_removed'] += len(files)
+                stats['rows_dropped'] += len(df) - len(latest)
+        logger.info(f"Compacted {stats['partitions']} partitions, removed {stats['files_removed']} files "
+                    f"and {stats['rows_dropped']} old review versions")
+        return stats
+
+
+_default_stores = {}
+_default_stores_lock = threading.Lock()
+
+
+def get_review_store(dataset=REVIEWS):
+    """Return the process-wide store of a dataset"""
+    with _default_stores_lock:
+        if dataset not in _default_stores:
+            _default_stores[dataset] = ReviewStore(dataset=dataset)
+        return _default_stores[dataset]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or compact the review store")
+    parser.add_argument("--dataset", choices=[REVIEWS, ANALYZED], default=REVIEWS)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="Show every partition")
+    compact_parser = subparsers.add_parser("compact", help="Merge each partition into one file without old versions")
+    compact_parser.add_argument("--min-files", type=int, default=2, help="Only partitions with at least this many files")
+
+    args = parser.parse_args()
+    store = ReviewStore(dataset=args.dataset)
+    if args.command == "list":
+        for partition in store.partitions():
+            print(f"{partition['company']:<30} {partition['source']:<18} {partition['month']:<8} {partition['files']} files")
+    else:
+        print(store.compact(min_files=args.min_files))
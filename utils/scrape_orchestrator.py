@@ -0,0 +1,208 @@
+import time
+import logging
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+from utils.google_play_scraper import scrape_google_play_reviews
+from utils.trustpilot_scraper import scrape_trustpilot_reviews
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("ScrapeOrchestrator")
+
+# Crawls running at the same time across all hosts
+DEFAULT_SCRAPE_WORKERS = 4
+
+# Crawls allowed against one host at the same time. Each crawl only waits between its
+# own pages and there is no delay shared across crawls, so a site sees one request per
+# crawl delay only while each host gets a single crawl. Raise a host's limit here only
+# when it is known to tolerate that many times the request rate.
+DEFAULT_HOST_LIMIT = 1
+HOST_LIMITS = {}
+
+# Seconds between aggregate progress reports while waiting for crawls
+PROGRESS_POLL_INTERVAL = 1.0
+
+GOOGLE_PLAY = 'Google Play Store'
+TRUSTPILOT = 'Trustpilot'
+
+
+def source_host(source, target):
+    """Return the host a crawl sends its requests to"""
+    if source == GOOGLE_PLAY:
+        return "play.google.com"
+    return urlparse(target).netloc.lower() or target
+
+
+class HostPoliteness:
+    def __init__(self, limits=None, default_limit=DEFAULT_HOST_LIMIT):
+        """
+        Per-host limits on concurrent crawls
+
+        Args:
+            limits (dict, optional): Host to maximum concurrent crawls
+            default_limit (int): Limit of hosts not listed in `limits`
+        """
+        self.limits = dict(HOST_LIMITS if limits is None else limits)
+        self.default_limit = default_limit
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, host):
+        """Take a crawl slot on a host if one is free, without waiting"""
+        with self._lock:
+            if self._active.get(host, 0) >= max(1, self.limits.get(host, self.default_limit)):
+                return False
+            self._active[host] = self._active.get(host, 0) + 1
+            return True
+
+    def release(self, host):
+        with self._lock:
+            self._active[host] = max(0, self._active.get(host, 0) - 1)
+
+
+class ScrapeOrchestrator:
+    def __init__(self, sources, max_workers=DEFAULT_SCRAPE_WORKERS, politeness=None, deadline=None,
+                 scrape_options=None, scrape_fns=None):
+        """
+        Run independent (company, source) crawls concurrently
+
+        Args:
+            sources (list): (source, company_name, target, max_reviews) tuples, see pipeline.scraping_sources
+            max_workers (int): Crawls running at the same time
+            politeness (HostPoliteness, optional): Per-host concurrency limits
+            deadline (float, optional): Seconds after which running crawls stop with what they
+                collected and crawls that did not start yet are skipped
+            scrape_options (dict, optional): Extra arguments for every scrape function, e.g. watermarks
+            scrape_fns (dict, optional): Source name to scrape function, mainly for testing
+        """
+        self.sources = list(sources)
+        self.max_workers = max(1, max_workers)
+        self.politeness = politeness or HostPoliteness()
+        self.deadline = deadline
+        self.scrape_options = dict(scrape_options or {})
+        self.scrape_fns = scrape_fns or {
+            GOOGLE_PLAY: lambda target, **kwargs: scrape_google_play_reviews(app_id=target, **kwargs),
+            TRUSTPILOT: lambda target, **kwargs: scrape_trustpilot_reviews(company_url=target, **kwargs)
+        }
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.status = [
+            {'source': source, 'company_name': company_name, 'state': "waiting", 'collected': 0,
+             'total': max_reviews, 'seconds': None}
+            for source, company_name, _, max_reviews in self.sources
+        ]
+
+    def stop(self):
+        """Ask every crawl to stop after its current page"""
+        self._stop.set()
+
+    def _should_stop(self):
+        return self._stop.is_set()
+
+    def _set_status(self, index, **fields):
+        with self._lock:
+            self.status[index].update(fields)
+
+    def snapshot(self):
+        """
+        Return the state of every crawl
+
+        Returns:
+            list: Dicts with source, company_name, state (waiting, running, done, skipped or failed),
+                collected, total and seconds
+        """
+        with self._lock:
+            return [dict(status) for status in self.status]
+
+    def summary(self):
+        """Describe the aggregate progress in one line"""
+        status = self.snapshot()
+        finished = sum(1 for crawl in status if crawl['state'] in ("done", "skipped", "failed"))
+        running = sum(1 for crawl in status if crawl['state'] == "running")
+        collected = sum(crawl['collected'] for crawl in status)
+        return (f"{finished} of {len(status)} crawls finished, {running} running, "
+                f"{collected} reviews collected")
+
+    def _crawl(self, index, event_callback):
+        source, company_name, target, max_reviews = self.sources[index]
+        started = time.time()
+        self._set_status(index, state="running")
+
+        def on_event(event):
+            self._set_status(index, collected=event['completed'])
+            if event_callback:
+                event_callback(event)
+
+        try:
+            data = self.scrape_fns[source](
+                target, max_reviews=max_reviews, company_name=company_name,
+                progress_callback=on_event, should_stop=self._should_stop, **self.scrape_options
+            )
+        except Exception as e:
+            logger.error(f"{source} crawl for {company_name} failed: {e}")
+            self._set_status(index, state="failed", seconds=time.time() - started)
+            return pd.DataFrame()
+        self._set_status(index, state="done", collected=len(data), seconds=time.time() - started)
+        logger.info(f"Collected {len(data)} {source} reviews for {company_name} in {time.time() - started:.1f}s")
+        return data
+
+    def run(self, progress_callback=None, event_callback=None):
+        """
+        Run every crawl and combine the results
+
+        Args:
+            progress_callback (callable, optional): Called as progress_callback(finished, total, message)
+                from the calling thread, at least every PROGRESS_POLL_INTERVAL seconds while crawls
+                run. An exception it raises stops every crawl and is re-raised.
+            event_callback (callable, optional): Receives every crawl's progress events, from the
+                crawl threads
+
+        Returns:
+            pd.DataFrame: The reviews of all crawls, in the order of `sources`
+        """
+        results = [None] * len(self.sources)
+        hosts = [source_host(source, target) for source, _, target, _ in self.sources]
+        waiting = list(range(len(self.sources)))
+        running = {}
+        started = time.time()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while waiting or running:
+                if self._stop.is_set():
+                    for index in waiting:
+                        self._set_status(index, state="skipped")
+                    waiting = []
+                # Start every waiting crawl whose host has a free slot, in order
+                for index in list(waiting):
+                    if len(running) >= self.max_workers:
+                        break
+                    if self.politeness.try_acquire(hosts[index]):
+                        waiting.remove(index)
+                        running[executor.submit(self._crawl, index, event_callback)] = index
+                if not running:
+                    continue
+
+                done, _ = wait(running, timeout=PROGRESS_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    self.politeness.release(hosts[index])
+                    results[index] = future.result()
+                if self.deadline is not None and not self._stop.is_set() and time.time() - started >= self.deadline:
+                    logger.warning(f"Scraping deadline of {self.deadline:.0f}s reached, stopping the remaining crawls")
+                    self.stop()
+                if progress_callback:
+                    progress_callback(len(self.sources) - len(waiting) - len(running), len(self.sources), self.summary())
+        except BaseException:
+            self.stop()
+            raise
+        finally:
+            # Stopped crawls finish their current page, so this does not wait long
+            executor.shutdown(wait=True)
+
+        frames = [data for data in results if data is not None and not data.empty]
+        logger.info(f"Scraping finished in {time.time() - started:.1f}s: {self.summary()}")
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
@@ -0,0 +1,170 @@
+import time
+import queue
+import logging
+import threading
+
+import pandas as pd
+
+from utils.analysis_engine import ReviewAnalysisEngine
+from utils.scrape_orchestrator import ScrapeOrchestrator, DEFAULT_SCRAPE_WORKERS, PROGRESS_POLL_INTERVAL
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("StreamingAnalysis")
+
+# Scraped pages waiting for analysis before the crawls wait for it to catch up
+DEFAULT_MAX_QUEUED_BATCHES = 32
+
+# Marks the end of the scraped pages
+_END = object()
+
+
+class StreamingAnalysis:
+    def __init__(self, sources, api_key, engine_options=None, max_workers=DEFAULT_SCRAPE_WORKERS, deadline=None,
+                 scrape_options=None, min_batch_rows=None, max_queued_batches=DEFAULT_MAX_QUEUED_BATCHES):
+        """
+        Analyze scraped reviews while the crawls are still running
+
+        Every crawl hands its pages over as they arrive. The calling thread analyzes
+        whatever has arrived since its previous round, so the wall time approaches the
+        longer of scraping and analysis instead of their sum. Near-duplicate detection
+        only sees the reviews of one round.
+
+        Args:
+            sources (list): (source, company_name, target, max_reviews) tuples, see pipeline.scraping_sources
+            api_key (str): The Anthropic API key
+            engine_options (dict, optional): Extra ReviewAnalysisEngine arguments
+            max_workers (int): Crawls running at the same time
+            deadline (float, optional): Seconds after which the remaining crawls stop
+            scrape_options (dict, optional): Extra arguments for every scrape function, e.g. watermarks
+            min_batch_rows (int, optional): Reviews to wait for before a round while crawls are still
+                running, by default enough to give every analysis worker a request
+            max_queued_batches (int): Pages held for analysis before the crawls wait
+        """
+        self.engine = ReviewAnalysisEngine(api_key=api_key, **dict(engine_options or {}))
+        self.min_batch_rows = min_batch_rows or self.engine.max_workers * self.engine.batch_size
+        self.orchestrator = ScrapeOrchestrator(
+            sources, max_workers=max_workers, deadline=deadline,
+            scrape_options={**(scrape_options or {}), 'batch_callback': self._enqueue}
+        )
+        self._queue = queue.Queue(maxsize=max(1, max_queued_batches))
+        self._stopped = threading.Event()
+        self._scrape_error = None
+        self.scraped = pd.DataFrame()
+        self.errors = []
+        self.stats = {}
+
+    def _enqueue(self, item):
+        # Called from the crawl threads, which wait here while analysis catches up
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=PROGRESS_POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def _scrape(self, event_callback):
+        try:
+            self.scraped = self.orchestrator.run(event_callback=event_callback)
+        except BaseException as e:
+            self._scrape_error = e
+        finally:
+            self._enqueue(_END)
+
+    def run(self, progress_callback=None, event_callback=None, result_callback=None):
+        """
+        Scrape every source and analyze the reviews as they arrive
+
+        Args:
+            progress_callback (callable, optional): Called as progress_callback(analyzed, scraped) from
+                the calling thread, where scraped grows while the crawls run. An exception it raises
+                stops the crawls and is re-raised.
+            event_callback (callable, optional): Receives the crawls' progress events
+            result_callback (callable, optional): Called as result_callback(position, row) for every
+                analyzed row, in the order rows finish
+
+        Returns:
+            list: The analyzed rows, ordered by the round they were analyzed in
+        """
+        started = time.time()
+        scraper = threading.Thread(target=self._scrape, args=(event_callback,), daemon=True)
+        scraper.start()
+
+        results = []
+        pending = []
+        scraped = 0
+        scraping_done = False
+        busy_seconds = 0.0
+        first_result_at = None
+        scraping_finished_at = None
+
+        def add_result(position, row):
+            nonlocal first_result_at
+            if first_result_at is None:
+                first_result_at = time.time()
+            if result_callback:
+                result_callback(offset + position, row)
+
+        try:
+            while True:
+                # Take every page that arrived, waiting briefly when there is nothing to do
+                try:
+                    items = [self._queue.get(timeout=PROGRESS_POLL_INTERVAL)]
+                except queue.Empty:
+                    items = []
+                while True:
+                    try:
+                        items.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                for item in items:
+                    if item is _END:
+                        scraping_done = True
+                        scraping_finished_at = time.time()
+                    else:
+                        pending.extend(item)
+                        scraped += len(item)
+
+                if pending and (scraping_done or len(pending) >= self.min_batch_rows):
+                    batch, pending = pending, []
+                    offset = len(results)
+                    round_started = time.time()
+                    rows = self.engine.analyze_dataframe(
+                        pd.DataFrame(batch),
+                        progress_callback=(lambda completed, total: progress_callback(offset + completed, scraped))
+                        if progress_callback else None,
+                        result_callback=add_result
+                    )
+                    busy_seconds += time.time() - round_started
+                    results.extend(rows)
+                    self.errors.extend(error for error in self.engine.errors if error not in self.errors)
+                elif progress_callback:
+                    progress_callback(len(results), scraped)
+
+                if scraping_done and not pending:
+                    break
+        except BaseException:
+            self._stopped.set()
+            self.orchestrator.stop()
+            raise
+        finally:
+            scraper.join()
+
+        if self._scrape_error is not None:
+            raise self._scrape_error
+
+        elapsed = time.time() - started
+        scrape_seconds = (scraping_finished_at or time.time()) - started
+        self.stats = {
+            'reviews': scraped,
+            'analyzed': len(results),
+            'seconds': elapsed,
+            'scrape_seconds': scrape_seconds,
+            'analysis_seconds': busy_seconds,
+            'first_result_seconds': first_result_at - started if first_result_at else None,
+            # Share of the analysis time that ran while crawls were still collecting
+            'overlap': max(0.0, scrape_seconds + busy_seconds - elapsed) / busy_seconds if busy_seconds else 0.0
+        }
+        logger.info(f"Scraped {scraped} and analyzed {len(results)} reviews in {elapsed:.1f}s "
+                    f"(scraping {scrape_seconds:.1f}s, analysis {busy_seconds:.1f}s)")
+        return results
@@ -0,0 +1,266 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from collections import Counter
+
+logger = logging.getLogger("IssueTaxonomy")
+
+# Location of the taxonomy database, override with REVIEW_TAXONOMY_PATH
+DEFAULT_TAXONOMY_PATH = os.environ.get(
+    "REVIEW_TAXONOMY_PATH", os.path.join(".cache", "issue_taxonomy.sqlite")
+)
+
+# Similarity at or above which a new issue type joins an existing category
+DEFAULT_MERGE_THRESHOLD = 0.6
+
+# Column that keeps the issue type Claude returned once rows use the canonical one
+RAW_ISSUE_TYPE_COLUMN = 'raw_issue_type'
+
+# Phrasings of the same thing, rewritten before comparing
+SYNONYMS = [
+    (re.compile(r"\b(?:sign|log)[\s_-]?(?:in|on)\b|\blogin\b"), "login"),
+    (re.compile(r"\bsign[\s_-]?up\b|\bregistration\b|\bregister\b"), "signup"),
+    (re.compile(r"\bcheck[\s_-]?out\b"), "checkout"),
+    (re.compile(r"\bcustomer (?:service|support|care)\b|\bsupport\b"), "support"),
+    (re.compile(r"\b(?:late|delayed|delays?|slow delivery)\b"), "delay"),
+    (re.compile(r"\b(?:crash(?:es|ed|ing)?|freez(?:e|es|ing)|hangs?)\b"), "crash"),
+    (re.compile(r"\b(?:pricing|prices?|costs?|expensive|overpriced)\b"), "price"),
+    (re.compile(r"\b(?:application|apps)\b"), "app"),
+    (re.compile(r"\b(?:payments?|billing|charges?|charged)\b"), "payment"),
+]
+
+# Words that say nothing about the kind of issue
+GENERIC_WORDS = {
+    "a", "an", "and", "the", "of", "with", "to", "for", "in", "on", "or", "not", "no", "related",
+    "issue", "issues", "problem", "problems", "failure", "failures", "fail", "fails", "failed",
+    "error", "errors", "bug", "bugs", "complaint", "complaints", "concern", "concerns",
+    "trouble", "troubles", "difficulty", "difficulties", "working"
+}
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def _stem(word):
+    """Strip common English suffixes so inflections compare equal"""
+    for suffix in ("ing", "ies", "es", "ed", "s"):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            return word[:-len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+
+def issue_type_words(issue_type):
+    """
+    Return the words that identify an issue type
+
+    Lowercases, rewrites known synonyms, drops generic words like "issue" and stems the rest.
+    Labels made only of generic words keep all of them.
+    """
+    text = str(issue_type or "").casefold()
+    for pattern, replacement in SYNONYMS:
+        text = pattern.sub(replacement, text)
+    words = _WORD_PATTERN.findall(text)
+    specific = [word for word in words if word not in GENERIC_WORDS]
+    return frozenset(_stem(word) for word in (specific or words))
+
+
+def _trigrams(words):
+    text = " ".join(sorted(words))
+    return {text[position:position + 3] for position in range(max(1, len(text) - 2))}
+
+
+def issue_type_similarity(first, second):
+    """
+    Similarity of two issue types between 0 and 1
+
+    The larger of the word overlap (Jaccard) and the character trigram overlap (Dice) of
+    their identifying words, so both reworded and misspelled labels score high.
+    """
+    first_words, second_words = issue_type_words(first), issue_type_words(second)
+    if not first_words or not second_words:
+        return 1.0 if first_words == second_words else 0.0
+    word_overlap = len(first_words & second_words) / len(first_words | second_words)
+    first_trigrams, second_trigrams = _trigrams(first_words), _trigrams(second_words)
+    trigram_overlap = 2 * len(first_trigrams & second_trigrams) / (len(first_trigrams) + len(second_trigrams))
+    return max(word_overlap, trigram_overlap)
+
+
+class IssueTaxonomy:
+    def __init__(self, path=DEFAULT_TAXONOMY_PATH, threshold=DEFAULT_MERGE_THRESHOLD):
+        """
+        Persistent mapping of the issue types Claude returns to a small set of canonical categories
+
+        Args:
+            path (str): Database file path
+            threshold (float): Similarity at or above which a new issue type joins an existing category
+        """
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS issue_types (
+                raw TEXT PRIMARY KEY,
+                canonical TEXT NOT NULL,
+                similarity REAL NOT NULL,
+                manual INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def mapping(self):
+        """Return the raw issue type to canonical category mapping"""
+        with self._lock:
+            return dict(self._conn.execute("SELECT raw, canonical FROM issue_types").fetchall())
+
+    def consolidate(self, issue_types):
+        """
+        Map issue types to canonical categories, adding the ones never seen before
+
+        New issue types are taken most frequent first. Each joins the most similar existing
+        category if it is similar enough to one of its members, and starts a category of its
+        own otherwise, so the most common wording names the category.
+
+        Args:
+            issue_types (list): Raw issue types, repeated once per review
+
+        Returns:
+            dict: Raw issue type to canonical category, for every given issue type
+        """
+        counts = Counter(str(issue_type) for issue_type in issue_types if issue_type is not None)
+        with self._lock:
+            mapping = dict(self._conn.execute("SELECT raw, canonical FROM issue_types").fetchall())
+            new = sorted((raw for raw in counts if raw not in mapping), key=lambda raw: (-counts[raw], raw))
+            if new:
+                members = {}
+                for raw, canonical in mapping.items():
+                    members.setdefault(canonical, []).append(raw)
+                now = time.time()
+                for raw in new:
+                    best, best_similarity = raw, 1.0
+                    if members:
+                        scores = {canonical: max(issue_type_similarity(raw, member) for member in labels)
+                                  for canonical, labels in members.items()}
+                        candidate = max(scores, key=lambda canonical: (scores[canonical], -len(canonical)))
+                        if scores[candidate] >= self.threshold:
+                            best, best_similarity = candidate, scores[candidate]
+                    mapping[raw] = best
+                    members.setdefault(best, []).append(raw)
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO issue_types (raw, canonical, similarity, updated_at) "
+                        "VALUES (?, ?, ?, ?)", (raw, best, best_similarity, now)
+                    )
+                self._conn.commit()
+                # Another process may have mapped some of them first, its mapping wins
+                mapping = dict(self._conn.execute("SELECT raw, canonical FROM issue_types").fetchall())
+                logger.info(f"Mapped {len(new)} new issue types onto {len(set(mapping[raw] for raw in new))} categories")
+        return {raw: mapping[raw] for raw in counts}
+
+    def apply(self, rows):
+        """
+        Return copies of analyzed rows that use canonical issue types
+
+        The issue type Claude returned is kept in RAW_ISSUE_TYPE_COLUMN, so applying the
+        taxonomy again after it was edited starts from the original value.
+
+        Args:
+            rows (list): Analyzed review rows
+
+        Returns:
+            list: New row dictionaries
+        """
+        raw_types = [row.get(RAW_ISSUE_TYPE_COLUMN, row.get('issue_type')) for row in rows]
+        mapping = self.consolidate(raw_types)
+        result = []
+        for row, raw in zip(rows, raw_types):
+            row = dict(row)
+            if raw is not None:
+                row[RAW_ISSUE_TYPE_COLUMN] = raw
+                row['issue_type'] = mapping[str(raw)]
+            result.append(row)
+        return result
+
+    def set_canonical(self, raw, canonical):
+        """Map one raw issue type to a category by hand, which later consolidation never changes"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO issue_types (raw, canonical, similarity, manual, updated_at) "
+                "VALUES (?, ?, 1.0, 1, ?) ON CONFLICT(raw) DO UPDATE SET canonical = excluded.canonical, "
+                "similarity = 1.0, manual = 1, updated_at = excluded.updated_at", (raw, canonical, time.time())
+            )
+            self._conn.commit()
+
+    def rename(self, canonical, new_canonical):
+        """Rename a category, or merge it into another by giving that one's name"""
+        with self._lock:
+            self._conn.execute("UPDATE issue_types SET canonical = ?, manual = 1, updated_at = ? WHERE canonical = ?",
+                               (new_canonical, time.time(), canonical))
+            self._conn.commit()
+
+    def reset(self, keep_manual=False):
+        """Forget the mapping, optionally keeping the entries edited by hand"""
+        with self._lock:
+            self._conn.execute("DELETE FROM issue_types" + (" WHERE manual = 0" if keep_manual else ""))
+            self._conn.commit()
+
+    def list(self):
+        """
+        Return every mapping entry
+
+        Returns:
+            list: Dicts with raw, canonical, similarity and manual, by category
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT raw, canonical, similarity, manual FROM issue_types ORDER BY canonical, similarity DESC, raw"
+            ).fetchall()
+        return [{'raw': raw, 'canonical': canonical, 'similarity': similarity, 'manual': bool(manual)}
+                for raw, canonical, similarity, manual in rows]
+
+
+_default_taxonomy = None
+_default_taxonomy_lock = threading.Lock()
+
+
+def get_issue_taxonomy():
+    """Return the process-wide issue taxonomy"""
+    global _default_taxonomy
+    with _default_taxonomy_lock:
+        if _default_taxonomy is None:
+            _default_taxonomy = IssueTaxonomy()
+        return _default_taxonomy
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or edit the issue type taxonomy")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="Show every issue type and its category")
+    rename_parser = subparsers.add_parser("rename", help="Rename a category, or merge it into another")
+    rename_parser.add_argument("category")
+    rename_parser.add_argument("new_category")
+    map_parser = subparsers.add_parser("map", help="Move one issue type to a category")
+    map_parser.add_argument("issue_type")
+    map_parser.add_argument("category")
+    reset_parser = subparsers.add_parser("reset", help="Forget the taxonomy so it is rebuilt from the next analysis")
+    reset_parser.add_argument("--keep-manual", action="store_true", help="Keep the entries edited by hand")
+
+    args = parser.parse_args()
+    taxonomy = IssueTaxonomy()
+    if args.command == "list":
+        for entry in taxonomy.list():
+            marker = "*" if entry['manual'] else " "
+            print(f"{entry['canonical']:<40} {marker} {entry['raw']:<40} {entry['similarity']:.2f}")
+    elif args.command == "rename":
+        taxonomy.rename(args.category, args.new_category)
+    elif args.command == "map":
+        taxonomy.set_canonical(args.issue_type, args.category)
+    else:
+        taxonomy.reset(keep_manual=args.keep_manual)
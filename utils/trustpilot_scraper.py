@@ -3,12 +3,15 @@ from bs4 import BeautifulSoup
 import pandas as pd
 import time
 import random
+import re
 import json
 import os
+import hashlib
 from datetime import datetime
 import logging
 from fake_useragent import UserAgent
-import streamlit as st
+from utils.progress import ProgressReporter
+from utils.watermarks import IncrementalScrape
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -108,8 +111,13 @@ class TrustpilotScraper:
             location_element = review_element.find('div', {'data-consumer-country-typography': True})
             location = location_element.text.strip() if location_element else ""
             
-            # Create review ID
-            review_id = f"{reviewer}_{date}".replace(" ", "_") if reviewer and date else f"review_{hash(content[:100])}"
+            # Trustpilot's own review ID is in the link to the review page, otherwise derive a stable one
+            review_link = review_element.find('a', href=re.compile(r'/reviews/[0-9a-f]+'))
+            if review_link:
+                review_id = re.search(r'/reviews/([0-9a-f]+)', review_link['href']).group(1)
+            else:
+                review_key = f"{self.company_url}|{reviewer}|{date}|{title}|{content[:200]}"
+                review_id = "tp_" + hashlib.sha1(review_key.encode('utf-8')).hexdigest()[:20]
             
             return {
                 'review_id': review_id,
@@ -126,32 +134,43 @@ class TrustpilotScraper:
             logger.error(f"Error parsing review: {str(e)}")
             return None
     
-    def scrape_reviews(self, max_reviews=100, company_name="", progress_container=None):
+    def iter_review_batches(self, max_reviews=100, company_name="", progress_callback=None, should_stop=None,
+                            watermarks=None):
         """
-        Scrape Trustpilot reviews with progress tracking
+        Scrape Trustpilot reviews, yielding each page as soon as it arrives
         
         Args:
             max_reviews (int): Maximum number of reviews to scrape
             company_name (str): Company name for identification
-            progress_container: Streamlit container for progress updates
+            progress_callback (callable, optional): Receives progress events, see utils.progress
+            should_stop (callable, optional): Checked before every page, returning True ends the
+                scrape early
+            watermarks (WatermarkStore, optional): Scrape incrementally, yielding only reviews newer
+                than the company's watermark and stopping at the first page that reaches it
             
-        Returns:
-            pd.DataFrame: DataFrame containing scraped reviews
+        Yields:
+            list: The standardized review dictionaries of one page, never empty
         """
         logger.info(f"Starting Trustpilot scraping for {self.company_url}")
+        progress = ProgressReporter(progress_callback, 'Trustpilot', company_name, max_reviews)
+        # Trustpilot lists the most recent reviews first, which incremental scrapes rely on
+        incremental = IncrementalScrape(watermarks, 'Trustpilot', self.company_url) if watermarks else None
         
-        self.reviews = []
+        collected = 0
         page = 1
+        # A stopped scrape leaves the watermark alone, one that ran out of reviews may move it
+        stopped = False
+        exhausted = False
         
         try:
-            # Update progress
-            if progress_container:
-                with progress_container:
-                    st.info(f"🌐 Starting Trustpilot scraping for {company_name}...")
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
+            progress.start()
             
-            while len(self.reviews) < max_reviews:
+            while collected < max_reviews:
+                if should_stop and should_stop():
+                    logger.info(f"Stopping early with {collected} reviews")
+                    stopped = True
+                    break
+                
                 # Update headers for each request
                 self._update_headers()
                 
@@ -170,97 +189,114 @@ class TrustpilotScraper:
                 try:
                     response = self.session.get(url, timeout=30)
                     response.raise_for_status()
-                    
-                    soup = BeautifulSoup(response.content, 'html.parser')
-                    
-                    # Find review elements - Trustpilot uses article tags for reviews
-                    review_elements = soup.find_all('article', {'data-service-review-card-paper': True})
-                    if not review_elements:
-                        # Try alternative selector
-                        review_elements = soup.find_all('div', class_='review')
-                    
-                    if not review_elements:
-                        logger.info(f"No reviews found on page {page}")
-                        break
-                    
-                    page_reviews = []
-                    for review_element in review_elements:
-                        if len(self.reviews) >= max_reviews:
-                            break
-                            
-                        review_data = self._parse_review_soup(review_element)
-                        if review_data:
-                            # Create standardized columns as per user requirements
-                            standardized_review = {
-                                'Review Id': '',  # Trustpilot doesn't have review IDs
-                                'User name as on Playstore': review_data.get('reviewer', ''),
-                                'Detailed Review': review_data.get('content', ''),
-                                'Ratings on Playstore': review_data.get('rating', None),
-                                'Other User Approval Count': 0,  # Trustpilot doesn't have this
-                                'App playstore version': '',  # Trustpilot doesn't have this
-                                'Review Date time': review_data.get('date', ''),
-                                'company_name': company_name,
-                                'source': 'Trustpilot',
-                                'scraped_at': datetime.now().isoformat(),
-                                'Review Title': review_data.get('title', '')
-                            }
-                            
-                            page_reviews.append(standardized_review)
-                    
-                    if not page_reviews:
-                        logger.info("No more reviews found")
-                        break
-                    
-                    self.reviews.extend(page_reviews)
-                    
-                    # Update progress
-                    if progress_container:
-                        with progress_container:
-                            progress = len(self.reviews) / max_reviews
-                            progress_bar.progress(min(progress, 1.0))
-                            status_text.text(f"🌐 Trustpilot: {len(self.reviews)}/{max_reviews} reviews collected")
-                    
-                    logger.info(f"Collected {len(page_reviews)} reviews from page {page}")
-                    
-                    # Add delay between pages
-                    self._random_delay()
-                    page += 1
-                    
                 except requests.RequestException as e:
                     logger.error(f"Error fetching page {page}: {str(e)}")
-                    if progress_container:
-                        with progress_container:
-                            st.warning(f"⚠️ Error on page {page}: {str(e)}")
+                    progress.warning(f"Error on page {page}: {str(e)}", collected)
+                    stopped = True
                     break
+                
+                soup = BeautifulSoup(response.content, 'html.parser')
+                
+                # Find review elements - Trustpilot uses article tags for reviews
+                review_elements = soup.find_all('article', {'data-service-review-card-paper': True})
+                if not review_elements:
+                    # Try alternative selector
+                    review_elements = soup.find_all('div', class_='review')
+                
+                if not review_elements:
+                    logger.info(f"No reviews found on page {page}")
+                    exhausted = True
+                    break
+                
+                page_reviews = []
+                for review_element in review_elements:
+                    if collected + len(page_reviews) >= max_reviews:
+                        break
+                        
+                    review_data = self._parse_review_soup(review_element)
+                    if review_data:
+                        # Create standardized columns as per user requirements
+                        standardized_review = {
+                            'Review Id': review_data.get('review_id', ''),
+                            'User name as on Playstore': review_data.get('reviewer', ''),
+                            'Detailed Review': review_data.get('content', ''),
+                            'Ratings on Playstore': review_data.get('rating', None),
+                            'Other User Approval Count': 0,  # Trustpilot doesn't have this
+                            'App playstore version': '',  # Trustpilot doesn't have this
+                            'Review Date time': review_data.get('date', ''),
+                            'company_name': company_name,
+                            'source': 'Trustpilot',
+                            'scraped_at': datetime.now().isoformat(),
+                            'Review Title': review_data.get('title', '')
+                        }
+                        
+                        page_reviews.append(standardized_review)
+                
+                if not page_reviews:
+                    logger.info("No more reviews found")
+                    exhausted = True
+                    break
+                
+                if incremental:
+                    page_reviews = incremental.filter_new(page_reviews)
+                collected += len(page_reviews)
+                
+                progress.update(collected)
+                
+                logger.info(f"Collected {len(page_reviews)} reviews from page {page}")
+                if page_reviews:
+                    yield page_reviews
+                if incremental and incremental.reached_watermark:
+                    logger.info("Reached reviews collected by an earlier scrape")
+                    break
+                
+                # Add delay between pages
+                self._random_delay()
+                page += 1
             
-            # Final progress update
-            if progress_container:
-                with progress_container:
-                    progress_bar.progress(1.0)
-                    st.success(f"✅ Trustpilot scraping completed! Collected {len(self.reviews)} reviews")
-            
-            logger.info(f"Finished scraping {len(self.reviews)} Trustpilot reviews")
+            progress.done(collected)
+            if incremental and not stopped:
+                incremental.commit(exhausted=exhausted)
             
-            # Convert to DataFrame
-            if not self.reviews:
-                logger.warning("No reviews collected")
-                return pd.DataFrame()
-                
-            df = pd.DataFrame(self.reviews)
-            return df
+            logger.info(f"Finished scraping {collected} Trustpilot reviews")
             
         except Exception as e:
             logger.error(f"Error during Trustpilot scraping: {str(e)}")
-            if progress_container:
-                with progress_container:
-                    st.error(f"❌ Error scraping Trustpilot: {str(e)}")
+            progress.error(f"Error scraping Trustpilot: {str(e)}", collected)
+    
+    def scrape_reviews(self, max_reviews=100, company_name="", progress_callback=None, should_stop=None,
+                       watermarks=None, batch_callback=None):
+        """
+        Scrape Trustpilot reviews with progress tracking
+        
+        Args:
+            max_reviews (int): Maximum number of reviews to scrape
+            company_name (str): Company name for identification
+            progress_callback (callable, optional): Receives progress events, see utils.progress
+            should_stop (callable, optional): Checked before every page, returning True ends the
+                scrape early with the reviews collected so far
+            watermarks (WatermarkStore, optional): Scrape incrementally, returning only reviews newer
+                than the company's watermark and stopping at the first page that reaches it
+            batch_callback (callable, optional): Called with the review dictionaries of every page
+                as soon as it arrives
             
-            # Return whatever we've collected so far
-            if self.reviews:
-                return pd.DataFrame(self.reviews)
+        Returns:
+            pd.DataFrame: DataFrame containing scraped reviews, including those collected before an error
+        """
+        self.reviews = []
+        for batch in self.iter_review_batches(max_reviews, company_name, progress_callback, should_stop, watermarks):
+            self.reviews.extend(batch)
+            if batch_callback:
+                batch_callback(batch)
+        
+        # Convert to DataFrame
+        if not self.reviews:
+            logger.warning("No reviews collected")
             return pd.DataFrame()
+        return pd.DataFrame(self.reviews)
 
-def scrape_trustpilot_reviews(company_url, max_reviews=100, company_name="", progress_container=None):
+def scrape_trustpilot_reviews(company_url, max_reviews=100, company_name="", progress_callback=None, should_stop=None,
+                              watermarks=None, batch_callback=None):
     """
     Main function to scrape Trustpilot reviews
     
@@ -268,10 +304,27 @@ def scrape_trustpilot_reviews(company_url, max_reviews=100, company_name="", pro
         company_url (str): Trustpilot company URL
         max_reviews (int): Maximum number of reviews to scrape
         company_name (str): Company name for identification
-        progress_container: Streamlit container for progress updates
+        progress_callback (callable, optional): Receives progress events, see utils.progress
+        should_stop (callable, optional): Returning True ends the scrape early
+        watermarks (WatermarkStore, optional): Only return reviews newer than the company's watermark
+        batch_callback (callable, optional): Called with the reviews of every page as it arrives
         
     Returns:
         pd.DataFrame: DataFrame containing scraped reviews
     """
     scraper = TrustpilotScraper(company_url)
-    return scraper.scrape_reviews(max_reviews, company_name, progress_container)
\ No newline at end of file
+    return scraper.scrape_reviews(max_reviews, company_name, progress_callback, should_stop, watermarks,
+                                  batch_callback)
+
+def iter_trustpilot_reviews(company_url, max_reviews=100, company_name="", progress_callback=None, should_stop=None,
+                            watermarks=None):
+    """
+    Scrape Trustpilot reviews page by page
+    
+    Takes the same arguments as scrape_trustpilot_reviews.
+    
+    Yields:
+        list: The standardized review dictionaries of one page
+    """
+    scraper = TrustpilotScraper(company_url)
+    return scraper.iter_review_batches(max_reviews, company_name, progress_callback, should_stop, watermarks)
\ No newline at end of file
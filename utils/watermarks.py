@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+
+import pandas as pd
+
+logger = logging.getLogger("ScrapeWatermarks")
+
+# Location of the watermark database, override with REVIEW_WATERMARK_PATH
+DEFAULT_WATERMARK_PATH = os.environ.get(
+    "REVIEW_WATERMARK_PATH", os.path.join(".cache", "scrape_watermarks.sqlite")
+)
+
+# IDs of the most recent reviews kept per watermark. Reviews are matched by ID first,
+# so reviews sharing a timestamp with the watermark are not mistaken for new ones.
+MAX_RECENT_IDS = 500
+
+
+def _to_timestamp(value):
+    """Parse a review date into a UTC timestamp, or None"""
+    if value is None or value == "":
+        return None
+    try:
+        timestamp = pd.Timestamp(value)
+    except (ValueError, TypeError):
+        return None
+    if pd.isna(timestamp):
+        return None
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+    return timestamp.tz_convert("UTC")
+
+
+class WatermarkStore:
+    def __init__(self, path=DEFAULT_WATERMARK_PATH):
+        """
+        Newest review seen per (source, app ID or company URL), stored in SQLite
+
+        Args:
+            path (str): Database file path
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS watermarks (
+                source TEXT NOT NULL,
+                target TEXT NOT NULL,
+                newest_review_id TEXT,
+                newest_review_at TEXT,
+                recent_ids TEXT NOT NULL,
+                reviews_seen INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (source, target)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, source, target):
+        """
+        Return the watermark of a source
+
+        Returns:
+            dict or None: newest_review_id, newest_review_at (ISO string), recent_ids,
+                reviews_seen and updated_at, or None before the first incremental scrape
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT newest_review_id, newest_review_at, recent_ids, reviews_seen, updated_at "
+                "FROM watermarks WHERE source = ? AND target = ?", (source, target)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'source': source, 'target': target, 'newest_review_id': row[0], 'newest_review_at': row[1],
+                'recent_ids': json.loads(row[2]), 'reviews_seen': row[3], 'updated_at': row[4]}
+
+    def save(self, source, target, newest_review_id, newest_review_at, recent_ids, reviews_seen):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO watermarks (source, target, newest_review_id, newest_review_at, "
+                "recent_ids, reviews_seen, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (source, target, newest_review_id, newest_review_at, json.dumps(recent_ids[:MAX_RECENT_IDS]),
+                 reviews_seen, time.time())
+            )
+            self._conn.commit()
+
+    def reset(self, source=None, target=None):
+        """Forget one watermark, every watermark of a source, or all of them, so the next scrape is a full one"""
+        query = "DELETE FROM watermarks"
+        params = []
+        if source is not None:
+            query += " WHERE source = ?"
+            params.append(source)
+            if target is not None:
+                query += " AND target = ?"
+                params.append(target)
+        with self._lock:
+            self._conn.execute(query, params)
+            self._conn.commit()
+
+    def list(self):
+        """Return every stored watermark"""
+        with self._lock:
+            rows = self._conn.execute("SELECT source, target FROM watermarks ORDER BY source, target").fetchall()
+        return [self.get(source, target) for source, target in rows]
+
+
+class IncrementalScrape:
+    def __init__(self, store, source, target):
+        """
+        Filters the reviews of one newest-first scrape down to those newer than its watermark
+
+        Args:
+            store (WatermarkStore): Where the watermark is kept
+            source (str): Review source, e.g. 'Google Play Store'
+            target (str): App ID or company URL
+        """
+        self.store = store
+        self.source = source
+        self.target = target
+        self.watermark = store.get(source, target)
+        self.known_ids = set(self.watermark['recent_ids']) if self.watermark else set()
+        self.watermark_at = _to_timestamp(self.watermark['newest_review_at']) if self.watermark else None
+        self.reached_watermark = False
+        self._new_reviews = []
+
+    def _is_seen(self, review_id, review_at):
+        if review_id and review_id in self.known_ids:
+            return True
+        # Reviews that share the watermark's timestamp are only known by ID
+        return self.watermark_at is not None and review_at is not None and review_at < self.watermark_at
+
+    def filter_new(self, reviews, id_key='Review Id', date_key='Review Date time'):
+        """
+        Drop the reviews that earlier scrapes already collected
+
+        Once a seen review shows up, `reached_watermark` is set and the caller
+        should stop paging, since every later page only holds older reviews.
+
+        Args:
+            reviews (list): Standardized review dictionaries of one page, newest first
+
+        Returns:
+            list: The new reviews
+        """
+        new_reviews = []
+        for review in reviews:
+            review_id = str(review.get(id_key) or "")
+            review_at = _to_timestamp(review.get(date_key))
+            if self._is_seen(review_id, review_at):
+                self.reached_watermark = True
+                continue
+            new_reviews.append(review)
+            self._new_reviews.append((review_id, review_at))
+        return new_reviews
+
+    def commit(self, exhausted=False):
+        """
+        Move the watermark to the newest review of this scrape
+
+        Call only after the scrape finished normally, never after an error or a cancel.
+        The watermark only moves when the scrape reached the old watermark, there was
+        none yet, or the source had no more reviews. A scrape that stopped at max_reviews
+        before reaching it leaves the watermark where it was, so the next scrape collects
+        the reviews in between instead of skipping them.
+
+        Args:
+            exhausted (bool): The scrape reached the end of the source's reviews
+        """
+        if not self._new_reviews:
+            return
+        if self.watermark is not None and not (self.reached_watermark or exhausted):
+            logger.warning(f"{self.source} scrape of {self.target} stopped before reaching reviews it had "
+                           f"already seen, its watermark stays in place so the next scrape collects the rest")
+            return
+
+        newest_id, newest_at = None, None
+        if self.watermark:
+            newest_id, newest_at = self.watermark['newest_review_id'], self.watermark_at
+        for review_id, review_at in self._new_reviews:
+            if review_at is not None and (newest_at is None or review_at > newest_at):
+                newest_id, newest_at = review_id, review_at
+
+        recent_ids = [review_id for review_id, _ in self._new_reviews if review_id]
+        if self.watermark:
+            new_ids = set(recent_ids)
+            recent_ids += [review_id for review_id in self.watermark['recent_ids'] if review_id not in new_ids]
+        reviews_seen = len(self._new_reviews) + (self.watermark['reviews_seen'] if self.watermark else 0)
+        self.store.save(self.source, self.target, newest_id, newest_at.isoformat() if newest_at is not None else None,
+                        recent_ids, reviews_seen)
+        logger.info(f"{self.source} watermark of {self.target} now at {newest_at} after {len(self._new_reviews)} new reviews")
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_watermark_store():
+    """Return the process-wide watermark store"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = WatermarkStore()
+        return _default_store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or reset incremental scraping watermarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="Show every watermark")
+    reset_parser = subparsers.add_parser("reset", help="Forget watermarks so the next scrape is a full one")
+    reset_parser.add_argument("--source", help="Only this source, e.g. 'Trustpilot'")
+    reset_parser.add_argument("--target", help="Only this app ID or company URL")
+
+    args = parser.parse_args()
+    store = WatermarkStore()
+    if args.command == "list":
+        for watermark in store.list():
+            print(f"{watermark['source']:<18} {watermark['target']:<50} {watermark['newest_review_at'] or '-':<32} "
+                  f"{watermark['reviews_seen']} reviews")
+    else:
+        store.reset(args.source, args.target)